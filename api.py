@@ -1,41 +1,161 @@
-from flask import Flask, request, jsonify, render_template
-import sqlite3
+import base64
+import json
+
+from flask import Flask, Response, request, jsonify, render_template
+from database import get_db_connection, initialize_database
 
 app = Flask(__name__)
 
-# Database connection function
-def get_db_connection():
-    conn = sqlite3.connect("medbuddy.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Page size for reminder listings, and the most a client may ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Rows fetched from SQLite per query when streaming
+STREAM_BATCH_SIZE = 500
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after `row` in (reminder_time, id) order."""
+    raw = json.dumps([row["reminder_time"], row["id"]]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for a malformed cursor."""
+    try:
+        reminder_time, reminder_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    return reminder_time, int(reminder_id)
+
+def reminder_query(args, limit=None):
+    """
+    Build the reminders query for the request arguments.
+
+    Supports user_id, status, from and to (reminder_time range, `to`
+    exclusive) and cursor. Rows come back in (reminder_time, id) order,
+    so a page continues exactly where the previous one ended.
+
+    Returns:
+        tuple: (sql, params)
+    """
+    clauses, params = [], []
+    if args.get("user_id"):
+        clauses.append("user_id = ?")
+        params.append(int(args["user_id"]))
+    if args.get("status"):
+        clauses.append("status = ?")
+        params.append(args["status"])
+    if args.get("from"):
+        clauses.append("reminder_time >= ?")
+        params.append(args["from"])
+    if args.get("to"):
+        clauses.append("reminder_time < ?")
+        params.append(args["to"])
+    if args.get("cursor"):
+        clauses.append("(reminder_time, id) > (?, ?)")
+        params.extend(decode_cursor(args["cursor"]))
+
+    sql = "SELECT * FROM reminders"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY reminder_time, id"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return sql, params
+
+def page_size(args):
+    """The requested page size, clamped to 1..MAX_PAGE_SIZE."""
+    return max(1, min(int(args.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+
+def fetch_page(args):
+    """
+    Fetch one page of reminders.
+
+    Returns:
+        tuple: (list of rows, cursor for the next page or None)
+    """
+    limit = page_size(args)
+    sql, params = reminder_query(args, limit + 1)  # one extra row tells us if there is more
+    with get_db_connection() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+def stream_reminders(args, limit=None):
+    """
+    Yield matching reminders as NDJSON lines, a batch of rows at a time.
+
+    Each batch is its own keyset query on a connection borrowed just for
+    that query, so a slow client never keeps a pooled connection (or a
+    read snapshot) for the whole response.
+
+    Args:
+        args (dict): Query arguments, as for reminder_query
+        limit (int): Most rows to stream, or None for all of them
+    """
+    args = dict(args)
+    while limit is None or limit > 0:
+        batch = STREAM_BATCH_SIZE if limit is None else min(STREAM_BATCH_SIZE, limit)
+        sql, params = reminder_query(args, batch)
+        with get_db_connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if rows:
+            yield "".join(json.dumps(dict(row)) + "\n" for row in rows)
+        if len(rows) < batch:
+            break
+        if limit is not None:
+            limit -= len(rows)
+        args["cursor"] = encode_cursor(rows[-1])
 
 # Homepage Route (GUI)
 @app.route('/')
 def home():
-    conn = get_db_connection()
-    reminders = conn.execute("SELECT * FROM reminders").fetchall()
-    conn.close()
-    return render_template("index.html", reminders=reminders)
+    try:
+        reminders, next_cursor = fetch_page(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return render_template("index.html", reminders=reminders, next_cursor=next_cursor)
 
-# Fetch all reminders (API)
+# Fetch reminders (API)
 @app.route("/reminders", methods=["GET"])
 def get_reminders():
-    conn = get_db_connection()
-    reminders = conn.execute("SELECT * FROM reminders").fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in reminders])
+    """
+    List reminders one page at a time.
+
+    Query parameters: user_id, status, from, to, limit (default 100,
+    max 1000) and cursor (the next_cursor of the previous page).
+    With format=ndjson (or Accept: application/x-ndjson) every matching
+    reminder is streamed instead, one JSON object per line.
+    """
+    try:
+        if (request.args.get("format") == "ndjson"
+                or request.accept_mimetypes.best == "application/x-ndjson"):
+            limit = page_size(request.args) if request.args.get("limit") else None
+            reminder_query(request.args)  # a bad cursor must fail before streaming starts
+            return Response(stream_reminders(request.args.to_dict(), limit),
+                            mimetype="application/x-ndjson")
+
+        reminders, next_cursor = fetch_page(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "reminders": [dict(row) for row in reminders],
+        "next_cursor": next_cursor
+    })
 
 # Add a new reminder (API)
 @app.route("/reminders", methods=["POST"])
 def add_reminder():
     data = request.json
-    conn = get_db_connection()
-    conn.execute("INSERT INTO reminders (user_id, medication_id, reminder_time) VALUES (?, ?, ?)",
-                 (data["user_id"], data["medication_id"], data["reminder_time"]))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO reminders (user_id, medication_id, reminder_time) VALUES (?, ?, ?)",
+                     (data["user_id"], data["medication_id"], data["reminder_time"]))
     return jsonify({"message": "Reminder added successfully!"}), 201
 
 # Run the Flask application
 if __name__ == "__main__":
+    initialize_database()
     app.run(debug=True)
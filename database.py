@@ -1,75 +1,33 @@
+import os
 import sqlite3
 
-DB_NAME = "medbuddy.db"
+from medbuddy_shared.sqlite_pool import ConnectionPool
 
-def get_db_connection():
-    """Returns a new database connection."""
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row  # Allows dict-like row access
-    return conn
-
-def initialize_database():
-    """Ensures all tables exist in the database."""
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
-
-        # Run SQL schema updates
-        cursor.executescript("""
-        PRAGMA foreign_keys = ON;
+# Database file path; next to this module unless DB_NAME says otherwise,
+# so it does not depend on the working directory
+DB_NAME = os.environ.get("DB_NAME", os.path.join(os.path.dirname(os.path.abspath(__file__)), "medbuddy.db"))
 
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            phone TEXT
-        );
+# Shared pool; rows allow dict-like access
+pool = ConnectionPool(DB_NAME, row_factory=sqlite3.Row)
 
-        CREATE TABLE IF NOT EXISTS medications (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            name TEXT NOT NULL,
-            dosage TEXT,
-            frequency TEXT NOT NULL,
-            start_date TEXT,
-            end_date TEXT,
-            quantity INTEGER DEFAULT 0,
-            low_stock_alert INTEGER DEFAULT 5,
-            prescription_end_date TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        );
-
-        CREATE TABLE IF NOT EXISTS reminders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            medication_id INTEGER,
-            reminder_time TEXT NOT NULL,
-            status TEXT DEFAULT 'pending',
-            snooze_until TEXT DEFAULT NULL,
-            missed_count INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (medication_id) REFERENCES medications (id)
-        );
-
-        CREATE TABLE IF NOT EXISTS appointments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            doctor_name TEXT,
-            appointment_date TEXT NOT NULL,
-            notes TEXT,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        );
+def get_db_connection():
+    """
+    Borrow a pooled database connection: `with get_db_connection() as conn: ...`
+    """
+    return pool.connection()
+
+def transaction(immediate=False):
+    """
+    Borrow a pooled connection inside a transaction:
+    `with transaction() as conn: ...`
+    """
+    return pool.transaction(immediate)
 
-        CREATE TABLE IF NOT EXISTS adherence_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            medication_id INTEGER,
-            date TEXT NOT NULL,
-            adherence_percentage INTEGER DEFAULT 100,
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (medication_id) REFERENCES medications (id)
-        );
-        """)
-        conn.commit()
+def initialize_database():
+    """Ensures all tables and indexes exist by applying pending migrations."""
+    # Imported here because migrations builds on this module's pool
+    from migrations import migrate
+    return migrate()
 
 if __name__ == "__main__":
     initialize_database()
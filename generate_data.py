@@ -0,0 +1,95 @@
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from database import DB_NAME, initialize_database
+from medbuddy_shared.bulk_load import bulk_connection, insert_chunks
+
+MEDICATION_NAMES = ["Paracetamol", "Ibuprofen", "Aspirin", "Metformin", "Lisinopril",
+                    "Atorvastatin", "Amlodipine", "Omeprazole", "Levothyroxine", "Losartan"]
+FREQUENCIES = ["Once a day", "Twice a day", "Three times a day"]
+
+# Share of reminders in each status; the rest are pending
+STATUS_WEIGHTS = {"pending": 0.4, "sent": 0.45, "missed": 0.1, "notified": 0.05}
+
+
+def generate(users=10000, medications_per_user=3, reminders=1000000, days=30, seed=42, reset=False):
+    """
+    Bulk-fill medbuddy.db with reproducible synthetic data.
+
+    Reminders are spread evenly over `days` days either side of now, so
+    the reminder service and paginated API see both past and upcoming
+    rows. On an empty (or reset) database the same arguments and seed
+    produce the same rows, relative to the current time.
+
+    Returns:
+        dict: Row counts inserted per table
+    """
+    initialize_database()
+    rng = random.Random(seed)
+    conn = bulk_connection(DB_NAME)
+
+    if reset:
+        for table in ("reminders", "medications", "users"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name IN ('reminders', 'medications', 'users')")
+
+    first_user = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+    first_medication = conn.execute("SELECT COALESCE(MAX(id), 0) FROM medications").fetchone()[0] + 1
+    user_ids = range(first_user, first_user + users)
+
+    insert_chunks(conn, "INSERT INTO users (id, name, email, phone) VALUES (?, ?, ?, ?)", (
+        (user_id, f"User {user_id}", f"user{user_id}@example.com", f"9{rng.randrange(10 ** 9):09d}")
+        for user_id in user_ids
+    ))
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    medication_count = users * medications_per_user
+    insert_chunks(conn, """
+        INSERT INTO medications (id, user_id, name, dosage, frequency, start_date, end_date, quantity)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (first_medication + index, first_user + index // medications_per_user,
+         rng.choice(MEDICATION_NAMES), f"{rng.choice((250, 500, 1000))}mg", rng.choice(FREQUENCIES),
+         (today - timedelta(days=days)).strftime("%Y-%m-%d"), (today + timedelta(days=days)).strftime("%Y-%m-%d"),
+         rng.randrange(0, 60))
+        for index in range(medication_count)
+    ))
+
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+    start = today - timedelta(days=days)
+    span_seconds = 2 * days * 86400
+
+    now = datetime.now()
+
+    def reminder_rows():
+        for _ in range(reminders):
+            index = rng.randrange(medication_count)
+            when = start + timedelta(seconds=rng.randrange(span_seconds) // 60 * 60)
+            status = "pending" if when > now else rng.choices(statuses, weights)[0]
+            yield (first_user + index // medications_per_user, first_medication + index,
+                   when.strftime("%Y-%m-%d %H:%M:%S"), status, 1 if status == "missed" else 0)
+
+    insert_chunks(conn, """
+        INSERT INTO reminders (user_id, medication_id, reminder_time, status, missed_count)
+        VALUES (?, ?, ?, ?, ?)
+    """, reminder_rows())
+    conn.close()
+
+    return {"users": users, "medications": medication_count, "reminders": reminders}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill medbuddy.db with synthetic data.")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--medications-per-user", type=int, default=3)
+    parser.add_argument("--reminders", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="delete existing rows first")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.users, args.medications_per_user, args.reminders, args.days, args.seed, args.reset)
+    print(f"Inserted {counts} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,334 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from db_connection import DB_PATH, connection, transaction
+
+# Seconds between background rollup refreshes while the server runs
+ADHERENCE_REFRESH_INTERVAL = int(os.environ.get('ADHERENCE_REFRESH_INTERVAL', '900'))
+
+# Days of daily rows returned per medicine by get_adherence
+ADHERENCE_HISTORY_DAYS = 30
+
+
+def _to_days(dates):
+    """'YYYY-MM-DD' strings to integer days since the epoch."""
+    return np.array(dates, dtype='datetime64[D]').astype(np.int64)
+
+def _to_dates(days):
+    """Integer days since the epoch to 'YYYY-MM-DD' strings."""
+    return np.asarray(days, dtype=np.int64).astype('datetime64[D]').astype(str)
+
+def _runs(groups, full):
+    """
+    Streak statistics for rows sorted by group and then by day.
+
+    Args:
+        groups (np.ndarray): Group index of each row, in contiguous blocks
+        full (np.ndarray): Whether every dose was taken on each row's day
+
+    Returns:
+        tuple: Per group (in order of first appearance): row starts, row
+            counts, leading run of full days, trailing run and longest run
+    """
+    index = np.arange(len(groups))
+    group_start = np.ones(len(groups), dtype=bool)
+    group_start[1:] = groups[1:] != groups[:-1]
+    starts = np.flatnonzero(group_start)
+    counts = np.diff(np.append(starts, len(groups)))
+
+    # Length of the run of full days ending at each row: distance to the
+    # last row that broke the run (a missed day or the group boundary)
+    breaks = np.where(~full, index, np.where(group_start, index - 1, -1))
+    run_length = index - np.maximum.accumulate(breaks)
+
+    longest = np.maximum.reduceat(run_length, starts)
+    trailing = run_length[starts + counts - 1]
+    first_missed = np.minimum.reduceat(np.where(~full, index, len(groups)), starts)
+    leading = np.minimum(first_missed, starts + counts) - starts
+    return starts, counts, leading, trailing, longest
+
+def refresh(db_path=DB_PATH, through=None):
+    """
+    Bring the adherence rollups up to date.
+
+    Only two kinds of day are (re)computed: days that completed since a
+    prescription was last rolled up, and already rolled-up days whose
+    intake changed (recorded in adherence_dirty_days by triggers on
+    dosage_tracking). Summaries are extended incrementally for the first
+    kind and rebuilt from their daily rows for the second.
+
+    Args:
+        db_path (str): SQLite database file
+        through (str or None): Last day to roll up, 'YYYY-MM-DD'
+            (default yesterday in UTC, the last complete day)
+
+    Returns:
+        int: Number of daily rows written
+    """
+    if through is None:
+        through = (datetime.now(timezone.utc) - timedelta(days=1)).strftime('%Y-%m-%d')
+    through_day = _to_days([through])[0]
+
+    with transaction(db_path, immediate=True) as conn:
+        pairs = conn.execute('''
+            SELECT p.user_id, p.medicine_id, p.scheduled, p.start_day,
+                   s.last_day, s.days_tracked, s.doses_scheduled, s.doses_taken,
+                   s.current_streak, s.longest_streak
+            FROM (SELECT user_id, medicine_id,
+                         SUM(doses_per_day) AS scheduled,
+                         MIN(date(created_at)) AS start_day
+                  FROM prescriptions
+                  GROUP BY user_id, medicine_id) p
+            LEFT JOIN adherence_summary s
+            ON s.user_id = p.user_id AND s.medicine_id = p.medicine_id
+            ORDER BY p.user_id, p.medicine_id
+        ''').fetchall()
+
+        dirty = conn.execute('SELECT user_id, medicine_id, day FROM adherence_dirty_days WHERE day <= ?',
+                             (through,)).fetchall()
+        conn.execute('DELETE FROM adherence_dirty_days WHERE day <= ?', (through,))
+
+        if not pairs:
+            return 0
+
+        (users, medicines, scheduled, start_day, last_day, old_days,
+         old_scheduled, old_taken, old_streak, old_longest) = zip(*pairs)
+        users = np.array(users, dtype=np.int64)
+        medicines = np.array(medicines, dtype=np.int64)
+        scheduled = np.array(scheduled, dtype=np.int64)
+        # A pair whose prescriptions have no created_at has no first day
+        # yet; start it after `through` so nothing is rolled up for it
+        started = np.array([day is not None for day in start_day])
+        start = np.where(started, _to_days([day or '1970-01-01' for day in start_day]), through_day + 1)
+        summarized = np.array([day is not None for day in last_day])
+        last = np.where(summarized, _to_days([day or '1970-01-01' for day in last_day]), start - 1)
+        old = np.array([[value or 0 for value in column]
+                        for column in (old_days, old_scheduled, old_taken, old_streak, old_longest)],
+                       dtype=np.int64)
+        pair_keys = (users << 32) | medicines
+
+        # Days completed since each pair was last rolled up
+        first = np.maximum(last + 1, start)
+        new_days = np.clip(through_day - first + 1, 0, None)
+        pair_index = np.repeat(np.arange(len(pairs)), new_days)
+        offsets = np.arange(len(pair_index)) - np.repeat(np.cumsum(new_days) - new_days, new_days)
+        day = first[pair_index] + offsets
+
+        # Rolled-up days whose intake changed since
+        rebuilt = np.array([], dtype=np.int64)
+        if dirty:
+            dirty_users, dirty_medicines, dirty_days = zip(*dirty)
+            dirty_keys = (np.array(dirty_users, dtype=np.int64) << 32) | np.array(dirty_medicines, dtype=np.int64)
+            position = np.minimum(np.searchsorted(pair_keys, dirty_keys), len(pairs) - 1)
+            dirty_day = _to_days(dirty_days)
+            keep = ((pair_keys[position] == dirty_keys)
+                    & (dirty_day >= start[position]) & (dirty_day <= last[position]))
+            rebuilt = np.unique(position[keep])
+            pair_index = np.concatenate([pair_index, position[keep]])
+            day = np.concatenate([day, dirty_day[keep]])
+
+        if not len(pair_index):
+            return 0
+
+        # Doses taken on each changed day, matched on (pair, day)
+        low, high = int(day.min()), int(day.max())
+        span = high - low + 1
+        taken_rows = conn.execute('''
+            SELECT user_id, medicine_id, intake_date, MAX(doses_taken)
+            FROM dosage_tracking
+            WHERE intake_date BETWEEN ? AND ?
+            GROUP BY user_id, medicine_id, intake_date
+        ''', (str(_to_dates([low])[0]), str(_to_dates([high])[0]))).fetchall()
+
+        taken = np.zeros(len(pair_index), dtype=np.int64)
+        if taken_rows:
+            taken_users, taken_medicines, taken_days, taken_counts = zip(*taken_rows)
+            taken_keys = (np.array(taken_users, dtype=np.int64) << 32) | np.array(taken_medicines, dtype=np.int64)
+            position = np.minimum(np.searchsorted(pair_keys, taken_keys), len(pairs) - 1)
+            found = pair_keys[position] == taken_keys
+            row_keys = position[found] * span + (_to_days(taken_days)[found] - low)
+            order = np.argsort(row_keys)
+            row_keys = row_keys[order]
+            counts = np.array(taken_counts, dtype=np.int64)[found][order]
+
+            wanted = pair_index * span + (day - low)
+            match = np.minimum(np.searchsorted(row_keys, wanted), len(row_keys) - 1)
+            hit = row_keys[match] == wanted
+            taken[hit] = counts[match[hit]]
+
+        day_scheduled = scheduled[pair_index]
+        taken = np.clip(taken, 0, day_scheduled)
+
+        conn.executemany('''
+            INSERT OR REPLACE INTO adherence_daily (user_id, medicine_id, day, scheduled, taken)
+            VALUES (?, ?, ?, ?, ?)
+        ''', zip(users[pair_index].tolist(), medicines[pair_index].tolist(),
+                 _to_dates(day).tolist(), day_scheduled.tolist(), taken.tolist()))
+
+        summaries = []
+
+        # Pairs that only gained new days: extend their summary
+        appended = ~np.isin(pair_index, rebuilt)
+        if appended.any():
+            groups = pair_index[appended]
+            full = taken[appended] >= day_scheduled[appended]
+            starts, counts, leading, trailing, longest = _runs(groups, full)
+            group = groups[starts]
+            days, sched_total, taken_total, streak, longest_total = old[:, group]
+
+            all_full = leading == counts
+            streak = np.where(all_full, streak + counts, trailing)
+            longest_total = np.maximum.reduce([longest_total, old[3, group] + leading, longest])
+            summaries.extend(zip(
+                users[group].tolist(), medicines[group].tolist(),
+                _to_dates(day[appended][starts + counts - 1]).tolist(),
+                (days + counts).tolist(),
+                (sched_total + np.add.reduceat(day_scheduled[appended], starts)).tolist(),
+                (taken_total + np.add.reduceat(taken[appended], starts)).tolist(),
+                streak.tolist(), longest_total.tolist()
+            ))
+
+        # Pairs with a changed past day: rebuild from their daily rows
+        for position in rebuilt.tolist():
+            rows = conn.execute('''
+                SELECT day, scheduled, taken FROM adherence_daily
+                WHERE user_id = ? AND medicine_id = ?
+                ORDER BY day
+            ''', (int(users[position]), int(medicines[position]))).fetchall()
+            history_scheduled = np.array([row[1] for row in rows], dtype=np.int64)
+            history_taken = np.array([row[2] for row in rows], dtype=np.int64)
+            _, _, _, trailing, longest = _runs(np.zeros(len(rows), dtype=np.int64),
+                                               history_taken >= history_scheduled)
+            summaries.append((
+                int(users[position]), int(medicines[position]), rows[-1][0], len(rows),
+                int(history_scheduled.sum()), int(history_taken.sum()),
+                int(trailing[0]), int(longest[0])
+            ))
+
+        conn.executemany('''
+            INSERT OR REPLACE INTO adherence_summary
+            (user_id, medicine_id, last_day, days_tracked, doses_scheduled, doses_taken,
+             current_streak, longest_streak)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', summaries)
+
+    return len(pair_index)
+
+def _rates(doses_scheduled, doses_taken):
+    adherence_rate = doses_taken / doses_scheduled if doses_scheduled else 1.0
+    return round(adherence_rate, 4), round(1.0 - adherence_rate, 4)
+
+def get_adherence(user_id, db_path=DB_PATH, days=ADHERENCE_HISTORY_DAYS):
+    """
+    Per-medicine adherence for one user, read from the rollups.
+
+    Args:
+        user_id (int): User ID
+        db_path (str): SQLite database file
+        days (int): Number of recent daily rows to include per medicine
+
+    Returns:
+        list: One dict per medicine with rates, streaks and daily history
+    """
+    try:
+        with connection(db_path) as conn:
+            summaries = conn.execute('''
+                SELECT s.medicine_id, m.name, s.last_day, s.days_tracked,
+                       s.doses_scheduled, s.doses_taken, s.current_streak, s.longest_streak
+                FROM adherence_summary s
+                JOIN medicines m ON s.medicine_id = m.medicine_id
+                WHERE s.user_id = ?
+                ORDER BY m.name
+            ''', (user_id,)).fetchall()
+
+            daily = {}
+            for medicine_id, day, scheduled, taken in conn.execute('''
+                SELECT medicine_id, day, scheduled, taken
+                FROM adherence_daily
+                WHERE user_id = ? AND day > date('now', ?)
+                ORDER BY day
+            ''', (user_id, f'-{int(days) + 1} days')):
+                daily.setdefault(medicine_id, []).append(
+                    {'date': day, 'scheduled': scheduled, 'taken': taken}
+                )
+
+    except sqlite3.Error as e:
+        print(f"Adherence query error: {e}")
+        return []
+
+    results = []
+    for (medicine_id, name, last_day, days_tracked, doses_scheduled, doses_taken,
+         current_streak, longest_streak) in summaries:
+        adherence_rate, missed_rate = _rates(doses_scheduled, doses_taken)
+        results.append({
+            'medicine_id': medicine_id,
+            'medicine_name': name,
+            'through': last_day,
+            'days_tracked': days_tracked,
+            'doses_scheduled': doses_scheduled,
+            'doses_taken': doses_taken,
+            'adherence_rate': adherence_rate,
+            'missed_rate': missed_rate,
+            'current_streak': current_streak,
+            'longest_streak': longest_streak,
+            'daily': daily.get(medicine_id, [])
+        })
+    return results
+
+def get_adherence_overview(db_path=DB_PATH):
+    """
+    Adherence across every patient, read from the per-medicine summaries.
+
+    Returns:
+        dict or None: Totals and rates, None on a database error
+    """
+    try:
+        with connection(db_path) as conn:
+            patients, medicines, doses_scheduled, doses_taken, on_streak = conn.execute('''
+                SELECT COUNT(DISTINCT user_id), COUNT(*),
+                       COALESCE(SUM(doses_scheduled), 0), COALESCE(SUM(doses_taken), 0),
+                       COALESCE(SUM(current_streak > 0), 0)
+                FROM adherence_summary
+            ''').fetchone()
+    except sqlite3.Error as e:
+        print(f"Adherence query error: {e}")
+        return None
+
+    adherence_rate, missed_rate = _rates(doses_scheduled, doses_taken)
+    return {
+        'patients': patients,
+        'prescriptions': medicines,
+        'doses_scheduled': doses_scheduled,
+        'doses_taken': doses_taken,
+        'adherence_rate': adherence_rate,
+        'missed_rate': missed_rate,
+        'prescriptions_on_streak': on_streak
+    }
+
+def start_refresher(interval=ADHERENCE_REFRESH_INTERVAL, db_path=DB_PATH):
+    """
+    Refresh the rollups every `interval` seconds on a daemon thread.
+
+    Returns:
+        threading.Thread: The started thread
+    """
+    def run():
+        while True:
+            try:
+                refresh(db_path)
+            except sqlite3.Error as e:
+                print(f"Adherence refresh error: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='adherence-refresh', daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == '__main__':
+    # Suitable for cron: roll up everything completed so far
+    print(f"Adherence rows updated: {refresh()}")
@@ -1,13 +1,10 @@
 from flask import Flask, request, jsonify
 import os
 from flask_cors import CORS
-from werkzeug.utils import secure_filename
-import cv2
-import numpy as np
-import tempfile
 
 # Import your existing modules
-from ocr_processor import extract_text, extract_medication_name
+from ocr_processor import extract_medication_name
+from ocr_service import extract_text_from_image, ocr_service, OCRServiceBusy, OCRServiceTimeout
 from database_handler import initialize_database, search_medication
 from fda_api import get_medication_info
 
@@ -32,16 +29,8 @@ def upload_image():
         return jsonify({'error': 'No file selected'}), 400
         
     try:
-        # Create a temporary file to store the uploaded image
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp:
-            temp_filename = temp.name
-            file.save(temp_filename)
-        
-        # Process the image with OCR to extract text
-        extracted_text = extract_text(temp_filename)
-        
-        # Clean up the temporary file
-        os.unlink(temp_filename)
+        # Decode the uploaded file in memory and run OCR on it
+        extracted_text = extract_text_from_image(file.read())
         
         if not extracted_text:
             return jsonify({
@@ -82,6 +71,18 @@ def upload_image():
             'source': medication_info['source']
         })
         
+    except OCRServiceBusy:
+        return jsonify({
+            'error': 'OCR service busy',
+            'message': 'Too many scans are being processed. Please try again shortly.'
+        }), 503, {'Retry-After': '2'}
+
+    except OCRServiceTimeout:
+        return jsonify({
+            'error': 'OCR timed out',
+            'message': 'Reading the label took too long. Please try again shortly.'
+        }), 504
+
     except Exception as e:
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
 
@@ -100,4 +101,7 @@ def get_medication_info(medication_name):
     }
 
 if __name__ == '__main__':
+    # Only the reloader's serving process loads the OCR worker pool
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ocr_service.start()
     app.run(debug=True, port=5000)
@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from db_connection import DB_PATH
+
+# server.py listens on 5000; start the root api.py on another port, e.g.
+# `flask --app api run --port 5001`
+SERVER_URL = 'http://localhost:5000'
+API_URL = 'http://localhost:5001'
+
+# Scenarios run by default, in order
+DEFAULT_SCENARIOS = ['medication-details', 'dose-history', 'track-dosage', 'submit-form', 'reminders']
+
+# Report of a reference run; refresh it with --update-baseline after an
+# intended performance change (or on a new reference machine)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+# Allowed p95 latency growth and throughput drop against the baseline
+REGRESSION_THRESHOLD = float(os.environ.get('BENCHMARK_THRESHOLD', '0.25'))
+
+
+def load_pairs(db_path, limit=5000):
+    """(user name, medicine name) pairs with a prescription, for request payloads."""
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute('''
+            SELECT u.name, m.name
+            FROM prescriptions p
+            JOIN users u ON p.user_id = u.user_id
+            JOIN medicines m ON p.medicine_id = m.medicine_id
+            ORDER BY p.prescription_id
+            LIMIT ?
+        ''', (limit,)).fetchall()
+
+def load_user_ids(db_path, limit=5000):
+    """User ids from medbuddy.db, for reminder listing filters."""
+    with sqlite3.connect(db_path) as conn:
+        return [row[0] for row in conn.execute('SELECT id FROM users ORDER BY id LIMIT ?', (limit,))]
+
+def build_scenarios(pairs, user_ids):
+    """
+    Scenario name -> (base, method, path, payload factory). The factory
+    takes a random.Random and returns (json body, query params).
+    """
+    def pair_body(rng):
+        user_name, medicine_name = rng.choice(pairs)
+        return {'user_name': user_name, 'medicine_name': medicine_name}, None
+
+    def history_body(rng):
+        body, _ = pair_body(rng)
+        return dict(body, days=30), None
+
+    def form_body(rng):
+        return {
+            'name': f'Benchmark {uuid.UUID(int=rng.getrandbits(128)).hex[:12]}',
+            'age': rng.randrange(18, 95),
+            'doctor': 'Dr. Benchmark',
+            'medicines': [{'name': rng.choice(pairs)[1], 'doses': 2, 'times': ['08:00', '20:00']}]
+        }, None
+
+    def reminders_query(rng):
+        return None, {'user_id': rng.choice(user_ids), 'limit': 100}
+
+    scenarios = {}
+    if pairs:
+        scenarios['medication-details'] = ('server', 'POST', '/medication-details', pair_body)
+        scenarios['dose-history'] = ('server', 'POST', '/dose-history', history_body)
+        scenarios['track-dosage'] = ('server', 'POST', '/track-dosage', pair_body)
+        scenarios['submit-form'] = ('server', 'POST', '/submit-form', form_body)
+    if user_ids:
+        scenarios['reminders'] = ('api', 'GET', '/reminders', reminders_query)
+    return scenarios
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_scenario(url, method, payload, requests_count, concurrency, seed, timeout=30):
+    """
+    Send `requests_count` requests with `concurrency` workers.
+
+    Returns:
+        dict: Throughput, latency percentiles (ms) and status counts
+    """
+    sessions = threading.local()
+    counter = iter(range(requests_count))
+    counter_lock = threading.Lock()
+    latencies = []
+    statuses = Counter()
+    results_lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000003 + worker_id)
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            body, params = payload(rng)
+            started = time.perf_counter()
+            try:
+                response = sessions.session.request(method, url, json=body, params=params, timeout=timeout)
+                response.content
+                status = response.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000
+            with results_lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    errors = sum(count for status, count in statuses.items() if not isinstance(status, int) or status >= 500)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 1) if duration else None,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50), 2),
+            'p95': round(percentile(latencies, 0.95), 2),
+            'p99': round(percentile(latencies, 0.99), 2),
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'max': round(latencies[-1], 2)
+        } if latencies else None,
+        'status_codes': {str(status): count for status, count in sorted(statuses.items(), key=str)}
+    }
+
+def compare(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compare a report with a baseline report, scenario by scenario.
+
+    A scenario regresses when its p95 latency grows, or its throughput
+    drops, by more than `threshold` (a fraction), or when it has errors
+    the baseline did not. Scenarios missing from either side are skipped.
+
+    Returns:
+        list: One message per regression
+    """
+    regressions = []
+    for name, result in report['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if not base or not result['latency_ms'] or not base.get('latency_ms'):
+            continue
+        p95, base_p95 = result['latency_ms']['p95'], base['latency_ms']['p95']
+        if p95 > base_p95 * (1 + threshold):
+            regressions.append(f"{name}: p95 {p95} ms vs baseline {base_p95} ms")
+        rps, base_rps = result['throughput_rps'], base['throughput_rps']
+        if rps is not None and base_rps and rps < base_rps * (1 - threshold):
+            regressions.append(f"{name}: {rps} req/s vs baseline {base_rps} req/s")
+        if result['errors'] > base['errors']:
+            regressions.append(f"{name}: {result['errors']} errors vs baseline {base['errors']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Drive server.py and api.py endpoints at fixed concurrency and report latency as JSON.'
+    )
+    parser.add_argument('--server-url', default=SERVER_URL, help='base URL of server.py')
+    parser.add_argument('--api-url', default=API_URL, help='base URL of the root api.py')
+    parser.add_argument('--backend-db', default=DB_PATH, help='medicine_reminder.db to sample names from')
+    parser.add_argument('--api-db', default='../medbuddy.db', help='medbuddy.db to sample user ids from')
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS))
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--warmup', type=int, default=50, help='unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help='baseline report to compare against; exits 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='allowed p95 growth and throughput drop, as a fraction')
+    parser.add_argument('--no-compare', action='store_true', help='only report, never fail')
+    parser.add_argument('--update-baseline', action='store_true', help='save this run as the baseline')
+    args = parser.parse_args()
+
+    try:
+        pairs = load_pairs(args.backend_db)
+    except sqlite3.Error as e:
+        print(f"Cannot read {args.backend_db}: {e}", file=sys.stderr)
+        pairs = []
+    try:
+        user_ids = load_user_ids(args.api_db)
+    except sqlite3.Error as e:
+        print(f"Cannot read {args.api_db}: {e}", file=sys.stderr)
+        user_ids = []
+
+    scenarios = build_scenarios(pairs, user_ids)
+    bases = {'server': args.server_url.rstrip('/'), 'api': args.api_url.rstrip('/')}
+
+    report = {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'seed': args.seed
+        },
+        'scenarios': {}
+    }
+    for name in [name.strip() for name in args.scenarios.split(',') if name.strip()]:
+        if name not in scenarios:
+            print(f"Skipping {name}: unknown scenario or no data to drive it", file=sys.stderr)
+            continue
+        base, method, path, payload = scenarios[name]
+        url = bases[base] + path
+        if args.warmup:
+            run_scenario(url, method, payload, args.warmup, args.concurrency, args.seed + 1)
+        result = run_scenario(url, method, payload, args.requests, args.concurrency, args.seed)
+        report['scenarios'][name] = dict(result, method=method, url=url)
+        print(f"{name}: {result['throughput_rps']} req/s, p95 "
+              f"{result['latency_ms']['p95'] if result['latency_ms'] else '-'} ms", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            f.write(output + '\n')
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return 0
+    if args.no_compare:
+        return 0
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read baseline {args.baseline}: {e}", file=sys.stderr)
+        return 1
+    if baseline.get('config') != report['config']:
+        print(f"Warning: baseline was run with {baseline.get('config')}", file=sys.stderr)
+
+    regressions = compare(report, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+import cv2
+
+import metrics
+import ocr_processor
+import preprocessing
+from database_handler import match_medicine_name, search_medication
+from display_handler import render_medication_info
+from fda_api import get_medication_info
+from ocr_cache import image_hash
+from webcam_capture import FrameGrabber
+
+# Two settled frames whose difference hashes (256 bits) differ in at most
+# this many bits show the same box; anything further is a new scene
+SCAN_SAME_SCENE_DISTANCE = int(os.environ.get('SCAN_SAME_SCENE_DISTANCE', '12'))
+
+# Largest hash distance at which a remembered identification is shown again
+# without OCR. Much tighter than the scene gate: two boxes of one brand at
+# different strengths can be a few bits apart, and reusing across them would
+# show the wrong medicine, whereas a needless OCR run only costs time
+SCAN_REUSE_DISTANCE = int(os.environ.get('SCAN_REUSE_DISTANCE', '2'))
+
+# Recently identified scenes kept for reuse when a box comes back into view
+SCAN_RESULT_CACHE_SIZE = int(os.environ.get('SCAN_RESULT_CACHE_SIZE', '64'))
+
+# Preprocessing preset for continuous scanning; speed matters more than
+# for a single deliberate capture
+SCAN_PRESET = os.environ.get('SCAN_PRESET', 'fast')
+
+
+def _hash_distance(a, b):
+    return bin(a ^ b).count('1')
+
+def _put_latest(stage_queue, item):
+    """
+    Put `item` on a bounded queue, discarding the oldest entry if it is
+    full, so a slow consumer always gets the newest work.
+
+    Returns:
+        bool: True if an older item was dropped
+    """
+    dropped = False
+    while True:
+        try:
+            stage_queue.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                stage_queue.get_nowait()
+                dropped = True
+            except queue.Empty:
+                pass
+
+
+class ContinuousScanner:
+    """
+    Scan medicine boxes continuously from the webcam.
+
+    Stages run on their own threads, joined by bounded queues:
+
+        capture (FrameGrabber) -> change gate -> OCR -> lookup -> display
+
+    The gate only passes a frame on once the camera has settled on a sharp
+    image of something not scanned yet, so OCR cost follows the number of
+    new boxes rather than the frame rate. Scenes seen recently reuse their
+    result without OCR. Each queue holds a single item and keeps the
+    newest, so a slow OCR step drops stale frames instead of building a
+    backlog. The display loop never waits on any stage.
+    """
+
+    def __init__(self, source=0, preset=SCAN_PRESET, same_scene_distance=SCAN_SAME_SCENE_DISTANCE,
+                 cache_size=SCAN_RESULT_CACHE_SIZE, reuse_distance=SCAN_REUSE_DISTANCE):
+        """
+        Args:
+            source (int or str): cv2.VideoCapture device index or URL
+            preset (str): Preprocessing preset used before OCR
+            same_scene_distance (int): Largest hash distance for the same scene
+            cache_size (int): Number of scene results kept for reuse
+            reuse_distance (int): Largest hash distance for reusing a result
+        """
+        self.grabber = FrameGrabber(source)
+        self.preset = preprocessing.resolve_preset(preset)
+        self.same_scene_distance = same_scene_distance
+        self.reuse_distance = min(reuse_distance, same_scene_distance)
+        self.cache_size = max(1, cache_size)
+
+        self._ocr_queue = queue.Queue(maxsize=1)
+        self._lookup_queue = queue.Queue(maxsize=1)
+        self._display_queue = queue.Queue(maxsize=1)
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self.stats = {'frames': 0, 'settled': 0, 'ocr_runs': 0, 'reused': 0, 'dropped': 0, 'identified': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        """Increment a stats counter; the stages update them from their own threads."""
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        """Return a consistent copy of the stats counters."""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def _cached_result(self, scene_hash):
+        """
+        Look up the closest recently scanned scene within the reuse distance.
+
+        Returns:
+            tuple: (found, medication info or None if it was unreadable)
+        """
+        with self._results_lock:
+            best_hash, best_distance = None, self.reuse_distance + 1
+            for stored_hash in self._results:
+                distance = _hash_distance(scene_hash, stored_hash)
+                if distance < best_distance:
+                    best_hash, best_distance = stored_hash, distance
+            if best_hash is not None:
+                self._results.move_to_end(best_hash)
+                return True, self._results[best_hash]
+        return False, None
+
+    def _remember(self, scene_hash, result):
+        with self._results_lock:
+            self._results[scene_hash] = result
+            self._results.move_to_end(scene_hash)
+            while len(self._results) > self.cache_size:
+                self._results.popitem(last=False)
+
+    def _gate(self):
+        """Change gate: pass settled frames of new scenes on to OCR."""
+        seen = 0
+        last_scene = None
+        while not self._stop.is_set():
+            frame, seen = self.grabber.next_frame(seen, timeout=0.5)
+            if frame is None:
+                if not self.grabber.running:
+                    break
+                continue
+            self._count('frames')
+
+            # Wait for the camera to settle on a sharp image
+            if not self.grabber.is_ready(frame):
+                continue
+
+            scene_hash = image_hash(frame.grey)
+            if last_scene is not None and _hash_distance(scene_hash, last_scene) <= self.same_scene_distance:
+                continue
+            last_scene = scene_hash
+            self._count('settled')
+
+            found, result = self._cached_result(scene_hash)
+            if found:
+                self._count('reused')
+                if result is not None:
+                    _put_latest(self._display_queue, result)
+            elif _put_latest(self._ocr_queue, (scene_hash, frame.image)):
+                self._count('dropped')
+
+    def _ocr(self):
+        """OCR stage: identify the medicine name on each new scene."""
+        while not self._stop.is_set():
+            try:
+                scene_hash, image = self._ocr_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            self._count('ocr_runs')
+            with metrics.stage('ocr', pipeline='continuous'):
+                try:
+                    processed, _ = preprocessing.preprocess(image, self.preset)
+                    found, results, _ = ocr_processor.identify_medication(processed, match_medicine_name)
+                except Exception as e:
+                    print(f"Error during OCR: {e}")
+                    continue
+
+            if found:
+                medication_name = found['name']
+            else:
+                medication_name = ocr_processor.extract_medication_name(
+                    ' '.join(text for _, text, _ in results)
+                )
+
+            if not medication_name:
+                # Remember unreadable scenes too, so they are not rescanned
+                self._remember(scene_hash, None)
+                continue
+
+            if _put_latest(self._lookup_queue, (scene_hash, medication_name)):
+                self._count('dropped')
+
+    def _lookup(self):
+        """Lookup stage: local database first, then the FDA API."""
+        while not self._stop.is_set():
+            try:
+                scene_hash, medication_name = self._lookup_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            with metrics.stage('lookup', pipeline='continuous'):
+                medication_info = search_medication(medication_name) or get_medication_info(medication_name)
+            if not medication_info:
+                medication_info = {'name': medication_name, 'source': 'Not found'}
+
+            self._count('identified')
+            self._remember(scene_hash, medication_info)
+            _put_latest(self._display_queue, medication_info)
+
+    def start(self):
+        """
+        Start the camera and the pipeline threads.
+
+        Returns:
+            bool: False if the camera could not be opened
+        """
+        if not self.grabber.start():
+            return False
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=target, name=f'scan-{target.__name__.strip("_")}', daemon=True)
+            for target in (self._gate, self._ocr, self._lookup)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def stop(self):
+        """Stop the pipeline threads and release the camera."""
+        self._stop.set()
+        self.grabber.stop()
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+
+    def run(self):
+        """
+        Show the live preview and identified medicines until ESC is pressed.
+        """
+        if not self.start():
+            print("Error opening webcam")
+            return
+
+        print("Continuous scan started. Hold each box steady in view; press ESC to quit.")
+        current = None
+        try:
+            while self.grabber.running:
+                try:
+                    medication_info = self._display_queue.get_nowait()
+                except queue.Empty:
+                    medication_info = None
+                if medication_info is not None and medication_info is not current:
+                    current = medication_info
+                    print(f"Identified: {current['name']} ({current['source']})")
+                    cv2.imshow('Medication Information', render_medication_info(current))
+
+                frame = self.grabber.latest()
+                if frame is not None:
+                    preview = frame.image.copy()
+                    status = current['name'] if current else 'Scanning...'
+                    cv2.putText(preview, status, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 200, 0), 2)
+                    cv2.imshow('Continuous Scan', preview)
+
+                # ESC quits
+                if cv2.waitKey(15) == 27:
+                    break
+        finally:
+            self.stop()
+            cv2.destroyAllWindows()
+            print(f"Continuous scan stats: {self.get_stats()}")
@@ -1,15 +1,73 @@
 import sqlite3
 import os
 
-# Database file path
-DB_PATH = 'medicine_reminder.db'
+import event_bus
+from db_connection import DB_PATH, connection, transaction
+from medicine_index import medicine_index
+from migrations import migrate
+
+# Minimum similarity for a fuzzy match to count as the same medicine
+FUZZY_MATCH_THRESHOLD = 0.8
+
+# Records written per transaction by submit_form_data_batch
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '1000'))
+
+# Bound parameters per statement supported by older SQLite builds
+SQLITE_MAX_VARIABLES = 999
+
+# Highest medicine_id in the name index, for incremental refreshes
+_indexed_medicine_id = 0
 
 def initialize_database():
-    """Initialize the database with required tables if they don't exist."""
-    # This function can be removed or kept as a placeholder if you want to check for existing tables.
-    print("Database initialization is not required as tables are assumed to exist.")
+    """Bring the database schema up to date by applying pending migrations."""
+    try:
+        applied = migrate()
+    except sqlite3.Error as e:
+        print(f"Database migration error: {e}")
+        return False
+
+    if applied:
+        print(f"Applied database migrations: {applied}")
     return True
 
+def get_medicine_index(refresh=False):
+    """
+    Return the shared medicine name index, loading it from the
+    medicines table on first use.
+
+    Args:
+        refresh (bool): Also index medicines added since the last load,
+            e.g. by another process (OCR workers keep their own copy)
+    """
+    global _indexed_medicine_id
+    if not medicine_index.loaded or refresh:
+        try:
+            with connection() as conn:
+                rows = conn.execute(
+                    'SELECT medicine_id, name FROM medicines WHERE medicine_id > ? ORDER BY medicine_id',
+                    (_indexed_medicine_id if medicine_index.loaded else 0,)
+                ).fetchall()
+            if medicine_index.loaded:
+                for _, name in rows:
+                    medicine_index.add(name)
+            else:
+                medicine_index.load(name for _, name in rows)
+            if rows:
+                _indexed_medicine_id = rows[-1][0]
+        except sqlite3.Error as e:
+            print(f"Medicine index load error: {e}")
+    return medicine_index
+
+def match_medicine_name(text):
+    """
+    Closest known medicine for a piece of OCR text.
+
+    Returns:
+        tuple or None: (name, score) if the similarity reaches
+        FUZZY_MATCH_THRESHOLD, otherwise None
+    """
+    return get_medicine_index().best_match(text, min_score=FUZZY_MATCH_THRESHOLD)
+
 def submit_form_data(form_data):
     """
     Submit form data to the database.
@@ -21,92 +79,293 @@ def submit_form_data(form_data):
         tuple: (success_boolean, message)
     """
     try:
-        # Establish database connection
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Start a transaction
-        conn.execute('BEGIN')
-
-        # Insert or get doctor ID
-        cursor.execute('''
-            INSERT OR IGNORE INTO doctors (name) 
-            VALUES (?)
-        ''', (form_data['doctor'],))
-        cursor.execute('SELECT doctor_id FROM doctors WHERE name = ?', (form_data['doctor'],))
-        doctor_id = cursor.fetchone()[0]
-
-        # Insert user information
-        cursor.execute('''
-            INSERT INTO users (name, age) 
-            VALUES (?, ?)
-        ''', (form_data['name'], form_data['age']))
-        
-        # Get the last inserted user ID
-        user_id = cursor.lastrowid
+        # Run every insert in a single transaction on a pooled connection
+        with transaction() as conn:
+            cursor = conn.cursor()
 
-        # Process medicines and prescriptions
-        for med in form_data['medicines']:
-            # First, insert or get the medicine ID
+            # Insert or get doctor ID
             cursor.execute('''
-                INSERT OR IGNORE INTO medicines (name) 
+                INSERT OR IGNORE INTO doctors (name) 
                 VALUES (?)
-            ''', (med['name'],))
-            
-            # Get the medicine ID (either newly inserted or existing)
-            cursor.execute('SELECT medicine_id FROM medicines WHERE name = ?', (med['name'],))
-            medicine_id = cursor.fetchone()[0]
+            ''', (form_data['doctor'],))
+            cursor.execute('SELECT doctor_id FROM doctors WHERE name = ?', (form_data['doctor'],))
+            doctor_id = cursor.fetchone()[0]
 
-            # Insert prescription
+            # Insert user information
             cursor.execute('''
-                INSERT INTO prescriptions (user_id, doctor_id, medicine_id, doses_per_day) 
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, doctor_id, medicine_id, med['doses']))
+                INSERT INTO users (name, age) 
+                VALUES (?, ?)
+            ''', (form_data['name'], form_data['age']))
+        
+            # Get the last inserted user ID
+            user_id = cursor.lastrowid
+            prescriptions = []
+
+            # Process medicines and prescriptions
+            for med in form_data['medicines']:
+                # First, insert or get the medicine ID
+                cursor.execute('''
+                    INSERT OR IGNORE INTO medicines (name) 
+                    VALUES (?)
+                ''', (med['name'],))
             
-            # Get the last inserted prescription ID
-            prescription_id = cursor.lastrowid
+                # Get the medicine ID (either newly inserted or existing)
+                cursor.execute('SELECT medicine_id FROM medicines WHERE name = ?', (med['name'],))
+                medicine_id = cursor.fetchone()[0]
 
-            # Insert dosage times
-            for time in med['times']:
+                # Insert prescription
                 cursor.execute('''
-                    INSERT INTO dosage_times (prescription_id, time_of_day) 
-                    VALUES (?, ?)
-                ''', (prescription_id, time))
+                    INSERT INTO prescriptions (user_id, doctor_id, medicine_id, doses_per_day) 
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, doctor_id, medicine_id, med['doses']))
+            
+                # Get the last inserted prescription ID
+                prescription_id = cursor.lastrowid
 
-        # Commit the transaction
-        conn.commit()
-        conn.close()
+                # Insert dosage times
+                for time in med['times']:
+                    cursor.execute('''
+                        INSERT INTO dosage_times (prescription_id, time_of_day) 
+                        VALUES (?, ?)
+                    ''', (prescription_id, time))
+
+                prescriptions.append({
+                    'prescription_id': prescription_id,
+                    'medicine_id': medicine_id,
+                    'medicine_name': med['name'],
+                    'doses_per_day': med['doses'],
+                    'times': list(med['times'])
+                })
+
+        # Make newly prescribed medicines searchable straight away
+        index = get_medicine_index()
+        for med in form_data['medicines']:
+            index.add(med['name'])
+
+        # Let the notification server schedule the new doses right away
+        event_bus.publish(
+            event_bus.PRESCRIPTION_CREATED,
+            user_id=user_id,
+            user_name=form_data['name'],
+            prescriptions=prescriptions
+        )
 
         return True, "Form data saved successfully"
 
     except sqlite3.Error as e:
-        # Rollback in case of error
-        conn.rollback()
+        # The transaction has already been rolled back
         print(f"Database error: {e}")
         return False, f"Database error: {str(e)}"
 
     except Exception as e:
-        # Rollback in case of any other error
-        conn.rollback()
+        # The transaction has already been rolled back
         print(f"Error saving form data: {e}")
         return False, f"Error saving form data: {str(e)}"
 
+class InvalidRecord:
+    """
+    Stands in for a batch record that could not even be parsed, such as
+    a malformed NDJSON line, so it is reported with its own message.
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+def _is_count(value):
+    """True for an integer (or string of digits), but not a boolean."""
+    if isinstance(value, str):
+        return value.strip().isdigit()
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _is_name(value):
+    return isinstance(value, str) and bool(value.strip())
+
+def _validate_record(record):
+    """
+    Check one form record before a batch import, including the types
+    and NOT NULL columns, so that bad records fail on their own instead
+    of rolling back the chunk they are written in.
+
+    Returns:
+        str or None: Error message, None if the record is valid
+    """
+    if isinstance(record, InvalidRecord):
+        return record.message
+    if not isinstance(record, dict):
+        return 'Record must be an object'
+    for field in ('name', 'age', 'doctor', 'medicines'):
+        if field not in record:
+            return f'Missing field: {field}'
+    if not _is_name(record['name']):
+        return 'name must be a non-empty string'
+    if not _is_count(record['age']):
+        return 'age must be a whole number'
+    if not _is_name(record['doctor']):
+        return 'doctor must be a non-empty string'
+    if not isinstance(record['medicines'], list):
+        return 'medicines must be a list'
+    for med in record['medicines']:
+        if not isinstance(med, dict) or not all(field in med for field in ('name', 'doses', 'times')):
+            return 'Each medicine needs name, doses and times'
+        if not _is_name(med['name']):
+            return 'Medicine name must be a non-empty string'
+        if not _is_count(med['doses']):
+            return 'doses must be a whole number'
+        if not isinstance(med['times'], list) or not all(_is_name(time) for time in med['times']):
+            return 'times must be a list of strings'
+    return None
+
+def _resolve_ids(cursor, table, id_column, names):
+    """
+    Insert any missing names into a name-keyed table and return name -> id,
+    using one executemany and a few IN queries instead of a SELECT per name.
+    """
+    names = list(names)
+    cursor.executemany(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', [(name,) for name in names])
+
+    ids = {}
+    for start in range(0, len(names), SQLITE_MAX_VARIABLES):
+        chunk = names[start:start + SQLITE_MAX_VARIABLES]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'SELECT name, {id_column} FROM {table} WHERE name IN ({placeholders})', chunk)
+        ids.update(cursor.fetchall())
+    return ids
+
+def _next_id(cursor, table, id_column):
+    """First unused AUTOINCREMENT id of a table; call inside BEGIN IMMEDIATE."""
+    cursor.execute(f'''
+        SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0),
+                   COALESCE((SELECT MAX({id_column}) FROM {table}), 0))
+    ''', (table,))
+    return cursor.fetchone()[0] + 1
+
+def _import_chunk(records):
+    """
+    Insert a chunk of validated records in one transaction.
+
+    User and prescription ids are assigned up front from the table's
+    sequence while the write lock is held, so every table can be filled
+    with a single executemany.
+
+    Returns:
+        list: The user id assigned to each record
+    """
+    with transaction(immediate=True) as conn:
+        cursor = conn.cursor()
+
+        doctor_ids = _resolve_ids(cursor, 'doctors', 'doctor_id',
+                                  {record['doctor'] for record in records})
+        medicine_ids = _resolve_ids(cursor, 'medicines', 'medicine_id',
+                                    {med['name'] for record in records for med in record['medicines']})
+
+        user_id = _next_id(cursor, 'users', 'user_id')
+        prescription_id = _next_id(cursor, 'prescriptions', 'prescription_id')
+
+        users, prescriptions, dosage_times, user_ids = [], [], [], []
+        for record in records:
+            users.append((user_id, record['name'], record['age']))
+            user_ids.append(user_id)
+            for med in record['medicines']:
+                prescriptions.append((prescription_id, user_id, doctor_ids[record['doctor']],
+                                      medicine_ids[med['name']], med['doses']))
+                dosage_times.extend((prescription_id, time) for time in med['times'])
+                prescription_id += 1
+            user_id += 1
+
+        cursor.executemany('INSERT INTO users (user_id, name, age) VALUES (?, ?, ?)', users)
+        cursor.executemany('''
+            INSERT INTO prescriptions (prescription_id, user_id, doctor_id, medicine_id, doses_per_day)
+            VALUES (?, ?, ?, ?, ?)
+        ''', prescriptions)
+        cursor.executemany('''
+            INSERT INTO dosage_times (prescription_id, time_of_day)
+            VALUES (?, ?)
+        ''', dosage_times)
+
+    return user_ids
+
+def submit_form_data_batch(records, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Import many form records (the same shape submit_form_data takes).
+
+    Records are validated in one pass and valid ones are written in
+    transactions of `chunk_size` records. A chunk that still fails is
+    rolled back and retried one record per transaction, so only the
+    records that fail on their own are reported as errors; earlier
+    chunks stay committed.
+
+    Args:
+        records (iterable): Form data dictionaries
+        chunk_size (int): Records per transaction
+
+    Returns:
+        list: One result dict per record, in input order, with 'index',
+            'status' ('success' or 'error') and 'user_id' or 'message'
+    """
+    results = []
+    pending = []
+    imported = 0
+
+    def write(chunk):
+        nonlocal imported
+        try:
+            user_ids = _import_chunk([record for _, record in chunk])
+        except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
+            if len(chunk) > 1:
+                # Find the culprits: one record per transaction
+                for item in chunk:
+                    write([item])
+                return
+            print(f"Batch import error: {e}")
+            index = chunk[0][0]
+            results[index] = {'index': index, 'status': 'error', 'message': f'Database error: {e}'}
+        else:
+            index = get_medicine_index()
+            for (position, record), user_id in zip(chunk, user_ids):
+                results[position] = {'index': position, 'status': 'success', 'user_id': user_id}
+                for med in record['medicines']:
+                    index.add(med['name'])
+            imported += len(user_ids)
+
+    def flush():
+        if pending:
+            write(list(pending))
+            pending.clear()
+
+    for position, record in enumerate(records):
+        error = _validate_record(record)
+        if error:
+            results.append({'index': position, 'status': 'error', 'message': error})
+            continue
+        results.append(None)
+        pending.append((position, record))
+        if len(pending) >= chunk_size:
+            flush()
+    flush()
+
+    # One event for the whole import; the notification server reloads its
+    # schedule rather than receiving an event per patient
+    if imported:
+        event_bus.publish(event_bus.PRESCRIPTIONS_IMPORTED, count=imported)
+
+    return results
+
 def search_medication(medication_name):
-    """Search for medication information in the database."""
+    """
+    Search for medication information in the database.
+
+    Uses the in-memory medicine index, so OCR misreads such as
+    "Lisinoprll" still resolve to the closest known medicine.
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Search for medication by name (case insensitive)
-        cursor.execute("SELECT name FROM medicines WHERE LOWER(name) = LOWER(?)", (medication_name,))
-        result = cursor.fetchone()
+        match = get_medicine_index().best_match(medication_name, min_score=FUZZY_MATCH_THRESHOLD)
         
-        conn.close()
-        
-        if result:
+        if match:
+            name, score = match
             return {
-                'name': result[0],
-                'source': 'Local Database'
+                'name': name,
+                'source': 'Local Database',
+                'match_score': round(score, 3)
             }
         else:
             print(f"No information found for '{medication_name}' in local database.")
@@ -114,4 +373,29 @@ def search_medication(medication_name):
             
     except Exception as e:
         print(f"Database search error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def search_medicine_names(query, limit=10):
+    """
+    Autocomplete medicine names for a partially typed query.
+
+    Prefix matches come first; if there are fewer than `limit`, the
+    closest fuzzy matches fill the remaining slots.
+
+    Args:
+        query (str): Text typed so far
+        limit (int): Maximum number of suggestions
+
+    Returns:
+        list: Dictionaries with 'name' and 'score'
+    """
+    index = get_medicine_index()
+    results = [{'name': name, 'score': 1.0} for name in index.prefix(query, limit)]
+
+    if len(results) < limit:
+        seen = {result['name'] for result in results}
+        for name, score in index.search(query, limit=limit):
+            if name not in seen and len(results) < limit:
+                results.append({'name': name, 'score': round(score, 3)})
+
+    return results
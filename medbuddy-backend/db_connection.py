@@ -0,0 +1,33 @@
+import os
+import threading
+
+from medbuddy_shared.sqlite_pool import ConnectionPool, PoolTimeout  # noqa: F401 (re-exported)
+
+# Database file path; next to this module unless DB_PATH says otherwise,
+# so it does not depend on the working directory
+DB_PATH = os.environ.get('DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 'medicine_reminder.db'))
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path=DB_PATH):
+    """Return the shared pool for a database file, creating it on first use."""
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = ConnectionPool(db_path)
+        return pool
+
+def connection(db_path=DB_PATH):
+    """
+    Borrow a pooled connection: `with connection() as conn: ...`
+    """
+    return get_pool(db_path).connection()
+
+def transaction(db_path=DB_PATH, immediate=False):
+    """
+    Borrow a pooled connection inside a transaction:
+    `with transaction() as conn: ...`
+    """
+    return get_pool(db_path).transaction(immediate)
@@ -1,14 +1,13 @@
 import cv2
 import numpy as np
 
-def show_medication_info(info):
+def render_medication_info(info):
     """
-    Display medication information on screen in a formatted window.
+    Draw medication information into an image, without showing it.
+
+    Returns:
+        numpy.ndarray: 400x800 BGR image
     """
-    if not info:
-        print("No medication information available to display.")
-        return
-    
     # Create a blank image to display information
     img = 255 * np.ones((400, 800, 3), dtype=np.uint8)
     
@@ -17,7 +16,8 @@ def show_medication_info(info):
     cv2.putText(img, f"Dosage Information:", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
     
     # Split dosage text into multiple lines if it's too long
-    dosage_words = info['dosage'].split()
+    # (local database matches carry no dosage text)
+    dosage_words = info.get('dosage', 'No dosage information available').split()
     line = ""
     y_position = 150
     
@@ -37,7 +37,17 @@ def show_medication_info(info):
     # Add source information
     cv2.putText(img, f"Source: {info['source']}", (50, y_position + 80), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 1)
     
+    return img
+
+def show_medication_info(info):
+    """
+    Display medication information on screen in a formatted window.
+    """
+    if not info:
+        print("No medication information available to display.")
+        return
+    
     # Display the image
-    cv2.imshow('Medication Information', img)
+    cv2.imshow('Medication Information', render_medication_info(info))
     cv2.waitKey(0)
     cv2.destroyAllWindows()
@@ -1,5 +1,178 @@
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+import event_bus
+from db_connection import DB_PATH, connection, transaction
+from schedule_index import get_schedule_index, to_minutes
+
+# Maximum number of user and medicine names whose ids are kept in memory
+ID_CACHE_SIZE = 4096
+
+# Prescribed times plus today's intake for one user and medicine, in one query.
+# dosage_tracking holds one row per user, medicine and day (see its UNIQUE
+# constraint), so doses_taken is that row's running count.
+SCHEDULE_QUERY = '''
+    SELECT
+        p.doses_per_day,
+        dt.time_of_day,
+        COALESCE(today.doses_taken, 0) AS doses_taken,
+        today.first_intake_time
+    FROM prescriptions p
+    JOIN dosage_times dt ON p.prescription_id = dt.prescription_id
+    JOIN (SELECT MAX(doses_taken) AS doses_taken,
+                 MIN(last_intake_time) AS first_intake_time
+          FROM dosage_tracking
+          WHERE medicine_id = ? AND user_id = ? AND intake_date = date('now')) today
+    WHERE p.user_id = ? AND p.medicine_id = ?
+    ORDER BY dt.time_of_day
+'''
+
+# Today's intake for one user and medicine; the schedule itself comes from
+# the in-memory schedule index
+DOSES_TODAY_QUERY = '''
+    SELECT COALESCE(MAX(doses_taken), 0)
+    FROM dosage_tracking
+    WHERE medicine_id = ? AND user_id = ? AND intake_date = date('now')
+'''
+
+RECORD_DOSE_QUERY = '''
+    INSERT INTO dosage_tracking
+    (medicine_id, user_id, doses_taken, total_doses_per_day, intake_date, last_intake_time)
+    VALUES (?, ?, ?, ?, date('now'), datetime('now'))
+    ON CONFLICT (medicine_id, user_id, intake_date) DO UPDATE SET
+        doses_taken = excluded.doses_taken,
+        total_doses_per_day = excluded.total_doses_per_day,
+        last_intake_time = excluded.last_intake_time
+'''
+
+# As RECORD_DOSE_QUERY, for a dose taken at a given (UTC) date and time
+RECORD_DOSE_AT_QUERY = '''
+    INSERT INTO dosage_tracking
+    (medicine_id, user_id, doses_taken, total_doses_per_day, intake_date, last_intake_time)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (medicine_id, user_id, intake_date) DO UPDATE SET
+        doses_taken = excluded.doses_taken,
+        total_doses_per_day = excluded.total_doses_per_day,
+        last_intake_time = MAX(COALESCE(last_intake_time, ''), excluded.last_intake_time)
+'''
+
+# Bound parameters per statement supported by older SQLite builds
+SQLITE_MAX_VARIABLES = 999
+
+# How far in the future an event timestamp may be (device clock skew)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class _IdCache:
+    """Small thread-safe LRU mapping names to database ids."""
+
+    def __init__(self, max_entries=ID_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            value = self._entries.get(name)
+            if value is not None:
+                self._entries.move_to_end(name)
+            return value
+
+    def put(self, name, value):
+        with self._lock:
+            self._entries[name] = value
+            self._entries.move_to_end(name)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Shared across trackers; only ids that were found are cached
+_user_ids = _IdCache()
+_medicine_ids = _IdCache()
+
+def _check_dose(total_doses, doses_taken, dosage_times, on_time):
+    """
+    Validate one dose against the daily maximum and prescribed times.
+
+    Args:
+        total_doses (int): Prescribed doses per day
+        doses_taken (int): Doses already taken that day
+        dosage_times (list): Prescribed 'HH:MM' times
+        on_time (bool): Whether the dose is within DOSE_WINDOW_MINUTES of
+            one of them (see ScheduleIndex.in_window)
+
+    Returns:
+        dict or None: The rejection result, None if the dose is valid
+    """
+    if doses_taken >= total_doses:
+        return {
+            'status': 'max_dose_reached',
+            'message': 'Maximum daily dosage reached. Do not take more medication.',
+            'doses_taken': doses_taken,
+            'total_doses': total_doses
+        }
+
+    if not on_time:
+        return {
+            'status': 'wrong_time',
+            'message': f'Not the right time to take medication. Prescribed times: {", ".join(dosage_times)}',
+            'prescribed_times': dosage_times
+        }
+    return None
+
+def _parse_event_time(value, now):
+    """
+    Parse an event timestamp (ISO 8601; naive values are local time).
+
+    Returns:
+        tuple or None: (local datetime, UTC datetime), None if malformed
+    """
+    if value is None:
+        taken_at = now
+    else:
+        try:
+            taken_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if taken_at.tzinfo is not None:
+        taken_at = taken_at.astimezone().replace(tzinfo=None)
+    return taken_at, taken_at.astimezone(timezone.utc)
+
+def _indexed_schedules(pairs):
+    """
+    Prescribed schedules of (user_id, medicine_id) pairs from the schedule
+    index. Pairs it does not know trigger one incremental refresh, in case
+    they were prescribed by another process.
+
+    Loading and refreshing the index borrow a pooled connection, so never
+    call this while holding one.
+
+    Returns:
+        tuple: (the ScheduleIndex, {pair: (doses_per_day, times) or None})
+    """
+    index = get_schedule_index()
+    schedules = {pair: index.schedule(*pair) for pair in pairs}
+    if None in schedules.values():
+        index.refresh()
+        schedules = {pair: index.schedule(*pair) for pair in pairs}
+    return index, schedules
+
+def _select_in(cursor, query, values, params=()):
+    """
+    Run `query`, whose `{}` marks an IN list, over `values` in chunks.
+    `params` are bound before the IN values.
+    """
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), SQLITE_MAX_VARIABLES - len(params)):
+        chunk = values[start:start + SQLITE_MAX_VARIABLES - len(params)]
+        cursor.execute(query.format(','.join('?' * len(chunk))), (*params, *chunk))
+        rows.extend(cursor.fetchall())
+    return rows
 
 class DosageTracker:
     def __init__(self, user_name, medicine_name):
@@ -10,13 +183,13 @@ class DosageTracker:
             user_name (str): Name of the user
             medicine_name (str): Name of the medicine
         """
-        self.DB_PATH = 'medicine_reminder.db'
+        self.DB_PATH = DB_PATH
         self.user_name = user_name
         self.medicine_name = medicine_name
 
     def _get_user_id(self, cursor):
         """
-        Retrieve user ID from the database.
+        Retrieve user ID, from the id cache when possible.
         
         Args:
             cursor (sqlite3.Cursor): Database cursor
@@ -24,13 +197,18 @@ class DosageTracker:
         Returns:
             int or None: User ID if found, None otherwise
         """
-        cursor.execute('SELECT user_id FROM users WHERE name = ?', (self.user_name,))
-        user_result = cursor.fetchone()
-        return user_result[0] if user_result else None
+        user_id = _user_ids.get(self.user_name)
+        if user_id is None:
+            cursor.execute('SELECT user_id FROM users WHERE name = ?', (self.user_name,))
+            user_result = cursor.fetchone()
+            if user_result:
+                user_id = user_result[0]
+                _user_ids.put(self.user_name, user_id)
+        return user_id
 
     def _get_medicine_id(self, cursor):
         """
-        Retrieve medicine ID from the database.
+        Retrieve medicine ID, from the id cache when possible.
         
         Args:
             cursor (sqlite3.Cursor): Database cursor
@@ -38,9 +216,45 @@ class DosageTracker:
         Returns:
             int or None: Medicine ID if found, None otherwise
         """
-        cursor.execute('SELECT medicine_id FROM medicines WHERE name = ?', (self.medicine_name,))
-        medicine_result = cursor.fetchone()
-        return medicine_result[0] if medicine_result else None
+        medicine_id = _medicine_ids.get(self.medicine_name)
+        if medicine_id is None:
+            cursor.execute('SELECT medicine_id FROM medicines WHERE name = ?', (self.medicine_name,))
+            medicine_result = cursor.fetchone()
+            if medicine_result:
+                medicine_id = medicine_result[0]
+                _medicine_ids.put(self.medicine_name, medicine_id)
+        return medicine_id
+
+    def _load_schedule(self, cursor, user_id, medicine_id):
+        """
+        Load prescribed times and today's intake in a single query.
+        
+        Args:
+            cursor (sqlite3.Cursor): Database cursor
+            user_id (int): User ID
+            medicine_id (int): Medicine ID
+        
+        Returns:
+            dict or None: Medication details, None if nothing is prescribed
+        """
+        cursor.execute(SCHEDULE_QUERY, (medicine_id, user_id, user_id, medicine_id))
+        results = cursor.fetchall()
+
+        if not results:
+            return None
+
+        dosage_times = []
+        for result in results:
+            if result[1] not in dosage_times:
+                dosage_times.append(result[1])
+
+        return {
+            'medicine_id': medicine_id,
+            'total_doses': results[0][0],
+            'dosage_times': dosage_times,
+            'doses_taken': results[0][2],
+            'first_intake_time': results[0][3]
+        }
 
     def get_medication_details(self):
         """
@@ -50,56 +264,19 @@ class DosageTracker:
             dict: Medication details including dosage information
         """
         try:
-            conn = sqlite3.connect(self.DB_PATH)
-            cursor = conn.cursor()
-
-            # Get user ID and medicine ID
-            user_id = self._get_user_id(cursor)
-            if not user_id:
-                conn.close()
-                return None
-
-            medicine_id = self._get_medicine_id(cursor)
-            if not medicine_id:
-                conn.close()
-                return None
-
-            # Fetch comprehensive medication details
-            cursor.execute('''
-                SELECT 
-                    m.medicine_id, 
-                    p.doses_per_day, 
-                    dt.dosage_time_id,
-                    dt.time_of_day,
-                    (SELECT COUNT(*) FROM dosage_tracking 
-                     WHERE medicine_id = m.medicine_id 
-                     AND user_id = ? 
-                     AND intake_date = date('now')) as doses_taken,
-                    (SELECT MIN(last_intake_time) FROM dosage_tracking 
-                     WHERE medicine_id = m.medicine_id 
-                     AND user_id = ? 
-                     AND intake_date = date('now')) as first_intake_time
-                FROM medicines m
-                JOIN prescriptions p ON m.medicine_id = p.medicine_id
-                JOIN dosage_times dt ON p.prescription_id = dt.prescription_id
-                WHERE m.medicine_id = ? AND p.user_id = ?
-                GROUP BY m.medicine_id, dt.time_of_day
-            ''', (user_id, user_id, medicine_id, user_id))
-
-            results = cursor.fetchall()
-            conn.close()
-
-            if not results:
-                return None
-
-            # Organize results
-            return {
-                'medicine_id': results[0][0],
-                'total_doses': results[0][1],
-                'dosage_times': [result[3] for result in results],
-                'doses_taken': results[0][4],
-                'first_intake_time': results[0][5]
-            }
+            with connection(self.DB_PATH) as conn:
+                cursor = conn.cursor()
+
+                # Get user ID and medicine ID
+                user_id = self._get_user_id(cursor)
+                if not user_id:
+                    return None
+
+                medicine_id = self._get_medicine_id(cursor)
+                if not medicine_id:
+                    return None
+
+                return self._load_schedule(cursor, user_id, medicine_id)
 
         except sqlite3.Error as e:
             print(f"Database error: {e}")
@@ -109,76 +286,67 @@ class DosageTracker:
         """
         Track and record medication dosage with advanced validation.
         
+        Today's intake is read, validated and updated in one BEGIN
+        IMMEDIATE transaction, so two simultaneous taps cannot both pass
+        the maximum-dose check. Ids and the prescribed schedule are looked
+        up first; prescriptions are only ever added, so they cannot change
+        underneath it.
+        
         Returns:
             dict: Dosage tracking status and details
         """
         try:
-            conn = sqlite3.connect(self.DB_PATH)
-            cursor = conn.cursor()
-
             # Get user and medicine IDs
-            user_id = self._get_user_id(cursor)
-            if not user_id:
-                conn.close()
-                return {'status': 'error', 'message': 'User not found'}
-
-            medicine_id = self._get_medicine_id(cursor)
-            if not medicine_id:
-                conn.close()
-                return {'status': 'error', 'message': 'Medicine not found'}
-
-            # Get medication details
-            medication_details = self.get_medication_details()
-            if not medication_details:
-                conn.close()
+            with connection(self.DB_PATH) as conn:
+                cursor = conn.cursor()
+                user_id = self._get_user_id(cursor)
+                if not user_id:
+                    return {'status': 'error', 'message': 'User not found'}
+
+                medicine_id = self._get_medicine_id(cursor)
+                if not medicine_id:
+                    return {'status': 'error', 'message': 'Medicine not found'}
+
+            # Prescribed times from the schedule index, outside the
+            # transaction: loading the index borrows a connection itself
+            index, schedules = _indexed_schedules([(user_id, medicine_id)])
+            schedule = schedules[(user_id, medicine_id)]
+            if schedule is None:
                 return {'status': 'error', 'message': 'Medication details not found'}
-
-            total_doses = medication_details['total_doses']
-            doses_taken = medication_details['doses_taken']
-            dosage_times = medication_details['dosage_times']
-            current_time = datetime.now()
-            current_time_str = current_time.strftime('%H:%M')
-
-            # Check if maximum daily doses reached
-            if doses_taken >= total_doses:
-                conn.close()
-                return {
-                    'status': 'max_dose_reached',
-                    'message': 'Maximum daily dosage reached. Do not take more medication.',
-                    'doses_taken': doses_taken,
-                    'total_doses': total_doses
-                }
-
-            # Validate current time against prescribed dosage times
-            valid_intake = any(
-                abs(
-                    (datetime.strptime(current_time_str, '%H:%M') - datetime.strptime(dose_time, '%H:%M')).total_seconds()
-                ) < 1800  # Within 30 minutes of prescribed time
-                for dose_time in dosage_times
+            total_doses, dosage_times = schedule
+
+            with transaction(self.DB_PATH, immediate=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute(DOSES_TODAY_QUERY, (medicine_id, user_id))
+                doses_taken = cursor.fetchone()[0]
+                current_time = datetime.now()
+                current_time_str = current_time.strftime('%H:%M')
+                current_minutes = current_time.hour * 60 + current_time.minute
+
+                # Check the daily maximum and prescribed times
+                on_time = index.in_window(user_id, medicine_id, current_minutes)
+                rejection = _check_dose(total_doses, doses_taken, dosage_times, on_time)
+                if rejection:
+                    return rejection
+
+                # Record the dosage
+                cursor.execute(RECORD_DOSE_QUERY, (medicine_id, user_id, doses_taken + 1, total_doses))
+
+            event_bus.publish(
+                event_bus.DOSE_TAKEN,
+                user_id=user_id,
+                user_name=self.user_name,
+                medicine_id=medicine_id,
+                medicine_name=self.medicine_name,
+                intake_date=datetime.now(timezone.utc).strftime('%Y-%m-%d'),  # matches date('now')
+                doses_taken=doses_taken + 1,
+                total_doses=total_doses
             )
 
-            if not valid_intake:
-                conn.close()
-                return {
-                    'status': 'wrong_time',
-                    'message': f'Not the right time to take medication. Prescribed times: {", ".join(dosage_times)}',
-                    'prescribed_times': dosage_times
-                }
-
-            # Record the dosage
-            cursor.execute('''
-                INSERT INTO dosage_tracking 
-                (medicine_id, user_id, doses_taken, total_doses_per_day, intake_date, last_intake_time)
-                VALUES (?, ?, ?, ?, date('now'), datetime('now'))
-            ''', (medicine_id, user_id, doses_taken + 1, total_doses))
-
-            conn.commit()
-            conn.close()
-
             # Determine next dosage time
             next_dosage_times = [
-                time for time in dosage_times 
-                if datetime.strptime(time, '%H:%M') > current_time.time()
+                dose_time for dose_time in dosage_times
+                if to_minutes(dose_time) > current_minutes
             ]
 
             return {
@@ -197,6 +365,163 @@ class DosageTracker:
                 'message': f'Database error: {e}'
             }
 
+    @classmethod
+    def track_dosage_batch(cls, events):
+        """
+        Record many timestamped dose events, e.g. from a device that was offline.
+
+        Names are resolved first and schedules come from the schedule
+        index, which checks every event's time window in one vectorized
+        call. Then, in one transaction, existing intake is loaded with a
+        set-based query, events are validated in time order exactly as
+        track_dosage would have validated them at that moment, and all
+        accepted doses are written.
+
+        Args:
+            events (list): Dicts with 'user_name', 'medicine_name' and an
+                optional ISO 8601 'taken_at' (naive times are local;
+                defaults to now)
+
+        Returns:
+            list: One result dict per event, in input order, shaped like
+                track_dosage's result plus 'index'
+        """
+        now = datetime.now()
+        results = [None] * len(events)
+        parsed = []
+        for index, event in enumerate(events):
+            if not isinstance(event, dict) or not event.get('user_name') or not event.get('medicine_name'):
+                results[index] = {'index': index, 'status': 'error',
+                                  'message': 'Please provide user_name and medicine_name'}
+                continue
+            times = _parse_event_time(event.get('taken_at'), now)
+            if times is None:
+                results[index] = {'index': index, 'status': 'error', 'message': 'Invalid taken_at'}
+                continue
+            if times[0] > now + MAX_CLOCK_SKEW:
+                results[index] = {'index': index, 'status': 'error', 'message': 'taken_at is in the future'}
+                continue
+            parsed.append((times[1], index, event['user_name'], event['medicine_name'], times[0]))
+
+        if not parsed:
+            return results
+        parsed.sort()
+
+        taken_events = []
+        try:
+            with connection(DB_PATH) as conn:
+                cursor = conn.cursor()
+
+                # Names to ids, from the caches and then in bulk
+                user_ids = {}
+                for name in {event[2] for event in parsed}:
+                    user_ids[name] = _user_ids.get(name)
+                missing = [name for name, user_id in user_ids.items() if user_id is None]
+                for name, user_id in _select_in(
+                        cursor, 'SELECT name, MIN(user_id) FROM users WHERE name IN ({}) GROUP BY name', missing):
+                    user_ids[name] = user_id
+                    _user_ids.put(name, user_id)
+
+                medicine_ids = {}
+                for name in {event[3] for event in parsed}:
+                    medicine_ids[name] = _medicine_ids.get(name)
+                missing = [name for name, medicine_id in medicine_ids.items() if medicine_id is None]
+                for name, medicine_id in _select_in(
+                        cursor, 'SELECT name, medicine_id FROM medicines WHERE name IN ({})', missing):
+                    medicine_ids[name] = medicine_id
+                    _medicine_ids.put(name, medicine_id)
+
+            # Prescribed times of every pair involved, and whether each
+            # event falls within a dose window, from the schedule index
+            # (outside the transaction: loading it borrows a connection)
+            event_user_ids = [user_ids.get(event[2]) or 0 for event in parsed]
+            event_medicine_ids = [medicine_ids.get(event[3]) or 0 for event in parsed]
+            schedule_index, schedules = _indexed_schedules(
+                {pair for pair in zip(event_user_ids, event_medicine_ids) if all(pair)}
+            )
+            on_time = schedule_index.in_window(
+                np.array(event_user_ids), np.array(event_medicine_ids),
+                np.array([event[4].hour * 60 + event[4].minute for event in parsed])
+            )
+
+            with transaction(DB_PATH, immediate=True) as conn:
+                cursor = conn.cursor()
+
+                # Intake of every user involved on the days the events fall on
+                known_users = {user_id for user_id in user_ids.values() if user_id}
+                first_date = parsed[0][0].strftime('%Y-%m-%d')
+                last_date = parsed[-1][0].strftime('%Y-%m-%d')
+                taken = {}
+                for user_id, medicine_id, intake_date, doses_taken in _select_in(cursor, '''
+                    SELECT user_id, medicine_id, intake_date, doses_taken
+                    FROM dosage_tracking
+                    WHERE intake_date BETWEEN ? AND ? AND user_id IN ({})
+                ''', known_users, (first_date, last_date)):
+                    taken[(user_id, medicine_id, intake_date)] = doses_taken
+
+                # Validate in time order against the running counts
+                written = {}
+                for position, (taken_at_utc, index, user_name, medicine_name, taken_at) in enumerate(parsed):
+                    user_id = user_ids.get(user_name)
+                    medicine_id = medicine_ids.get(medicine_name)
+                    schedule = schedules.get((user_id, medicine_id))
+                    if not user_id:
+                        result = {'status': 'error', 'message': 'User not found'}
+                    elif not medicine_id:
+                        result = {'status': 'error', 'message': 'Medicine not found'}
+                    elif schedule is None:
+                        result = {'status': 'error', 'message': 'Medication details not found'}
+                    else:
+                        total_doses, dosage_times = schedule
+                        intake_date = taken_at_utc.strftime('%Y-%m-%d')
+                        key = (user_id, medicine_id, intake_date)
+                        doses_taken = taken.get(key, 0)
+                        result = _check_dose(total_doses, doses_taken, dosage_times, bool(on_time[position]))
+                        if result is None:
+                            taken[key] = doses_taken + 1
+                            written[key] = (total_doses, taken_at_utc.strftime('%Y-%m-%d %H:%M:%S'))
+                            taken_events.append((user_id, user_name, medicine_id, medicine_name, intake_date))
+                            result = {
+                                'status': 'dosage_tracked',
+                                'doses_taken': doses_taken + 1,
+                                'total_doses': total_doses,
+                                'taken_at': taken_at.strftime('%Y-%m-%d %H:%M:%S'),
+                                'message': f'Dosage taken. {doses_taken + 1} of {total_doses} doses taken that day.'
+                            }
+                    results[index] = dict(result, index=index)
+
+                cursor.executemany(RECORD_DOSE_AT_QUERY, [
+                    (medicine_id, user_id, taken[(user_id, medicine_id, intake_date)],
+                     total_doses, intake_date, last_intake_time)
+                    for (user_id, medicine_id, intake_date), (total_doses, last_intake_time) in written.items()
+                ])
+
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            for _, index, _, _, _ in parsed:
+                results[index] = {'index': index, 'status': 'error', 'message': f'Database error: {e}'}
+            return results
+
+        # One event per user, medicine and day, with its final count
+        published = set()
+        for user_id, user_name, medicine_id, medicine_name, intake_date in reversed(taken_events):
+            key = (user_id, medicine_id, intake_date)
+            if key in published:
+                continue
+            published.add(key)
+            event_bus.publish(
+                event_bus.DOSE_TAKEN,
+                user_id=user_id,
+                user_name=user_name,
+                medicine_id=medicine_id,
+                medicine_name=medicine_name,
+                intake_date=intake_date,
+                doses_taken=taken[key],
+                total_doses=written[key][0]
+            )
+
+        return results
+
     def get_dose_history(self, days=7):
         """
         Retrieve dose history for the specified medicine and user.
@@ -208,37 +533,35 @@ class DosageTracker:
             list: List of dose tracking records
         """
         try:
-            conn = sqlite3.connect(self.DB_PATH)
-            cursor = conn.cursor()
-
-            user_id = self._get_user_id(cursor)
-            medicine_id = self._get_medicine_id(cursor)
-
-            if not user_id or not medicine_id:
-                conn.close()
-                return []
-
-            # Retrieve dose history for the specified number of days
-            cursor.execute('''
-                SELECT intake_date, doses_taken, total_doses_per_day, last_intake_time
-                FROM dosage_tracking
-                WHERE medicine_id = ? AND user_id = ?
-                AND intake_date >= date('now', ?)
-                ORDER BY intake_date DESC
-            ''', (medicine_id, user_id, f'-{days} days'))
-
-            # Convert results to a list of dictionaries
-            history = [
-                {
-                    'date': row[0],
-                    'doses_taken': row[1],
-                    'total_doses': row[2],
-                    'last_intake_time': row[3]
-                } for row in cursor.fetchall()
-            ]
-
-            conn.close()
-            return history
+            with connection(self.DB_PATH) as conn:
+                cursor = conn.cursor()
+
+                user_id = self._get_user_id(cursor)
+                medicine_id = self._get_medicine_id(cursor)
+
+                if not user_id or not medicine_id:
+                    return []
+
+                # Retrieve dose history for the specified number of days
+                cursor.execute('''
+                    SELECT intake_date, doses_taken, total_doses_per_day, last_intake_time
+                    FROM dosage_tracking
+                    WHERE medicine_id = ? AND user_id = ?
+                    AND intake_date >= date('now', ?)
+                    ORDER BY intake_date DESC
+                ''', (medicine_id, user_id, f'-{days} days'))
+
+                # Convert results to a list of dictionaries
+                history = [
+                    {
+                        'date': row[0],
+                        'doses_taken': row[1],
+                        'total_doses': row[2],
+                        'last_intake_time': row[3]
+                    } for row in cursor.fetchall()
+                ]
+
+                return history
 
         except sqlite3.Error as e:
             print(f"Dose history retrieval error: {e}")
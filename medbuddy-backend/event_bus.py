@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+
+# Change events are also sent as UDP datagrams to this local address, so a
+# separate process (the WebSocket notification server) can react to them.
+EVENT_BUS_HOST = os.environ.get('EVENT_BUS_HOST', '127.0.0.1')
+EVENT_BUS_PORT = int(os.environ.get('EVENT_BUS_PORT', '8181'))
+
+# Event types
+PRESCRIPTION_CREATED = 'prescription_created'
+DOSE_TAKEN = 'dose_taken'
+PRESCRIPTIONS_IMPORTED = 'prescriptions_imported'
+SCAN_COMPLETED = 'scan_completed'
+
+# Subscription key that receives every event type
+ALL_EVENTS = '*'
+
+_subscribers = defaultdict(list)
+_lock = threading.Lock()
+_socket = None
+
+def subscribe(event_type, callback):
+    """
+    Call `callback(event)` for every event of `event_type` published in
+    this process. Use ALL_EVENTS to receive every type.
+    """
+    with _lock:
+        _subscribers[event_type].append(callback)
+
+def unsubscribe(event_type, callback):
+    """Remove a callback registered with `subscribe`."""
+    with _lock:
+        if callback in _subscribers.get(event_type, []):
+            _subscribers[event_type].remove(callback)
+
+def _send(event):
+    """Fire-and-forget the event to the local listener; never raises."""
+    global _socket
+    try:
+        if _socket is None:
+            _socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            _socket.setblocking(False)
+        _socket.sendto(json.dumps(event).encode('utf-8'), (EVENT_BUS_HOST, EVENT_BUS_PORT))
+    except (OSError, TypeError, ValueError) as e:
+        # Nobody listening or the event is too large; subscribers fall back
+        # to their reconciliation poll
+        print(f"Event bus send error: {e}")
+
+def publish(event_type, **payload):
+    """
+    Publish a change event to in-process subscribers and the local listener.
+
+    Publishing never blocks on or fails because of subscribers, so it is
+    safe to call right after a database commit.
+
+    Args:
+        event_type (str): One of the event type constants
+        **payload: JSON-serializable event fields
+    """
+    event = dict(payload, type=event_type, timestamp=time.time())
+
+    with _lock:
+        callbacks = list(_subscribers.get(event_type, [])) + list(_subscribers.get(ALL_EVENTS, []))
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            print(f"Event subscriber error: {e}")
+
+    _send(event)
+
+
+class _EventProtocol(asyncio.DatagramProtocol):
+    def __init__(self, callback):
+        self.callback = callback
+
+    def datagram_received(self, data, addr):
+        try:
+            event = json.loads(data.decode('utf-8'))
+        except ValueError:
+            return
+        if isinstance(event, dict) and 'type' in event:
+            self.callback(event)
+
+async def listen(callback, host=EVENT_BUS_HOST, port=EVENT_BUS_PORT):
+    """
+    Receive events published by other processes on the running event loop.
+
+    Args:
+        callback (callable): Called with each event dict
+        host (str): Address to bind
+        port (int): UDP port to bind
+
+    Returns:
+        asyncio.DatagramTransport: Close it to stop listening
+    """
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _EventProtocol(callback),
+        local_addr=(host, port)
+    )
+    return transport
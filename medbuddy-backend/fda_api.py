@@ -1,36 +1,321 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def get_medication_info(medication_name):
+import metrics
+from db_connection import DB_PATH, connection
+from migrations import FDA_LABEL_CACHE_TABLE, migrate
+
+# openFDA drug label endpoint. Point FDA_API_URL at a local stand-in server
+# to run without network access.
+FDA_API_URL = os.environ.get('FDA_API_URL', 'https://api.fda.gov/drug/label.json')
+FDA_TIMEOUT = float(os.environ.get('FDA_TIMEOUT', '5'))
+FDA_RETRIES = int(os.environ.get('FDA_RETRIES', '2'))
+
+# How long found and not-found answers are trusted, in seconds
+FDA_CACHE_TTL = float(os.environ.get('FDA_CACHE_TTL', str(7 * 24 * 3600)))
+FDA_NEGATIVE_CACHE_TTL = float(os.environ.get('FDA_NEGATIVE_CACHE_TTL', str(24 * 3600)))
+# A separate FDA_CACHE_DB file only ever gets the cache table
+FDA_CACHE_DB = os.environ.get('FDA_CACHE_DB', DB_PATH)
+FDA_CACHE_MAX_ENTRIES = int(os.environ.get('FDA_CACHE_MAX_ENTRIES', '2048'))
+
+# Maximum number of lookups sent to the API at the same time
+FDA_MAX_CONCURRENCY = int(os.environ.get('FDA_MAX_CONCURRENCY', '8'))
+
+FDA_REQUESTS = metrics.counter('medbuddy_fda_requests_total', 'Requests sent to openFDA by outcome.', ('outcome',))
+FDA_REQUEST_SECONDS = metrics.histogram('medbuddy_fda_request_seconds', 'openFDA request latency.')
+FDA_CACHE_LOOKUPS = metrics.counter('medbuddy_fda_cache_lookups_total', 'FDA label cache lookups by tier.',
+                                    ('result',))
+
+
+class FDAClient:
     """
-    Get medication information from FDA API.
-    Returns a dictionary with medication info or None if not found.
+    openFDA label lookup client with connection pooling and caching.
+
+    A single `requests.Session` keeps TCP/TLS connections to the API open
+    between lookups. Answers, including "not found", are cached in memory
+    and in a SQLite table with separate TTLs, so repeated lookups of the
+    same medicine never leave the machine. Transient network errors are
+    retried within the retry budget and are never cached.
+
+    Concurrent lookups of the same name, from any thread, share a single
+    in-flight request.
     """
-    try:
-        # FDA API endpoint for drug information
 
-        url = f"https://api.fda.gov/drug/label.json?search=openfda.brand_name:{medication_name}&limit=1"
+    def __init__(self, base_url=FDA_API_URL, timeout=FDA_TIMEOUT, retries=FDA_RETRIES,
+                 ttl=FDA_CACHE_TTL, negative_ttl=FDA_NEGATIVE_CACHE_TTL,
+                 db_path=FDA_CACHE_DB, max_entries=FDA_CACHE_MAX_ENTRIES,
+                 max_concurrency=FDA_MAX_CONCURRENCY):
+        """
+        Args:
+            base_url (str): Drug label endpoint URL
+            timeout (float): Per-request timeout in seconds
+            retries (int): Retries for connection errors and 429/5xx responses
+            ttl (float): Seconds a found result stays cached
+            negative_ttl (float): Seconds a not-found result stays cached
+            db_path (str or None): SQLite file for the persistent cache
+            max_entries (int): Maximum number of names cached in memory
+            max_concurrency (int): Maximum lookups in flight for bulk requests
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.db_path = db_path
+        self.max_entries = max(1, max_entries)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._db_ready = False
+        self._in_flight = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency),
+                                            thread_name_prefix='fda-lookup')
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=('GET',),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_concurrency),
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @staticmethod
+    def _key(medication_name):
+        """Normalize a medicine name into a cache key."""
+        return medication_name.strip().lower()
+
+    def get_medication_info(self, medication_name):
+        """
+        Get medication information, from cache when possible.
+
+        Args:
+            medication_name (str): Brand name to look up
+
+        Returns:
+            dict or None: Medication info, None if not found or on error
+        """
+        key = self._key(medication_name)
+        if not key:
+            return None
+
+        found, info = self._get_cached(key)
+        if not found:
+            info = self._fetch_shared(key, medication_name)
+
+        return dict(info) if info else None
+
+    def get_medication_info_many(self, medication_names):
+        """
+        Look up several medicines concurrently.
+
+        Names are de-duplicated case-insensitively, cached answers are used
+        directly and the rest are fetched in parallel, at most
+        `max_concurrency` at a time.
+
+        Args:
+            medication_names (list): Brand names to look up
+
+        Returns:
+            dict: Each input name mapped to its info dict (or None)
+        """
+        unique = {}
+        for name in medication_names:
+            key = self._key(name)
+            if key and key not in unique:
+                unique[key] = name
+
+        futures = {
+            key: self._executor.submit(self.get_medication_info, name)
+            for key, name in unique.items()
+        }
+        answers = {key: future.result() for key, future in futures.items()}
+
+        return {
+            name: (dict(answers[self._key(name)]) if answers.get(self._key(name)) else None)
+            for name in medication_names
+        }
+
+    def _fetch_shared(self, key, medication_name):
+        """
+        Fetch a name from the API, joining an identical request already in flight.
+
+        Returns:
+            dict or None: Medication info, None if not found or on error
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+
+        if not owner:
+            return future.result()
+
+        info = None
+        try:
+            with FDA_REQUEST_SECONDS.time():
+                info = self._fetch(medication_name)
+            FDA_REQUESTS.inc(outcome='found' if info else 'not_found')
+            self._store(key, info)
+            if info is None:
+                print(f"No information found for '{medication_name}' in FDA database.")
+        except Exception as e:
+            # Never cached, and never fails a bulk lookup: None for this name
+            FDA_REQUESTS.inc(outcome='error')
+            print(f"FDA API error: {e}")
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_result(info)
 
-        
-        response = requests.get(url)
+        return info
+
+    def _fetch(self, medication_name):
+        """
+        Query the label endpoint for one medicine.
+
+        Returns:
+            dict or None: Medication info, None if the API has no match
+
+        Raises:
+            requests.RequestException: On network errors or unexpected statuses
+        """
+        response = self.session.get(
+            self.base_url,
+            params={'search': f'openfda.brand_name:{medication_name}', 'limit': 1},
+            timeout=self.timeout
+        )
+
+        # openFDA answers 404 when the search has no matches
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
         data = response.json()
-        
-        if 'results' in data and len(data['results']) > 0:
-            result = data['results'][0]
-            
+
+        # Labels vary in shape; anything unexpected counts as not specified
+        results = data.get('results') if isinstance(data, dict) else None
+        if isinstance(results, list) and results and isinstance(results[0], dict):
+            result = results[0]
+
             # Extract dosage information
             dosage = "Not specified"
-            if 'dosage_and_administration' in result:
-                dosage = result['dosage_and_administration'][0]
-            
+            sections = result.get('dosage_and_administration')
+            if isinstance(sections, list) and sections and isinstance(sections[0], str):
+                dosage = sections[0]
+
             return {
                 'name': medication_name,
                 'dosage': dosage,
                 'source': 'US FDA'
             }
+        return None
+
+    def _get_cached(self, key):
+        """
+        Look a key up in memory, then in SQLite.
+
+        Returns:
+            tuple: (found, info) where info is None for a cached "not found"
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                expires_at, info = entry
+                if expires_at > now:
+                    self._cache.move_to_end(key)
+                    FDA_CACHE_LOOKUPS.inc(result='memory')
+                    return True, info
+                del self._cache[key]
+
+        row = self._db_execute(
+            'SELECT payload, expires_at FROM fda_label_cache WHERE name = ?', (key,), fetch=True
+        )
+        if row and row[1] > now:
+            info = json.loads(row[0]) if row[0] else None
+            self._remember(key, info, row[1])
+            FDA_CACHE_LOOKUPS.inc(result='database')
+            return True, info
+
+        FDA_CACHE_LOOKUPS.inc(result='miss')
+        return False, None
+
+    def _store(self, key, info):
+        """Cache a found or not-found answer in memory and in SQLite."""
+        expires_at = time.time() + (self.ttl if info else self.negative_ttl)
+        self._remember(key, info, expires_at)
+        self._db_execute(
+            'INSERT OR REPLACE INTO fda_label_cache (name, payload, expires_at) VALUES (?, ?, ?)',
+            (key, json.dumps(info) if info else None, expires_at)
+        )
+
+    def _remember(self, key, info, expires_at):
+        """Insert into the in-memory LRU."""
+        with self._lock:
+            self._cache[key] = (expires_at, info)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _prepare_db(self):
+        """
+        Make sure the cache table exists: by migrating the application
+        database, or in a separate cache file by creating just the table.
+        """
+        if os.path.abspath(self.db_path) == os.path.abspath(DB_PATH):
+            migrate(self.db_path)
         else:
-            print(f"No information found for '{medication_name}' in FDA database.")
+            with connection(self.db_path) as conn:
+                conn.execute(FDA_LABEL_CACHE_TABLE)
+
+    def _db_execute(self, query, params, fetch=False):
+        """Run one statement against the persistent cache, ignoring failures."""
+        if not self.db_path:
             return None
-            
-    except Exception as e:
-        print(f"FDA API error: {e}")
+        try:
+            if not self._db_ready:
+                self._prepare_db()
+                self._db_ready = True
+            with connection(self.db_path) as conn:
+                cursor = conn.execute(query, params)
+                if fetch:
+                    return cursor.fetchone()
+        except sqlite3.Error as e:
+            print(f"FDA cache database error: {e}")
         return None
+
+    def clear_cache(self):
+        """Drop every cached answer from memory (the SQLite tier is kept)."""
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared client used by the application
+fda_client = FDAClient()
+
+def get_medication_info(medication_name):
+    """
+    Get medication information from FDA API.
+    Returns a dictionary with medication info or None if not found.
+    """
+    return fda_client.get_medication_info(medication_name)
+
+def get_medication_info_many(medication_names):
+    """
+    Get medication information for several medicines concurrently.
+    Returns a dictionary mapping each name to its info (or None).
+    """
+    return fda_client.get_medication_info_many(medication_names)
@@ -0,0 +1,145 @@
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from db_connection import DB_PATH
+from medbuddy_shared.bulk_load import bulk_connection, insert_chunks
+from migrations import migrate
+
+# Dose slots assigned to prescriptions, in order: n doses use the first n
+DOSE_SLOTS = ['08:00', '20:00', '14:00', '11:00', '17:00', '23:00']
+
+# Tables filled by the generator, children first (for --reset)
+TABLES = ['adherence_summary', 'adherence_daily', 'dosage_tracking', 'adherence_dirty_days',
+          'dosage_times', 'prescriptions', 'medicines', 'doctors', 'users']
+
+
+def _next_id(conn, table, id_column):
+    return conn.execute(f'SELECT COALESCE(MAX({id_column}), 0) FROM {table}').fetchone()[0] + 1
+
+def generate(db_path=DB_PATH, patients=10000, medicines=2000, doctors=200,
+             max_prescriptions=3, tracking_rows=1000000, adherence=0.85, seed=42, reset=False):
+    """
+    Bulk-fill medicine_reminder.db with reproducible synthetic data.
+
+    On an empty (or reset) database the same arguments and seed always
+    produce the same rows, relative to today's date. Patients are named
+    'Patient <n>' and medicines 'Medicine <n>' so benchmarks can address
+    them; each prescription is backdated to the first day of generated
+    intake history.
+
+    Args:
+        db_path (str): SQLite database file (migrated first)
+        patients (int): Number of users to create
+        medicines (int): Number of medicines to create
+        doctors (int): Number of doctors to create
+        max_prescriptions (int): Prescriptions per patient, 1..max
+        tracking_rows (int): Approximate number of dosage_tracking rows
+        adherence (float): Probability that each scheduled dose was taken
+        seed (int): Random seed
+        reset (bool): Delete existing rows first
+
+    Returns:
+        dict: Row counts inserted per table
+    """
+    migrate(db_path)
+    rng = np.random.default_rng(seed)
+    conn = bulk_connection(db_path)
+
+    if reset:
+        for table in TABLES:
+            conn.execute(f'DELETE FROM {table}')
+        conn.execute('DELETE FROM sqlite_sequence WHERE name IN ({})'.format(','.join('?' * len(TABLES))), TABLES)
+
+    first_user = _next_id(conn, 'users', 'user_id')
+    first_doctor = _next_id(conn, 'doctors', 'doctor_id')
+    first_medicine = _next_id(conn, 'medicines', 'medicine_id')
+    first_prescription = _next_id(conn, 'prescriptions', 'prescription_id')
+
+    insert_chunks(conn, 'INSERT INTO doctors (doctor_id, name) VALUES (?, ?)',
+                  ((first_doctor + i, f'Dr. Generated {first_doctor + i}') for i in range(doctors)))
+    insert_chunks(conn, 'INSERT INTO medicines (medicine_id, name) VALUES (?, ?)',
+                  ((first_medicine + i, f'Medicine {first_medicine + i}') for i in range(medicines)))
+
+    user_ids = first_user + np.arange(patients)
+    ages = rng.integers(18, 95, patients)
+    insert_chunks(conn, 'INSERT INTO users (user_id, name, age) VALUES (?, ?, ?)',
+                  zip(user_ids.tolist(), (f'Patient {user_id}' for user_id in user_ids.tolist()),
+                      ages.tolist()))
+
+    # Prescriptions: distinct medicines per patient (consecutive ids from a
+    # random start), 1-4 doses a day
+    counts = rng.integers(1, max_prescriptions + 1, patients)
+    prescription_users = np.repeat(user_ids, counts)
+    offsets = np.arange(len(prescription_users)) - np.repeat(np.cumsum(counts) - counts, counts)
+    prescription_medicines = first_medicine + (np.repeat(rng.integers(0, medicines, patients), counts)
+                                               + offsets) % medicines
+    prescription_doctors = first_doctor + rng.integers(0, doctors, len(prescription_users))
+    doses = rng.integers(1, 5, len(prescription_users))
+    prescription_ids = first_prescription + np.arange(len(prescription_users))
+
+    history_days = max(1, -(-tracking_rows // max(1, len(prescription_ids))))
+    start = date.today() - timedelta(days=history_days)
+    created_at = f'{start.isoformat()} 00:00:00'
+
+    insert_chunks(conn, '''
+        INSERT INTO prescriptions (prescription_id, user_id, doctor_id, medicine_id, doses_per_day, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', zip(prescription_ids.tolist(), prescription_users.tolist(), prescription_doctors.tolist(),
+             prescription_medicines.tolist(), doses.tolist(), [created_at] * len(prescription_ids)))
+    insert_chunks(conn, 'INSERT INTO dosage_times (prescription_id, time_of_day) VALUES (?, ?)',
+                  ((prescription_id, DOSE_SLOTS[slot])
+                   for prescription_id, count in zip(prescription_ids.tolist(), doses.tolist())
+                   for slot in range(count)))
+
+    # Intake history, one day of every prescription at a time, until the
+    # requested number of rows is reached
+    tracked = 0
+    for day_offset in range(history_days):
+        if tracked >= tracking_rows:
+            break
+        day = (start + timedelta(days=day_offset)).isoformat()
+        taken = rng.binomial(doses, adherence)
+        keep = np.flatnonzero(taken > 0)[:tracking_rows - tracked]
+        minutes = rng.integers(0, 60, len(keep))
+        insert_chunks(conn, '''
+            INSERT OR IGNORE INTO dosage_tracking
+            (medicine_id, user_id, doses_taken, total_doses_per_day, intake_date, last_intake_time)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', zip(prescription_medicines[keep].tolist(), prescription_users[keep].tolist(),
+                 taken[keep].tolist(), doses[keep].tolist(), [day] * len(keep),
+                 (f'{day} 20:{minute:02d}:00' for minute in minutes.tolist())))
+        tracked += len(keep)
+
+    # The rollups start empty, so the first refresh covers all history anyway
+    conn.execute('DELETE FROM adherence_dirty_days')
+    conn.close()
+
+    return {
+        'users': patients,
+        'doctors': doctors,
+        'medicines': medicines,
+        'prescriptions': len(prescription_ids),
+        'dosage_times': int(doses.sum()),
+        'dosage_tracking': tracked
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill medicine_reminder.db with synthetic data.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--medicines', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--max-prescriptions', type=int, default=3)
+    parser.add_argument('--tracking-rows', type=int, default=1000000)
+    parser.add_argument('--adherence', type=float, default=0.85)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='delete existing rows first')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args.db, args.patients, args.medicines, args.doctors, args.max_prescriptions,
+                      args.tracking_rows, args.adherence, args.seed, args.reset)
+    print(f"Inserted {counts} in {time.perf_counter() - started:.1f}s")
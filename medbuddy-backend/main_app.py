@@ -1,6 +1,9 @@
 # Import modules
-from webcam_capture import capture_image
-from ocr_processor import extract_text, extract_medication_name
+import argparse
+
+import metrics
+from webcam_capture import capture_frame
+from ocr_processor import extract_text_from_image, extract_medication_name
 from database_handler import initialize_database, search_medication
 from fda_api import get_medication_info
 from display_handler import show_medication_info
@@ -11,25 +14,29 @@ def main():
     """
     # Initialize the database
     initialize_database()
+    timings = {}
     
-    # Step 1: Capture image from webcam
+    # Step 1: Capture a sharp, steady frame from the webcam
     print("Starting webcam capture...")
-    image_path = capture_image()
+    with metrics.stage('capture', pipeline='cli') as timings['capture']:
+        image = capture_frame()
     
-    if not image_path:
+    if image is None:
         print("Image capture failed or was cancelled.")
         return
     
     # Step 2: Perform OCR on the captured image
     print("Performing OCR on the captured image...")
-    extracted_text = extract_text(image_path)
+    with metrics.stage('ocr', pipeline='cli') as timings['ocr']:
+        extracted_text = extract_text_from_image(image)
     
     if not extracted_text:
         print("Please capture a clearer image of the medication label.")
         return
     
     # Step 3: Extract medication name from OCR text
-    medication_name = extract_medication_name(extracted_text)
+    with metrics.stage('extract_name', pipeline='cli') as timings['extract_name']:
+        medication_name = extract_medication_name(extracted_text)
     
     if not medication_name:
         print("Could not identify medication name from the image.")
@@ -37,15 +44,30 @@ def main():
     
     # Step 4: Check database for medication information
     print(f"Checking database for information on {medication_name}...")
-    medication_info = search_medication(medication_name)
+    with metrics.stage('local_search', pipeline='cli') as timings['local_search']:
+        medication_info = search_medication(medication_name)
     
     # Step 5: If not in database, get information from FDA
     if not medication_info:
         print(f"Getting information from FDA for {medication_name}...")
-        medication_info = get_medication_info(medication_name)
+        with metrics.stage('fda_lookup', pipeline='cli') as timings['fda_lookup']:
+            medication_info = get_medication_info(medication_name)
+
+    # Per-stage latency; capture includes the time spent framing the label
+    print("Timings: " + ", ".join(f"{name} {timer.elapsed * 1000:.0f} ms" for name, timer in timings.items()))
     
     # Step 6: Display medication information
     show_medication_info(medication_info)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Identify medication boxes from the webcam.')
+    parser.add_argument('--continuous', action='store_true',
+                        help='keep scanning boxes as they are held up instead of a single capture')
+    args = parser.parse_args()
+
+    if args.continuous:
+        from continuous_scan import ContinuousScanner
+        initialize_database()
+        ContinuousScanner().run()
+    else:
+        main()
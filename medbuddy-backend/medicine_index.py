@@ -0,0 +1,179 @@
+import bisect
+import threading
+from collections import defaultdict
+
+# Fuzzy matches scoring below this similarity (0..1) are not returned
+DEFAULT_MIN_SCORE = 0.6
+
+# How many trigram candidates are re-ranked with the exact edit distance
+CANDIDATE_LIMIT = 50
+
+
+def _trigrams(text):
+    """Return the set of padded character trigrams of a lower-cased string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def levenshtein(a, b):
+    """
+    Compute the edit distance between two strings.
+
+    Args:
+        a (str): First string
+        b (str): Second string
+
+    Returns:
+        int: Minimum number of single-character insertions, deletions
+        and substitutions turning `a` into `b`
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        previous = current
+    return previous[-1]
+
+def similarity(a, b):
+    """Edit-distance similarity between 0 (unrelated) and 1 (identical)."""
+    longest = max(len(a), len(b))
+    if longest == 0:
+        return 1.0
+    return 1.0 - levenshtein(a, b) / longest
+
+
+class MedicineIndex:
+    """
+    In-memory index of medicine names for typo-tolerant lookups.
+
+    Names are indexed three ways: a case-insensitive exact map, a sorted
+    list for prefix autocomplete, and a trigram posting list that narrows
+    fuzzy searches to a handful of candidates before they are ranked by
+    edit distance. New names can be added one at a time without a rebuild.
+    """
+
+    def __init__(self):
+        self._names = []
+        self._by_lower = {}
+        self._sorted_lower = []
+        self._postings = defaultdict(set)
+        self._lock = threading.RLock()
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, names):
+        """
+        Replace the index contents.
+
+        Args:
+            names (iterable): Medicine names
+        """
+        with self._lock:
+            self._names = []
+            self._by_lower = {}
+            self._sorted_lower = []
+            self._postings = defaultdict(set)
+            for name in names:
+                self._add(name)
+            self.loaded = True
+
+    def add(self, name):
+        """
+        Add a single medicine name if it is not indexed yet.
+
+        Args:
+            name (str): Medicine name
+        """
+        with self._lock:
+            self._add(name)
+
+    def _add(self, name):
+        lower = name.strip().lower()
+        if not lower or lower in self._by_lower:
+            return
+        name_id = len(self._names)
+        self._names.append(name)
+        self._by_lower[lower] = name_id
+        bisect.insort(self._sorted_lower, lower)
+        for gram in _trigrams(lower):
+            self._postings[gram].add(name_id)
+
+    def get(self, name):
+        """Return the stored spelling of `name` (case-insensitive), or None."""
+        with self._lock:
+            name_id = self._by_lower.get(name.strip().lower())
+            return self._names[name_id] if name_id is not None else None
+
+    def search(self, query, limit=5, min_score=DEFAULT_MIN_SCORE):
+        """
+        Find the medicine names closest to a possibly misspelled query.
+
+        Args:
+            query (str): Text to match, e.g. an OCR reading
+            limit (int): Maximum number of matches
+            min_score (float): Minimum similarity to include a match
+
+        Returns:
+            list: (name, score) tuples, best match first
+        """
+        lower = query.strip().lower()
+        if not lower:
+            return []
+
+        with self._lock:
+            # Count shared trigrams to pick the candidates worth scoring
+            shared = defaultdict(int)
+            for gram in _trigrams(lower):
+                for name_id in self._postings.get(gram, ()):
+                    shared[name_id] += 1
+            candidates = sorted(shared, key=shared.get, reverse=True)[:CANDIDATE_LIMIT]
+            names = [self._names[name_id] for name_id in candidates]
+
+        scored = [(name, similarity(lower, name.lower())) for name in names]
+        scored = [match for match in scored if match[1] >= min_score]
+        scored.sort(key=lambda match: (-match[1], match[0]))
+        return scored[:limit]
+
+    def best_match(self, query, min_score=DEFAULT_MIN_SCORE):
+        """
+        Return the single best (name, score) match for a query, or None.
+        Exact case-insensitive matches are returned with a score of 1.0.
+        """
+        exact = self.get(query)
+        if exact:
+            return exact, 1.0
+        matches = self.search(query, limit=1, min_score=min_score)
+        return matches[0] if matches else None
+
+    def prefix(self, prefix, limit=10):
+        """
+        Autocomplete: names starting with `prefix`, alphabetically.
+
+        Args:
+            prefix (str): Text typed so far
+            limit (int): Maximum number of names
+
+        Returns:
+            list: Matching medicine names
+        """
+        lower = prefix.strip().lower()
+        with self._lock:
+            start = bisect.bisect_left(self._sorted_lower, lower)
+            matches = []
+            for candidate in self._sorted_lower[start:start + limit]:
+                if not candidate.startswith(lower):
+                    break
+                matches.append(self._names[self._by_lower[candidate]])
+            return matches
+
+
+# Shared index, filled from the medicines table by database_handler
+medicine_index = MedicineIndex()
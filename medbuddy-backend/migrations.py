@@ -0,0 +1,202 @@
+from db_connection import DB_PATH, get_pool
+from medbuddy_shared import migration_runner
+
+# The persistent openFDA label cache; also created on its own in a separate
+# cache file (see fda_api.FDA_CACHE_DB)
+FDA_LABEL_CACHE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS fda_label_cache (
+        name TEXT PRIMARY KEY,
+        payload TEXT,
+        expires_at REAL NOT NULL
+    )
+'''
+
+# Ordered schema migrations: (version, description, statements).
+# Applied versions are recorded in schema_version; never edit a released
+# migration, append a new one instead.
+MIGRATIONS = [
+    (1, 'Base schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS doctors (
+            doctor_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS medicines (
+            medicine_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS prescriptions (
+            prescription_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            doctor_id INTEGER NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            doses_per_day INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (doctor_id) REFERENCES doctors(doctor_id),
+            FOREIGN KEY (medicine_id) REFERENCES medicines(medicine_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS dosage_times (
+            dosage_time_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            prescription_id INTEGER NOT NULL,
+            time_of_day TIME NOT NULL,
+            FOREIGN KEY (prescription_id) REFERENCES prescriptions(prescription_id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS dosage_tracking (
+            tracking_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            medicine_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            doses_taken INTEGER DEFAULT 1,
+            total_doses_per_day INTEGER NOT NULL,
+            intake_date DATE DEFAULT (date('now')),
+            last_intake_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (medicine_id) REFERENCES medicines(medicine_id),
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            UNIQUE(medicine_id, user_id, intake_date)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_prescriptions_user_id ON prescriptions(user_id)',
+        'CREATE INDEX IF NOT EXISTS idx_dosage_times_prescription_id ON dosage_times(prescription_id)',
+    ]),
+    (2, 'Indexes for user, medicine and daily intake lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_users_name ON users(name)',
+        'CREATE INDEX IF NOT EXISTS idx_medicines_name_nocase ON medicines(name COLLATE NOCASE)',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_dosage_tracking_user_medicine_date
+        ON dosage_tracking(user_id, medicine_id, intake_date)
+        ''',
+    ]),
+    (3, 'Adherence rollups with dirty-day tracking', [
+        '''
+        CREATE TABLE IF NOT EXISTS adherence_daily (
+            user_id INTEGER NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            scheduled INTEGER NOT NULL,
+            taken INTEGER NOT NULL,
+            PRIMARY KEY (user_id, medicine_id, day)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS adherence_summary (
+            user_id INTEGER NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            last_day DATE NOT NULL,
+            days_tracked INTEGER NOT NULL,
+            doses_scheduled INTEGER NOT NULL,
+            doses_taken INTEGER NOT NULL,
+            current_streak INTEGER NOT NULL,
+            longest_streak INTEGER NOT NULL,
+            PRIMARY KEY (user_id, medicine_id)
+        ) WITHOUT ROWID
+        ''',
+        # Days whose intake changed since they were rolled up. The triggers
+        # skip existing days with NOT EXISTS rather than INSERT OR IGNORE:
+        # the ON CONFLICT clause of an upsert on dosage_tracking overrides
+        # the conflict policy of statements in its triggers
+        '''
+        CREATE TABLE IF NOT EXISTS adherence_dirty_days (
+            user_id INTEGER NOT NULL,
+            medicine_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            PRIMARY KEY (user_id, medicine_id, day)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dosage_tracking_insert_dirty
+        AFTER INSERT ON dosage_tracking
+        BEGIN
+            INSERT INTO adherence_dirty_days
+            SELECT NEW.user_id, NEW.medicine_id, NEW.intake_date
+            WHERE NOT EXISTS (SELECT 1 FROM adherence_dirty_days
+                              WHERE user_id = NEW.user_id AND medicine_id = NEW.medicine_id
+                              AND day = NEW.intake_date);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dosage_tracking_update_dirty
+        AFTER UPDATE ON dosage_tracking
+        BEGIN
+            INSERT INTO adherence_dirty_days
+            SELECT OLD.user_id, OLD.medicine_id, OLD.intake_date
+            WHERE NOT EXISTS (SELECT 1 FROM adherence_dirty_days
+                              WHERE user_id = OLD.user_id AND medicine_id = OLD.medicine_id
+                              AND day = OLD.intake_date);
+            INSERT INTO adherence_dirty_days
+            SELECT NEW.user_id, NEW.medicine_id, NEW.intake_date
+            WHERE NOT EXISTS (SELECT 1 FROM adherence_dirty_days
+                              WHERE user_id = NEW.user_id AND medicine_id = NEW.medicine_id
+                              AND day = NEW.intake_date);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_dosage_tracking_delete_dirty
+        AFTER DELETE ON dosage_tracking
+        BEGIN
+            INSERT INTO adherence_dirty_days
+            SELECT OLD.user_id, OLD.medicine_id, OLD.intake_date
+            WHERE NOT EXISTS (SELECT 1 FROM adherence_dirty_days
+                              WHERE user_id = OLD.user_id AND medicine_id = OLD.medicine_id
+                              AND day = OLD.intake_date);
+        END
+        ''',
+    ]),
+    (4, 'Persistent openFDA label cache', [FDA_LABEL_CACHE_TABLE]),
+    # Medicine lookups match names exactly, and daily intake lookups are
+    # covered by dosage_tracking's UNIQUE index, so these only cost writes
+    (5, 'Drop unused medicine name and duplicate intake indexes', [
+        'DROP INDEX IF EXISTS idx_medicines_name_nocase',
+        'DROP INDEX IF EXISTS idx_dosage_tracking_user_medicine_date',
+    ]),
+]
+
+# Hot queries and the index each must use: (query, params, index name)
+INDEXED_QUERIES = [
+    ('SELECT user_id FROM users WHERE name = ?', ('John Doe',), 'idx_users_name'),
+    ('SELECT medicine_id FROM medicines WHERE name = ?', ('Aspirin',), 'sqlite_autoindex_medicines_1'),
+    ('''
+        SELECT intake_date, doses_taken FROM dosage_tracking
+        WHERE user_id = ? AND medicine_id = ? AND intake_date >= ?
+     ''', (1, 1, '2024-01-01'), 'sqlite_autoindex_dosage_tracking_1'),
+]
+
+def migrate(db_path=DB_PATH, migrations=MIGRATIONS):
+    """
+    Apply every migration newer than the database's schema version.
+
+    Args:
+        db_path (str): SQLite database file
+        migrations (list): (version, description, statements) in order
+
+    Returns:
+        list: Versions applied by this call
+    """
+    return migration_runner.migrate(get_pool(db_path), migrations)
+
+def verify_indexes(db_path=DB_PATH, queries=INDEXED_QUERIES):
+    """
+    Check with EXPLAIN QUERY PLAN that each hot query uses its index.
+
+    Returns:
+        list: (index name, used, plan details) per query
+    """
+    return migration_runner.verify_indexes(get_pool(db_path), queries)
+
+if __name__ == '__main__':
+    migration_runner.main(get_pool(), MIGRATIONS, INDEXED_QUERIES)
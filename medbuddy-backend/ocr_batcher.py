@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from ocr_processor import decode_image, load_image, readtext_batch, results_to_text
+
+# How long the batcher waits for more images before running a batch, and the
+# largest batch it will build. Both can be tuned without code changes.
+OCR_BATCH_WINDOW_MS = float(os.environ.get('OCR_BATCH_WINDOW_MS', '25'))
+OCR_MAX_BATCH_SIZE = int(os.environ.get('OCR_MAX_BATCH_SIZE', '8'))
+
+
+class _PendingImage:
+    """A single image waiting in the batcher, plus the slot for its result."""
+
+    def __init__(self, image):
+        self.image = image
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class OCRBatcher:
+    """
+    Collect images from concurrent callers and OCR them together.
+
+    Each call to `submit` blocks the calling (request) thread. A single
+    background thread gathers everything submitted within the batch window,
+    or until the batch is full, runs it through the shared EasyOCR reader in
+    one go and then wakes each caller with its own result.
+    """
+
+    def __init__(self, window_ms=OCR_BATCH_WINDOW_MS, max_batch_size=OCR_MAX_BATCH_SIZE,
+                 runner=readtext_batch, max_concurrent_batches=1):
+        """
+        Args:
+            window_ms (float): Time to wait for more images after the first one
+            max_batch_size (int): Maximum number of images per batch
+            runner (callable): Takes a list of images, returns a list of OCR results
+            max_concurrent_batches (int): Batches allowed to run at the same time
+        """
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.runner = runner
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+        self.set_concurrency(max_concurrent_batches)
+
+    def set_concurrency(self, max_concurrent_batches):
+        """
+        Allow up to `max_concurrent_batches` batches to run at once.
+
+        The in-process EasyOCR reader is not safe to share between threads, so
+        this stays at 1 unless the runner hands batches to separate workers.
+        """
+        previous_executor = getattr(self, '_executor', None)
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self._slots = threading.Semaphore(self.max_concurrent_batches)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrent_batches,
+                                            thread_name_prefix='ocr-batch')
+        if previous_executor is not None:
+            previous_executor.shutdown(wait=False)
+
+    def _ensure_started(self):
+        """Start the background batching thread on first use."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='ocr-batcher', daemon=True)
+            self._thread.start()
+
+    def submit(self, image):
+        """
+        Queue an image for OCR and wait for its result.
+
+        Args:
+            image (numpy.ndarray): BGR image array
+
+        Returns:
+            list: EasyOCR result list for this image
+        """
+        item = _PendingImage(image)
+        with self._condition:
+            self._ensure_started()
+            self._pending.append(item)
+            self._condition.notify()
+
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def queue_depth(self):
+        """Number of images currently waiting to be batched."""
+        with self._condition:
+            return len(self._pending)
+
+    def _next_batch(self):
+        """Block until there is work, then collect one batch."""
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+
+            # Keep collecting until the window closes or the batch is full
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        """Background loop: build batches and hand them to the executor."""
+        while True:
+            # Wait for a free slot first, so images keep accumulating into a
+            # bigger batch while every worker is busy
+            slots = self._slots
+            slots.acquire()
+            batch = self._next_batch()
+            self._executor.submit(self._process, batch, slots)
+
+    def _process(self, batch, slots):
+        """Run one batch and fan the results back out to the callers."""
+        try:
+            results = self.runner([item.image for item in batch])
+            for item, result in zip(batch, results):
+                item.result = result
+        except Exception as e:
+            print(f"Error during batched OCR: {e}")
+            for item in batch:
+                item.error = e
+        finally:
+            slots.release()
+            for item in batch:
+                item.done.set()
+
+
+# Shared batcher used by the web server
+batcher = OCRBatcher()
+
+def extract_text_from_image(image):
+    """
+    Extract text from an in-memory image through the shared batcher.
+
+    Args:
+        image (numpy.ndarray | bytes): Decoded BGR array or encoded image bytes
+
+    Returns:
+        str or None: The extracted text or None if extraction failed
+    """
+    try:
+        img = image if isinstance(image, np.ndarray) else decode_image(image)
+        if img is None:
+            return None
+
+        return results_to_text(batcher.submit(img))
+
+    except Exception as e:
+        print(f"Error during OCR: {e}")
+        return None
+
+def extract_text(image_path):
+    """
+    Extract text from the image through the shared batcher.
+    Drop-in replacement for `ocr_processor.extract_text` in request handlers.
+    Returns the extracted text or None if extraction failed.
+    """
+    img = load_image(image_path)
+    if img is None:
+        return None
+
+    return extract_text_from_image(img)
@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+import metrics
+
+# Side length of the difference hash (HASH_SIZE * HASH_SIZE bits), how many
+# differing bits still count as the same photo, and how many results are
+# kept in memory. Set OCR_CACHE_DB to a file path to persist results.
+#
+# Near matches are off by default. A dHash only captures coarse layout, so
+# two different medicines in similar packaging (or the same brand at another
+# strength) can land a few bits apart, and a near hit would hand back the
+# other box's text without reading this one. Only raise
+# OCR_CACHE_MAX_DISTANCE where results are confirmed by other means.
+OCR_CACHE_HASH_SIZE = int(os.environ.get('OCR_CACHE_HASH_SIZE', '16'))
+OCR_CACHE_MAX_DISTANCE = int(os.environ.get('OCR_CACHE_MAX_DISTANCE', '0'))
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', '1024'))
+OCR_CACHE_DB = os.environ.get('OCR_CACHE_DB')
+
+
+def image_hash(image, hash_size=OCR_CACHE_HASH_SIZE):
+    """
+    Compute a difference hash (dHash) of an image.
+
+    The image is shrunk to (hash_size + 1) x hash_size grey pixels and each
+    bit records whether a pixel is brighter than its right-hand neighbour.
+    Small changes in exposure, compression or framing flip only a few bits.
+
+    Args:
+        image (numpy.ndarray): BGR or greyscale image array
+        hash_size (int): Hash side length
+
+    Returns:
+        int: The hash as a hash_size * hash_size bit integer
+    """
+    grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(grey, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def _hamming_distance(a, b):
+    """Number of differing bits between two hashes."""
+    return bin(a ^ b).count('1')
+
+def _db_key(key):
+    """Text form of a (variant, hash) key for the persistent tier."""
+    variant, hash_value = key
+    return f'{variant}:{hash_value:x}' if variant else format(hash_value, 'x')
+
+def _normalize_results(results):
+    """Convert EasyOCR results to plain JSON-friendly lists."""
+    return [
+        [[[int(x), int(y)] for x, y in box], text, float(confidence)]
+        for box, text, confidence in results
+    ]
+
+
+class OCRCache:
+    """
+    Content-aware cache of OCR results keyed on a perceptual image hash.
+
+    Lookups try an exact hash match, which a re-upload or a steady camera
+    rescan produces. With `max_distance` above 0 they then fall back to the
+    closest stored hash within that many bits (see OCR_CACHE_MAX_DISTANCE
+    for why that is off by default). The memory tier is an LRU bounded by
+    `max_entries`; an optional SQLite file keeps results across restarts.
+    """
+
+    def __init__(self, max_entries=OCR_CACHE_MAX_ENTRIES, max_distance=OCR_CACHE_MAX_DISTANCE,
+                 db_path=OCR_CACHE_DB, hash_size=OCR_CACHE_HASH_SIZE):
+        """
+        Args:
+            max_entries (int): Maximum number of results kept in memory
+            max_distance (int): Largest Hamming distance treated as a hit;
+                0 for exact matches only
+            db_path (str or None): SQLite file for the persistent tier
+            hash_size (int): Hash side length
+        """
+        self.max_entries = max(1, max_entries)
+        self.max_distance = max_distance
+        self.hash_size = hash_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'near_hits': 0, 'persistent_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    image_hash TEXT PRIMARY KEY,
+                    results TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self._db.commit()
+
+    def key(self, image, variant=''):
+        """
+        Hash an image into a cache key.
+
+        Args:
+            image (numpy.ndarray): The image as uploaded
+            variant (str): Kept apart from other variants of the same image,
+                e.g. the preprocessing preset, since each gives its own results
+
+        Returns:
+            tuple: (variant, image hash)
+        """
+        return variant, image_hash(image, self.hash_size)
+
+    def get(self, key):
+        """
+        Look up cached OCR results.
+
+        Args:
+            key (tuple): Key returned by `key`
+
+        Returns:
+            list or None: EasyOCR-style [box, text, confidence] results, or None
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return self._entries[key]
+            stored_keys = list(self._entries) if self.max_distance > 0 else []
+
+        # Near-duplicate photo of something already scanned; the scan is
+        # linear, so it runs on a snapshot of the keys outside the lock
+        variant, hash_value = key
+        best_key, best_distance = None, self.max_distance + 1
+        for stored_key in stored_keys:
+            if stored_key[0] != variant:
+                continue
+            distance = _hamming_distance(hash_value, stored_key[1])
+            if distance < best_distance:
+                best_key, best_distance = stored_key, distance
+
+        with self._lock:
+            if best_key is not None and best_key in self._entries:
+                self._entries.move_to_end(best_key)
+                self.stats['near_hits'] += 1
+                return self._entries[best_key]
+
+            results = self._load(key)
+            if results is not None:
+                self._remember(key, results)
+                self.stats['persistent_hits'] += 1
+                return results
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, results):
+        """
+        Store OCR results for an image hash.
+
+        Args:
+            key (tuple): Key returned by `key`
+            results (list): EasyOCR results for the image
+        """
+        results = _normalize_results(results)
+        with self._lock:
+            self._remember(key, results)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO ocr_cache (image_hash, results, created_at) VALUES (?, ?, ?)',
+                        (_db_key(key), json.dumps(results), time.time())
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    print(f"OCR cache write error: {e}")
+
+    def _remember(self, key, results):
+        """Insert into the memory tier, evicting the least recently used entry."""
+        self._entries[key] = results
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _load(self, key):
+        """Exact-match lookup in the persistent tier."""
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                'SELECT results FROM ocr_cache WHERE image_hash = ?', (_db_key(key),)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"OCR cache read error: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def get_stats(self):
+        """Return hit/miss counters and the current memory tier size."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['persistent'] = self._db is not None
+        lookups = stats['hits'] + stats['near_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = (lookups - stats['misses']) / lookups if lookups else 0.0
+        return stats
+
+
+# Shared cache used by the OCR service
+ocr_cache = OCRCache()
+
+# Read from the cache's own counters when /metrics is scraped
+metrics.callback_counter(
+    'medbuddy_ocr_cache_lookups_total', 'OCR cache lookups by result.',
+    lambda: {(result,): ocr_cache.stats[result]
+             for result in ('hits', 'near_hits', 'persistent_hits', 'misses')},
+    ('result',)
+)
+metrics.gauge('medbuddy_ocr_cache_entries', 'OCR results held in memory.',
+              function=lambda: len(ocr_cache._entries))
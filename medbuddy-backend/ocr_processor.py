@@ -1,10 +1,22 @@
 import cv2
 import easyocr
+import numpy as np
 import os
+import re
+import threading
+
+import preprocessing
+
+# Fast identify: recognized text below this confidence is never matched
+# against the medicines table
+OCR_IDENTIFY_MIN_CONFIDENCE = float(os.environ.get('OCR_IDENTIFY_MIN_CONFIDENCE', '0.4'))
 
 # Initialize the OCR reader (only do this once to avoid loading the model multiple times)
 reader = None
 
+# The reader is not safe to use from two threads at once
+_reader_lock = threading.Lock()
+
 def get_reader():
     """
     Initialize and return the EasyOCR reader.
@@ -16,45 +28,236 @@ def get_reader():
         reader = easyocr.Reader(['en'])  # Initialize for English
     return reader
 
-def extract_text(image_path):
+def load_image(image_path):
     """
-    Extract text from the image using EasyOCR.
-    Returns the extracted text or None if extraction failed.
+    Read an image from disk with OpenCV.
+    Returns the image array or None if it could not be read.
+    """
+    # Check if the image file exists
+    if not os.path.exists(image_path):
+        print(f"Error: Image file not found at {image_path}")
+        return None
+
+    # Read the image
+    img = cv2.imread(image_path)
+
+    if img is None:
+        print(f"Error: Unable to read image at {image_path}")
+        return None
+
+    return img
+
+def decode_image(data):
+    """
+    Decode encoded image bytes (JPEG, PNG, ...) straight into an array.
+
+    The buffer is wrapped with a memoryview so NumPy reads it in place
+    instead of copying the upload.
+
+    Args:
+        data (bytes | bytearray | memoryview): Encoded image file contents
+
+    Returns:
+        numpy.ndarray or None: BGR image array, None if it could not be decoded
+    """
+    if not data:
+        print("Error: Empty image data")
+        return None
+
+    buffer = np.frombuffer(memoryview(data), dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+    if img is None:
+        print("Error: Unable to decode image data")
+        return None
+
+    return img
+
+def results_to_text(results):
+    """
+    Join EasyOCR results into a single string.
+    Returns the extracted text or None if nothing was recognized.
+    """
+    # Extract text from results
+    extracted_text = ' '.join([text for _, text, _ in results])
+
+    if extracted_text.strip():
+        print("Text extracted successfully:")
+        print(extracted_text)
+        return extracted_text
+    else:
+        print("No text could be extracted from the image.")
+        return None
+
+def readtext_batch(images):
+    """
+    Run OCR over several images in as few model calls as possible.
+
+    EasyOCR can only stack images of identical shape into one batch, so the
+    images are grouped by shape and each group is sent through
+    `readtext_batched` together. Single images fall back to `readtext`.
+
+    Args:
+        images (list): List of BGR image arrays
+
+    Returns:
+        list: One EasyOCR result list per input image, in input order
+    """
+    reader = get_reader()
+    results = [None] * len(images)
+
+    # Group image indices by shape so each group can be stacked
+    groups = {}
+    for index, img in enumerate(images):
+        groups.setdefault(img.shape, []).append(index)
+
+    with _reader_lock:
+        for indices in groups.values():
+            if len(indices) == 1:
+                results[indices[0]] = reader.readtext(images[indices[0]])
+                continue
+
+            batch_results = reader.readtext_batched(
+                [images[index] for index in indices],
+                batch_size=len(indices)
+            )
+            for index, result in zip(indices, batch_results):
+                results[index] = result
+
+    return results
+
+def _region_height(horizontal_box=None, free_box=None):
+    """Text height of a detected region, in pixels."""
+    if horizontal_box is not None:
+        _, _, y_min, y_max = horizontal_box
+        return y_max - y_min
+    points = np.asarray(free_box, dtype=np.float64)
+    # Average length of the left and right edges of the quadrilateral
+    return (np.linalg.norm(points[3] - points[0]) + np.linalg.norm(points[2] - points[1])) / 2
+
+def detect_regions(image):
+    """
+    Run only EasyOCR's text detector over an image.
+
+    Args:
+        image (numpy.ndarray): BGR or greyscale image array
+
+    Returns:
+        list: (horizontal_box, free_box) pairs, one of them None, ordered
+        by text height, tallest first
+    """
+    horizontal_list, free_list = get_reader().detect(image)
+    regions = [(box, None) for box in horizontal_list[0]] + [(None, box) for box in free_list[0]]
+    regions.sort(key=lambda region: _region_height(*region), reverse=True)
+    return regions
+
+def _candidate_words(text):
+    """The whole text plus each word long enough to be a medicine name."""
+    words = [re.sub(r'^\W+|\W+$', '', word) for word in text.split()]
+    candidates = [text.strip()] + [word for word in words if len(word) > 3]
+    return list(dict.fromkeys(candidate for candidate in candidates if candidate))
+
+def match_results(results, match, min_confidence=OCR_IDENTIFY_MIN_CONFIDENCE):
+    """
+    First recognized text, in result order, that names a known medicine.
+
+    Args:
+        results (list): EasyOCR [box, text, confidence] results
+        match (callable): Takes a piece of text, returns (name, score) or None
+        min_confidence (float): Skip recognitions less certain than this
+
+    Returns:
+        dict or None: 'name', 'score', 'text' and 'confidence' of the match
+    """
+    for _, text, confidence in results:
+        if confidence < min_confidence:
+            continue
+        for candidate in _candidate_words(text):
+            found = match(candidate)
+            if found:
+                name, score = found
+                return {'name': name, 'score': score, 'text': text, 'confidence': float(confidence)}
+    return None
+
+def identify_medication(image, match, min_confidence=OCR_IDENTIFY_MIN_CONFIDENCE):
+    """
+    Recognize text regions largest first and stop at the first known medicine.
+
+    Brand names are printed in the largest type, so only the detector runs
+    over the whole label; recognition then works through the regions by
+    text height and usually stops after the first one or two instead of
+    reading every line of fine print.
+
+    Args:
+        image (numpy.ndarray): BGR or greyscale image array
+        match (callable): Takes a piece of text, returns (name, score) or None
+        min_confidence (float): Skip recognitions less certain than this
+
+    Returns:
+        tuple: (match dict or None, results recognized so far in region
+        order, number of regions detected). Without a match every region
+        has been recognized.
+    """
+    reader = get_reader()
+    results = []
+    with _reader_lock:
+        regions = detect_regions(image)
+        for horizontal_box, free_box in regions:
+            region_results = reader.recognize(
+                image,
+                horizontal_list=[horizontal_box] if horizontal_box is not None else [],
+                free_list=[free_box] if free_box is not None else []
+            )
+            results.extend(region_results)
+            found = match_results(region_results, match, min_confidence)
+            if found:
+                return found, results, len(regions)
+    return None, results, len(regions)
+
+def extract_text_from_image(image, preset=None):
+    """
+    Extract text from an in-memory image using EasyOCR.
+
+    Args:
+        image (numpy.ndarray | bytes): Decoded BGR array or encoded image bytes
+        preset (str or None): Preprocessing preset, None for the default
+
+    Returns:
+        str or None: The extracted text or None if extraction failed
     """
     try:
-        # Check if the image file exists
-        if not os.path.exists(image_path):
-            print(f"Error: Image file not found at {image_path}")
-            return None
-            
-        # Read the image
-        img = cv2.imread(image_path)
-        
+        img = image if isinstance(image, np.ndarray) else decode_image(image)
         if img is None:
-            print(f"Error: Unable to read image at {image_path}")
             return None
-        
+
+        # Shrink and clean up the photo before OCR
+        processed, info = preprocessing.preprocess(img, preset)
+        print(f"Preprocessed with '{info['preset']}': {info['input_pixels']} -> {info['output_pixels']} pixels")
+
         # Get the OCR reader
         reader = get_reader()
-        
-        # Perform OCR
-        results = reader.readtext(img)
-        
-        # Extract text from results
-        extracted_text = ' '.join([text for _, text, _ in results])
-        
-        if extracted_text.strip():
-            print("Text extracted successfully:")
-            print(extracted_text)
-            return extracted_text
-        else:
-            print("No text could be extracted from the image.")
-            return None
-            
+
+        # Perform OCR; the reader is shared with the batcher and identify
+        with _reader_lock:
+            results = reader.readtext(processed)
+
+        return results_to_text(results)
+
     except Exception as e:
         print(f"Error during OCR: {e}")
         return None
 
+def extract_text(image_path, preset=None):
+    """
+    Extract text from the image using EasyOCR.
+    Returns the extracted text or None if extraction failed.
+    """
+    img = load_image(image_path)
+    if img is None:
+        return None
+
+    return extract_text_from_image(img, preset)
+
 def extract_medication_name(text):
     """
     Extract potential medication name from OCR text.
@@ -0,0 +1,304 @@
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+import database_handler
+import metrics
+import ocr_processor
+import preprocessing
+from ocr_batcher import batcher
+from ocr_cache import ocr_cache
+
+# Number of OCR worker processes (each holds one copy of the EasyOCR model),
+# how many images may be queued or running before new scans are turned away,
+# and how long a single batch may take before the request gives up.
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', '2'))
+OCR_QUEUE_SIZE = int(os.environ.get('OCR_QUEUE_SIZE', '16'))
+OCR_JOB_TIMEOUT = float(os.environ.get('OCR_JOB_TIMEOUT', '60'))
+
+OCR_STEP_SECONDS = metrics.histogram(
+    'medbuddy_ocr_step_seconds', 'Time spent in each step of an OCR service call.', ('step',)
+)
+OCR_PIXELS = metrics.counter('medbuddy_ocr_pixels_total',
+                             'Pixels received and pixels sent to OCR after preprocessing, by preset.',
+                             ('preset', 'stage'))
+OCR_IDENTIFY = metrics.counter('medbuddy_ocr_identify_total',
+                               'Fast identify scans by result (matched early or fell back to all text).',
+                               ('result',))
+OCR_IDENTIFY_REGIONS = metrics.counter('medbuddy_ocr_identify_regions_total',
+                                       'Text regions detected and recognized by fast identify.', ('stage',))
+OCR_REJECTED = metrics.counter('medbuddy_ocr_rejected_total', 'Scans turned away because the OCR queue was full.')
+
+
+class OCRServiceBusy(Exception):
+    """Raised when the OCR job queue is full and the scan cannot be accepted."""
+
+class OCRServiceTimeout(Exception):
+    """Raised when a worker does not return an OCR result within the job timeout."""
+
+
+def _init_worker():
+    """Load the EasyOCR model once when a worker process starts."""
+    ocr_processor.get_reader()
+
+def _run_batch(images):
+    """Worker-side entry point: OCR a batch with the process-local reader."""
+    return ocr_processor.readtext_batch(images)
+
+def _run_identify(image):
+    """
+    Worker-side entry point for fast identify. Each worker matches against
+    its own copy of the medicine index, topped up with new medicines first.
+    """
+    database_handler.get_medicine_index(refresh=True)
+    return ocr_processor.identify_medication(image, database_handler.match_medicine_name)
+
+
+class OCRService:
+    """
+    Fixed pool of OCR worker processes behind a bounded job queue.
+
+    The workers are started (and the model loaded) up front by `start`, so
+    no request pays the model initialization cost. Servers that never call
+    `start` (e.g. the app imported by a WSGI server) get the pool on the
+    first scan instead, so OCR always runs in at most `workers` model
+    copies per server process. Requests reach the pool through the shared
+    batcher; once `max_queue` images are waiting or running, further scans
+    are rejected with `OCRServiceBusy` instead of piling up behind the
+    workers.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, max_queue=OCR_QUEUE_SIZE, timeout=OCR_JOB_TIMEOUT):
+        """
+        Args:
+            workers (int): Number of worker processes
+            max_queue (int): Maximum number of images queued or in progress
+            timeout (float): Seconds to wait for a batch result
+        """
+        self.workers = workers
+        self.max_queue = max(1, max_queue)
+        self.timeout = timeout
+        self._pool = None
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+
+    @property
+    def running(self):
+        """True once the worker pool has been started."""
+        return self._pool is not None
+
+    def start(self):
+        """
+        Start the worker processes and route the shared batcher to them.
+        Does nothing if the pool is already running or workers is 0, so
+        it is cheap to call before every scan.
+        """
+        if self.running or self.workers <= 0:
+            return
+        with self._start_lock:
+            if self.running or self.workers <= 0:
+                return
+
+            print(f"Starting {self.workers} OCR worker processes...")
+            # Use spawn so workers never inherit a half-initialized model or
+            # the web server's threads
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(processes=self.workers, initializer=_init_worker)
+
+            batcher.runner = self.run_batch
+            batcher.set_concurrency(self.workers)
+
+    def stop(self):
+        """Shut the worker processes down and fall back to in-process OCR."""
+        with self._start_lock:
+            if not self.running:
+                return
+
+            batcher.runner = ocr_processor.readtext_batch
+            batcher.set_concurrency(1)
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def run_batch(self, images):
+        """
+        Run a batch of images on one of the worker processes.
+
+        Args:
+            images (list): List of BGR image arrays
+
+        Returns:
+            list: One EasyOCR result list per image
+
+        Raises:
+            OCRServiceTimeout: If the worker does not finish within the timeout
+        """
+        try:
+            return self._pool.apply_async(_run_batch, (images,)).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            raise OCRServiceTimeout(f"OCR batch of {len(images)} images took longer than {self.timeout:g}s")
+
+    def identify(self, image):
+        """
+        Run fast identify for one image on a worker process, or in this
+        process when the pool is not running.
+
+        Returns:
+            tuple: (match dict or None, recognized results, regions detected)
+
+        Raises:
+            OCRServiceTimeout: If the worker does not finish within the timeout
+        """
+        if not self.running:
+            return _run_identify(image)
+        try:
+            return self._pool.apply_async(_run_identify, (image,)).get(self.timeout)
+        except multiprocessing.TimeoutError:
+            raise OCRServiceTimeout(f"Fast identify took longer than {self.timeout:g}s")
+
+    def queue_depth(self):
+        """Number of images currently queued or being processed."""
+        with self._lock:
+            return self._in_flight
+
+    @contextmanager
+    def admit(self, count=1):
+        """
+        Reserve room for `count` images in the job queue.
+
+        Raises:
+            OCRServiceBusy: If the queue is already full
+        """
+        with self._lock:
+            if self._in_flight + count > self.max_queue:
+                OCR_REJECTED.inc(count)
+                raise OCRServiceBusy(
+                    f"OCR queue is full ({self._in_flight}/{self.max_queue} scans pending)"
+                )
+            self._in_flight += count
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= count
+
+
+# Shared service used by the web servers
+ocr_service = OCRService()
+
+metrics.gauge('medbuddy_ocr_in_flight', 'Images queued or being processed by the OCR service.',
+              function=ocr_service.queue_depth)
+metrics.gauge('medbuddy_ocr_batcher_queue_depth', 'Images waiting to be batched.',
+              function=lambda: batcher.queue_depth())
+
+def extract_text_from_image(image, preset=None):
+    """
+    Extract text from an in-memory image through the OCR service.
+
+    Rescans of a label that was already read with the same preset are
+    answered from the OCR cache without preprocessing or queueing any work.
+
+    Args:
+        image (numpy.ndarray | bytes): Decoded BGR array or encoded image bytes
+        preset (str or None): Preprocessing preset, None for the default
+
+    Returns:
+        str or None: The extracted text or None if extraction failed
+
+    Raises:
+        OCRServiceBusy: If the job queue is full
+        OCRServiceTimeout: If the OCR worker timed out
+        ValueError: If the preset does not exist
+    """
+    preset = preprocessing.resolve_preset(preset)
+    img = image if isinstance(image, np.ndarray) else ocr_processor.decode_image(image)
+    if img is None:
+        return None
+
+    with OCR_STEP_SECONDS.time(step='cache_lookup'):
+        cache_key = ocr_cache.key(img, preset)
+        results = ocr_cache.get(cache_key)
+
+    if results is None:
+        ocr_service.start()
+        with ocr_service.admit():
+            with OCR_STEP_SECONDS.time(step='preprocess'):
+                processed, info = preprocessing.preprocess(img, preset)
+            OCR_PIXELS.inc(info['input_pixels'], preset=preset, stage='input')
+            OCR_PIXELS.inc(info['output_pixels'], preset=preset, stage='processed')
+            try:
+                # Queue wait plus detection and recognition in a worker
+                with OCR_STEP_SECONDS.time(step='recognize'):
+                    results = preprocessing.restore_boxes(batcher.submit(processed), info)
+            except OCRServiceTimeout:
+                raise
+            except Exception as e:
+                print(f"Error during OCR: {e}")
+                return None
+        ocr_cache.put(cache_key, results)
+
+    return ocr_processor.results_to_text(results)
+
+def identify_medication_from_image(image, preset=None):
+    """
+    Fast identify: find a known medicine name without reading the whole label.
+
+    Text regions are recognized largest first and recognition stops at
+    the first one that matches the medicines table. If none does, every
+    region has been read and the full text is returned instead, for the
+    usual name extraction.
+
+    Args:
+        image (numpy.ndarray | bytes): Decoded BGR array or encoded image bytes
+        preset (str or None): Preprocessing preset, None for the default
+
+    Returns:
+        tuple: (medicine name or None, text or None). With a match the text
+        is the region it was found in; otherwise all recognized text.
+
+    Raises:
+        OCRServiceBusy: If the job queue is full
+        OCRServiceTimeout: If the OCR worker timed out
+        ValueError: If the preset does not exist
+    """
+    preset = preprocessing.resolve_preset(preset)
+    img = image if isinstance(image, np.ndarray) else ocr_processor.decode_image(image)
+    if img is None:
+        return None, None
+
+    # Rescans replay the regions read last time; they end with the match
+    with OCR_STEP_SECONDS.time(step='cache_lookup'):
+        cache_key = ocr_cache.key(img, f'{preset}:identify')
+        results = ocr_cache.get(cache_key)
+
+    if results is not None:
+        found = ocr_processor.match_results(results, database_handler.match_medicine_name)
+    else:
+        ocr_service.start()
+        with ocr_service.admit():
+            with OCR_STEP_SECONDS.time(step='preprocess'):
+                processed, info = preprocessing.preprocess(img, preset)
+            OCR_PIXELS.inc(info['input_pixels'], preset=preset, stage='input')
+            OCR_PIXELS.inc(info['output_pixels'], preset=preset, stage='processed')
+            try:
+                with OCR_STEP_SECONDS.time(step='identify'):
+                    found, results, detected = ocr_service.identify(processed)
+            except OCRServiceTimeout:
+                raise
+            except Exception as e:
+                print(f"Error during OCR: {e}")
+                return None, None
+        results = preprocessing.restore_boxes(results, info)
+        OCR_IDENTIFY_REGIONS.inc(detected, stage='detected')
+        OCR_IDENTIFY_REGIONS.inc(len(results), stage='recognized')
+        ocr_cache.put(cache_key, results)
+
+    OCR_IDENTIFY.inc(result='matched' if found else 'fallback')
+    if found:
+        print(f"Identified medication: {found['name']} (from '{found['text']}', score {found['score']:.2f})")
+        return found['name'], found['text']
+    return None, ocr_processor.results_to_text(results)
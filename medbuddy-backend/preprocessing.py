@@ -0,0 +1,168 @@
+import os
+
+import cv2
+import numpy as np
+
+# Named preprocessing presets, from cheapest to most thorough. Images are
+# only ever shrunk to max_dimension (longest side), never enlarged.
+PRESETS = {
+    # Pass the image through untouched, as before
+    'none': {'max_dimension': None, 'grayscale': False, 'normalize': False, 'deskew': False},
+    # Small greyscale image for quick identification of clear labels
+    'fast': {'max_dimension': 1024, 'grayscale': True, 'normalize': False, 'deskew': False},
+    # Default: enough resolution for small print, contrast evened out
+    'balanced': {'max_dimension': 1600, 'grayscale': True, 'normalize': True, 'deskew': False},
+    # Larger image, contrast normalization and rotation correction
+    'quality': {'max_dimension': 2560, 'grayscale': True, 'normalize': True, 'deskew': True},
+}
+
+# Preset used when a request does not name one
+OCR_PREPROCESS_PRESET = os.environ.get('OCR_PREPROCESS_PRESET', 'balanced')
+
+# Skew angles (degrees) outside this range are left alone: small ones do
+# not hurt OCR, large ones are more likely a misread of the layout
+DESKEW_MIN_ANGLE = 0.5
+DESKEW_MAX_ANGLE = 15.0
+
+# Longest side of the copy used to estimate skew
+DESKEW_ANALYSIS_DIMENSION = 800
+
+
+def resolve_preset(name=None):
+    """
+    Validate a preset name.
+
+    Args:
+        name (str or None): Preset name, None for the default
+
+    Returns:
+        str: The preset name
+
+    Raises:
+        ValueError: If the preset does not exist
+    """
+    name = name or OCR_PREPROCESS_PRESET
+    if name not in PRESETS:
+        raise ValueError(f"Unknown preprocessing preset '{name}' (choose from {', '.join(PRESETS)})")
+    return name
+
+def _downscale(image, max_dimension):
+    """Shrink so the longest side is at most max_dimension; return (image, scale)."""
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_dimension or longest <= max_dimension:
+        return image, 1.0
+    scale = max_dimension / longest
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+def estimate_skew(grey):
+    """
+    Estimate the rotation of the text block in a greyscale image.
+
+    Dark (text) pixels are thresholded with Otsu and the minimum-area
+    rectangle around them gives the dominant angle.
+
+    Returns:
+        float: Angle in degrees to rotate by to straighten the text
+    """
+    small, _ = _downscale(grey, DESKEW_ANALYSIS_DIMENSION)
+    _, mask = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 50:
+        return 0.0
+
+    angle = cv2.minAreaRect(points)[-1]
+    # minAreaRect reports angles in [-90, 0) or (0, 90] depending on the
+    # OpenCV version; fold into (-45, 45]
+    if angle > 45:
+        angle -= 90
+    elif angle <= -45:
+        angle += 90
+    return float(angle)
+
+def _rotate(image, angle):
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
+def preprocess(image, preset=None):
+    """
+    Prepare a label photo for OCR according to a preset.
+
+    Steps, each enabled by the preset: downscale to max_dimension,
+    convert to greyscale, normalize contrast with CLAHE and correct small
+    rotations.
+
+    Args:
+        image (numpy.ndarray): BGR or greyscale image array
+        preset (str or None): Preset name, None for OCR_PREPROCESS_PRESET
+
+    Returns:
+        tuple: (processed image, info dict with the preset, input_pixels,
+        output_pixels, scale, skew_angle and the processed size)
+
+    Raises:
+        ValueError: If the preset does not exist
+    """
+    preset = resolve_preset(preset)
+    options = PRESETS[preset]
+    input_pixels = image.shape[0] * image.shape[1]
+
+    processed, scale = _downscale(image, options['max_dimension'])
+
+    if options['grayscale'] and processed.ndim == 3:
+        processed = cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
+
+    if options['normalize']:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        if processed.ndim == 2:
+            processed = clahe.apply(processed)
+        else:
+            lab = cv2.cvtColor(processed, cv2.COLOR_BGR2LAB)
+            lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+            processed = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+    skew_angle = 0.0
+    if options['deskew']:
+        grey = processed if processed.ndim == 2 else cv2.cvtColor(processed, cv2.COLOR_BGR2GRAY)
+        angle = estimate_skew(grey)
+        if DESKEW_MIN_ANGLE <= abs(angle) <= DESKEW_MAX_ANGLE:
+            processed = _rotate(processed, angle)
+            skew_angle = angle
+
+    return processed, {
+        'preset': preset,
+        'input_pixels': input_pixels,
+        'output_pixels': processed.shape[0] * processed.shape[1],
+        'scale': scale,
+        'skew_angle': skew_angle,
+        'size': processed.shape[:2],
+    }
+
+def restore_boxes(results, info):
+    """
+    Map EasyOCR box coordinates from the processed image back onto the
+    original image, undoing the rotation and scaling from `preprocess`.
+
+    Args:
+        results (list): EasyOCR [box, text, confidence] results
+        info (dict): Info returned by `preprocess`
+
+    Returns:
+        list: Results with boxes in original image coordinates
+    """
+    if info['scale'] == 1.0 and not info['skew_angle']:
+        return results
+
+    height, width = info['size']
+    inverse = cv2.getRotationMatrix2D((width / 2, height / 2), -info['skew_angle'], 1.0)
+    restored = []
+    for box, text, confidence in results:
+        points = np.asarray(box, dtype=np.float64).reshape(-1, 2)
+        if info['skew_angle']:
+            points = np.hstack([points, np.ones((len(points), 1))]) @ inverse.T
+        points = points / info['scale']
+        restored.append(([[int(round(x)), int(round(y))] for x, y in points], text, confidence))
+    return restored
@@ -0,0 +1,250 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import event_bus
+import metrics
+from database_handler import search_medication
+from fda_api import get_medication_info
+from ocr_processor import extract_medication_name
+from ocr_service import (extract_text_from_image, identify_medication_from_image, OCRServiceBusy,
+                         OCRServiceTimeout, OCR_QUEUE_SIZE)
+
+# Threads running queued scans (they mostly wait on the OCR batcher, so
+# enough of them keeps the OCR queue full), how many jobs may wait or run
+# before new ones are refused, and how long finished jobs stay pollable.
+SCAN_JOB_WORKERS = int(os.environ.get('SCAN_JOB_WORKERS', str(OCR_QUEUE_SIZE)))
+SCAN_JOB_MAX_PENDING = int(os.environ.get('SCAN_JOB_MAX_PENDING', str(4 * OCR_QUEUE_SIZE)))
+SCAN_JOB_TTL = float(os.environ.get('SCAN_JOB_TTL', '600'))
+
+# Scan modes: read the whole label, or stop at the first known medicine
+# name found in the largest text
+FULL = 'full'
+FAST = 'fast'
+SCAN_MODES = (FULL, FAST)
+
+# Job states, in order
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+SCAN_REQUESTS = metrics.counter('medbuddy_scan_requests_total', 'Label scans handled by /upload, by outcome.',
+                                ('outcome',))
+
+
+def scan_image(image, pipeline='upload', progress=None, preset=None, mode=FULL):
+    """
+    Identify the medication on a decoded label image and look it up.
+
+    Args:
+        image (numpy.ndarray): Decoded BGR image
+        pipeline (str): Label for the stage timings ('upload' or 'job')
+        progress (callable or None): Called with each stage name as it starts
+        preset (str or None): OCR preprocessing preset, None for the default
+        mode (str): FULL or FAST (identify from the largest text first)
+
+    Returns:
+        tuple: (response body dict, HTTP status code)
+    """
+    def enter(stage):
+        if progress is not None:
+            progress(stage)
+        return metrics.stage(stage, pipeline)
+
+    try:
+        with metrics.stage('total', pipeline):
+            # Process the image with OCR to extract text
+            with enter('ocr'):
+                if mode == FAST:
+                    identified_name, extracted_text = identify_medication_from_image(image, preset)
+                else:
+                    identified_name, extracted_text = None, extract_text_from_image(image, preset)
+
+            if not extracted_text:
+                SCAN_REQUESTS.inc(outcome='no_text')
+                return {
+                    'error': 'Could not extract text from image',
+                    'message': 'Please take a clearer photo of the medication label'
+                }, 400
+
+            # Extract the medication name from the OCR text
+            with enter('extract_name'):
+                medication_name = identified_name or extract_medication_name(extracted_text)
+
+            if not medication_name:
+                SCAN_REQUESTS.inc(outcome='no_name')
+                return {
+                    'error': 'Could not identify medication',
+                    'message': 'Unable to identify medication from the image'
+                }, 400
+
+            # Search for medication information in local database
+            with enter('local_search'):
+                medication_info = search_medication(medication_name)
+
+            # If not found in database, fallback to FDA API simulation
+            if not medication_info:
+                with enter('fda_lookup'):
+                    medication_info = get_medication_info(medication_name)
+
+        # Format the response for the frontend
+        body = {
+            'medicine': medication_info.get('name', medication_name),
+            'description': medication_info.get('dosage', 'No dosage information available'),
+            'source': medication_info.get('source', 'Unknown'),
+            'uses': medication_info.get('uses', 'No uses information available'),
+            'side_effects': medication_info.get('side_effects', 'No side effects information available'),
+            'warnings': medication_info.get('warnings', 'No warnings available')
+        }
+        SCAN_REQUESTS.inc(outcome='ok')
+        return body, 200
+
+    except OCRServiceBusy:
+        SCAN_REQUESTS.inc(outcome='busy')
+        return {
+            'error': 'OCR service busy',
+            'message': 'Too many scans are being processed. Please try again shortly.'
+        }, 503
+
+    except OCRServiceTimeout:
+        SCAN_REQUESTS.inc(outcome='timeout')
+        return {
+            'error': 'OCR timed out',
+            'message': 'Reading the label took too long. Please try again shortly.'
+        }, 504
+
+    except Exception as e:
+        SCAN_REQUESTS.inc(outcome='error')
+        return {'error': 'Server error', 'message': str(e)}, 500
+
+
+class ScanJobs:
+    """
+    In-memory table of asynchronous scans.
+
+    `submit` queues a decoded image and returns at once; a small thread
+    pool runs the scan pipeline and records the result, which stays
+    available to `get` for `ttl` seconds after the job finishes. Finished
+    jobs are also published on the event bus so the WebSocket server can
+    push them to the scanning user.
+    """
+
+    def __init__(self, workers=SCAN_JOB_WORKERS, max_pending=SCAN_JOB_MAX_PENDING, ttl=SCAN_JOB_TTL):
+        """
+        Args:
+            workers (int): Threads running scans
+            max_pending (int): Maximum number of queued or running jobs
+            ttl (float): Seconds a finished job is kept
+        """
+        self.max_pending = max(1, max_pending)
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='scan-job')
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        """Drop finished jobs older than the TTL. Call with the lock held."""
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] + self.ttl < now]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, image, user_id=None, preset=None, mode=FULL):
+        """
+        Queue a scan of `image`.
+
+        Args:
+            image (numpy.ndarray): Decoded BGR image
+            user_id (int or None): User to push the result to when done
+            preset (str or None): OCR preprocessing preset
+            mode (str): FULL or FAST
+
+        Returns:
+            str: The job id
+
+        Raises:
+            OCRServiceBusy: If max_pending jobs are already queued or running
+        """
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict(now)
+            if self._pending >= self.max_pending:
+                SCAN_REQUESTS.inc(outcome='busy')
+                raise OCRServiceBusy(f"Scan job queue is full ({self._pending} jobs pending)")
+            self._pending += 1
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': QUEUED,
+                'stage': None,
+                'user_id': user_id,
+                'created_at': now,
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'http_status': None
+            }
+
+        self._executor.submit(self._run, job_id, image, preset, mode)
+        return job_id
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+
+    def _run(self, job_id, image, preset, mode):
+        # Only finished jobs are evicted, so the record is still there
+        started = time.time()
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status=RUNNING, started_at=started)
+            user_id = job['user_id']
+        metrics.SCAN_STAGE_SECONDS.observe(started - job['created_at'], pipeline='job', stage='queue_wait')
+
+        try:
+            body, status_code = scan_image(image, 'job', lambda stage: self._update(job_id, stage=stage),
+                                           preset, mode)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        status = DONE if status_code == 200 else FAILED
+        self._update(job_id, status=status, stage=None, finished_at=time.time(),
+                     result=body, http_status=status_code)
+        event_bus.publish(event_bus.SCAN_COMPLETED, job_id=job_id, user_id=user_id,
+                          status=status, result=body)
+
+    def get(self, job_id):
+        """
+        Current state of a job.
+
+        Returns:
+            dict or None: A copy of the job record, or None if the id is
+            unknown or the job has expired
+        """
+        with self._lock:
+            self._evict(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def counts(self):
+        """Number of known jobs per status."""
+        counts = {(status,): 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[(job['status'],)] += 1
+        return counts
+
+
+# Shared job table used by the web server
+scan_jobs = ScanJobs()
+
+metrics.gauge('medbuddy_scan_jobs', 'Asynchronous scan jobs held in memory, by status.', ('status',),
+              function=scan_jobs.counts)
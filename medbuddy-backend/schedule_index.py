@@ -0,0 +1,312 @@
+import sqlite3
+import threading
+
+import numpy as np
+
+import event_bus
+from db_connection import DB_PATH, connection
+
+MINUTES_PER_DAY = 24 * 60
+
+# A dose counts as on time within this many minutes of a prescribed time
+DOSE_WINDOW_MINUTES = 30
+
+# Every dose slot with the names needed for notifications; the WHERE clause
+# makes the same query serve full loads (0) and incremental refreshes
+SCHEDULE_ROWS_QUERY = '''
+    SELECT
+        p.prescription_id,
+        p.user_id,
+        u.name,
+        p.medicine_id,
+        m.name,
+        p.doses_per_day,
+        dt.time_of_day
+    FROM prescriptions p
+    JOIN users u ON p.user_id = u.user_id
+    JOIN medicines m ON p.medicine_id = m.medicine_id
+    JOIN dosage_times dt ON p.prescription_id = dt.prescription_id
+    WHERE p.prescription_id > ?
+'''
+
+
+def to_minutes(time_of_day):
+    """Convert an 'HH:MM' (or 'HH:MM:SS') string to minutes since midnight."""
+    hours, minutes = time_of_day.split(':')[:2]
+    return int(hours) * 60 + int(minutes)
+
+def format_minutes(minutes):
+    """Convert minutes since midnight back to 'HH:MM'."""
+    return f'{int(minutes) // 60:02d}:{int(minutes) % 60:02d}'
+
+
+class ScheduleIndex:
+    """
+    Every prescribed dose time of every patient, as NumPy columns.
+
+    One row per dose slot, sorted by (user, medicine, minute), so each
+    user's doses of one medicine are contiguous. A combined
+    `pair * MINUTES_PER_DAY + minute` key turns "does this (user,
+    medicine) have a dose within N minutes of t" into two binary searches,
+    for any number of queries at once, and "who is due between t1 and t2"
+    into one comparison over the minutes column.
+
+    Prescriptions are only ever added in this app, so updates append:
+    new rows are buffered and merged into the arrays on the next query.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._prescription_ids = set()
+        self._pending = []
+        self.user_names = {}
+        self.medicine_names = {}
+        self.max_prescription_id = 0
+        self.loaded = False
+        self._set_arrays(*([] for _ in range(5)))
+
+    def __len__(self):
+        with self._lock:
+            self._merge()
+            return len(self.minutes)
+
+    def _set_arrays(self, prescription_ids, user_ids, medicine_ids, doses_per_day, minutes):
+        """Sort the slot columns and rebuild the pair keys. Call with the lock held."""
+        prescription_ids = np.asarray(prescription_ids, dtype=np.int64)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        medicine_ids = np.asarray(medicine_ids, dtype=np.int64)
+        doses_per_day = np.asarray(doses_per_day, dtype=np.int32)
+        minutes = np.asarray(minutes, dtype=np.int32)
+
+        pair_keys = (user_ids << 32) | medicine_ids
+        order = np.lexsort((prescription_ids, minutes, pair_keys))
+        self.prescription_ids = prescription_ids[order]
+        self.user_ids = user_ids[order]
+        self.medicine_ids = medicine_ids[order]
+        self.doses_per_day = doses_per_day[order]
+        self.minutes = minutes[order]
+
+        # Dense pair codes and the combined (pair, minute) search key
+        self.pairs, codes = np.unique(pair_keys[order], return_inverse=True)
+        self._slot_keys = codes.astype(np.int64) * MINUTES_PER_DAY + self.minutes
+
+        # Dose number of each slot within its own prescription (1 = earliest)
+        by_prescription = np.lexsort((self.minutes, self.prescription_ids))
+        dose_numbers = np.empty(len(order), dtype=np.int32)
+        if len(order):
+            sorted_ids = self.prescription_ids[by_prescription]
+            starts = np.r_[0, np.flatnonzero(sorted_ids[1:] != sorted_ids[:-1]) + 1]
+            positions = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+            dose_numbers[by_prescription] = positions + 1
+        self.dose_numbers = dose_numbers
+
+    def _merge(self):
+        """Fold buffered prescriptions into the arrays. Call with the lock held."""
+        if not self._pending:
+            return
+        columns = list(zip(*self._pending))
+        self._pending = []
+        self._set_arrays(
+            np.r_[self.prescription_ids, columns[0]],
+            np.r_[self.user_ids, columns[1]],
+            np.r_[self.medicine_ids, columns[2]],
+            np.r_[self.doses_per_day, columns[3]],
+            np.r_[self.minutes, columns[4]]
+        )
+
+    def add_prescription(self, prescription_id, user_id, user_name, medicine_id, medicine_name,
+                         doses_per_day, times):
+        """
+        Add one prescription's dose times, unless it is already indexed.
+
+        Args:
+            prescription_id (int): Prescription ID
+            user_id (int): User ID
+            user_name (str): User name, for notifications
+            medicine_id (int): Medicine ID
+            medicine_name (str): Medicine name, for notifications
+            doses_per_day (int): Prescribed doses per day
+            times (list): 'HH:MM' dose times
+        """
+        with self._lock:
+            if prescription_id in self._prescription_ids:
+                return
+            self._prescription_ids.add(prescription_id)
+            self.max_prescription_id = max(self.max_prescription_id, prescription_id)
+            self.user_names[user_id] = user_name
+            self.medicine_names[medicine_id] = medicine_name
+            for minute in sorted({to_minutes(time_of_day) for time_of_day in times}):
+                self._pending.append((prescription_id, user_id, medicine_id, doses_per_day, minute))
+
+    def _add_rows(self, rows):
+        """Add SCHEDULE_ROWS_QUERY rows, grouped by prescription."""
+        prescriptions = {}
+        for prescription_id, user_id, user_name, medicine_id, medicine_name, doses_per_day, time_of_day in rows:
+            entry = prescriptions.setdefault(
+                prescription_id, [user_id, user_name, medicine_id, medicine_name, doses_per_day, []]
+            )
+            entry[5].append(time_of_day)
+        for prescription_id, entry in prescriptions.items():
+            self.add_prescription(prescription_id, *entry)
+
+    def load(self, db_path=DB_PATH):
+        """
+        Rebuild the index from the database.
+
+        Returns:
+            bool: False if the database could not be read
+        """
+        try:
+            with connection(db_path) as conn:
+                rows = conn.execute(SCHEDULE_ROWS_QUERY, (0,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Schedule index load error: {e}")
+            return False
+
+        fresh = ScheduleIndex()
+        fresh._add_rows(rows)
+        with fresh._lock:
+            fresh._merge()
+        # Swap in one step, so queries never see a half-built index
+        with self._lock:
+            self._prescription_ids = fresh._prescription_ids
+            self._pending = []
+            self.user_names = fresh.user_names
+            self.medicine_names = fresh.medicine_names
+            self.max_prescription_id = fresh.max_prescription_id
+            self._set_arrays(fresh.prescription_ids, fresh.user_ids, fresh.medicine_ids,
+                             fresh.doses_per_day, fresh.minutes)
+            self.loaded = True
+        return True
+
+    def refresh(self, db_path=DB_PATH):
+        """
+        Index prescriptions added to the database since the last load or
+        refresh, e.g. by a bulk import or another process.
+        """
+        try:
+            with connection(db_path) as conn:
+                rows = conn.execute(SCHEDULE_ROWS_QUERY, (self.max_prescription_id,)).fetchall()
+        except sqlite3.Error as e:
+            print(f"Schedule index refresh error: {e}")
+            return
+        self._add_rows(rows)
+
+    def handle_event(self, event):
+        """
+        Keep the index current from event bus change events. An index
+        that has not been loaded yet ignores them; its first load reads
+        the committed changes anyway.
+        """
+        if not self.loaded:
+            return
+        if event['type'] == event_bus.PRESCRIPTION_CREATED:
+            for prescription in event.get('prescriptions', []):
+                self.add_prescription(
+                    prescription['prescription_id'], event['user_id'], event['user_name'],
+                    prescription['medicine_id'], prescription['medicine_name'],
+                    prescription.get('doses_per_day', len(prescription['times'])), prescription['times']
+                )
+        elif event['type'] == event_bus.PRESCRIPTIONS_IMPORTED:
+            self.refresh()
+
+    def _pair_codes(self, user_ids, medicine_ids):
+        """Dense codes of (user, medicine) pairs, and whether each is indexed."""
+        keys = (np.asarray(user_ids, dtype=np.int64) << 32) | np.asarray(medicine_ids, dtype=np.int64)
+        codes = np.searchsorted(self.pairs, keys)
+        found = codes < len(self.pairs)
+        found[found] = self.pairs[codes[found]] == keys[found]
+        return codes, found
+
+    def in_window(self, user_ids, medicine_ids, minutes, window=DOSE_WINDOW_MINUTES):
+        """
+        Whether each intake falls within `window` minutes of one of that
+        user's prescribed times for that medicine (same-day distance, as
+        the tracker has always measured it).
+
+        Args:
+            user_ids (int or array-like): User ID per intake
+            medicine_ids (int or array-like): Medicine ID per intake
+            minutes (int or array-like): Local intake time, minutes since midnight
+            window (int): Allowed distance in minutes (exclusive)
+
+        Returns:
+            bool or numpy.ndarray: One flag per intake; False if the pair
+            has no prescription
+        """
+        scalar = np.ndim(minutes) == 0
+        with self._lock:
+            self._merge()
+            codes, found = self._pair_codes(np.atleast_1d(user_ids), np.atleast_1d(medicine_ids))
+            minutes = np.atleast_1d(np.asarray(minutes, dtype=np.int64))
+            base = codes.astype(np.int64) * MINUTES_PER_DAY
+            low = base + np.clip(minutes - window + 1, 0, MINUTES_PER_DAY - 1)
+            high = base + np.clip(minutes + window - 1, 0, MINUTES_PER_DAY - 1)
+            counts = (np.searchsorted(self._slot_keys, high, side='right')
+                      - np.searchsorted(self._slot_keys, low, side='left'))
+        result = found & (counts > 0)
+        return bool(result[0]) if scalar else result
+
+    def schedule(self, user_id, medicine_id):
+        """
+        Prescribed times of one medicine for one user.
+
+        Returns:
+            tuple or None: (doses_per_day, sorted 'HH:MM' times), None if
+            nothing is prescribed
+        """
+        with self._lock:
+            self._merge()
+            codes, found = self._pair_codes([user_id], [medicine_id])
+            if not found[0]:
+                return None
+            start = np.searchsorted(self._slot_keys, codes[0] * MINUTES_PER_DAY)
+            end = np.searchsorted(self._slot_keys, (codes[0] + 1) * MINUTES_PER_DAY)
+            doses_per_day = int(self.doses_per_day[start])
+            minutes = np.unique(self.minutes[start:end])
+        return doses_per_day, [format_minutes(minute) for minute in minutes]
+
+    def due_between(self, start, end):
+        """
+        Dose slots scheduled in [start, end) minutes since midnight, across
+        all patients; `end` may pass midnight (e.g. 1430 to 1450).
+
+        Returns:
+            list: Dicts with prescription_id, user_id, user_name,
+            medicine_id, medicine_name, dosage_time and dose_number
+        """
+        with self._lock:
+            self._merge()
+            if end - start >= MINUTES_PER_DAY:
+                mask = np.ones(len(self.minutes), dtype=bool)
+            else:
+                start, end = start % MINUTES_PER_DAY, end % MINUTES_PER_DAY
+                if start <= end:
+                    mask = (self.minutes >= start) & (self.minutes < end)
+                else:
+                    mask = (self.minutes >= start) | (self.minutes < end)
+            slots = np.flatnonzero(mask)
+            return [{
+                'prescription_id': int(self.prescription_ids[slot]),
+                'user_id': int(self.user_ids[slot]),
+                'user_name': self.user_names[int(self.user_ids[slot])],
+                'medicine_id': int(self.medicine_ids[slot]),
+                'medicine_name': self.medicine_names[int(self.medicine_ids[slot])],
+                'dosage_time': format_minutes(self.minutes[slot]),
+                'dose_number': int(self.dose_numbers[slot])
+            } for slot in slots]
+
+
+# Shared index for this process; the notification server keeps its own
+schedule_index = ScheduleIndex()
+event_bus.subscribe(event_bus.PRESCRIPTION_CREATED, schedule_index.handle_event)
+event_bus.subscribe(event_bus.PRESCRIPTIONS_IMPORTED, schedule_index.handle_event)
+
+def get_schedule_index(db_path=DB_PATH):
+    """
+    Return the shared schedule index, loading it from the database on
+    first use.
+    """
+    if not schedule_index.loaded:
+        schedule_index.load(db_path)
+    return schedule_index
@@ -1,15 +1,23 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import os
-import tempfile
 import base64
+import binascii
+import json
+import os
 import re
 
 # Import our custom modules
-from ocr_processor import extract_text, extract_medication_name
-from fda_api import get_medication_info
-from database_handler import initialize_database, submit_form_data, search_medication
+import metrics
+from ocr_processor import decode_image
+from ocr_service import ocr_service, OCRServiceBusy
+from ocr_cache import ocr_cache
+from fda_api import get_medication_info_many
+from database_handler import (initialize_database, submit_form_data, submit_form_data_batch,
+                              search_medication, search_medicine_names, InvalidRecord)
 from dosage_tracker import DosageTracker  # Import the new DosageTracker class
+from adherence import get_adherence, get_adherence_overview, start_refresher
+from scan_jobs import scan_jobs, scan_image, SCAN_REQUESTS, SCAN_MODES, FULL
+from preprocessing import resolve_preset
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
@@ -25,70 +33,233 @@ def health_check():
         'message': 'Backend service is running successfully'
     }), 200
 
+def _read_upload_image():
+    """
+    Decode the uploaded image from the request without touching disk.
+
+    Three upload modes are accepted:
+    - multipart/form-data with the file in the `image` field
+    - a raw body sent as application/octet-stream (or image/*)
+    - the original JSON payload with a base64 `image_data` string
+
+    Returns:
+        tuple: (image_array, None) on success or (None, error_response)
+    """
+    if 'image' in request.files:
+        image_bytes = request.files['image'].read()
+    elif request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/'):
+        image_bytes = request.get_data(cache=False)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or 'image_data' not in data:
+            return None, (jsonify({'error': 'No image data provided'}), 400)
+
+        image_data = data['image_data']
+        if not isinstance(image_data, str):
+            return None, (jsonify({
+                'error': 'Invalid image data',
+                'message': 'image_data must be a base64 string'
+            }), 400)
+
+        # Extract base64 data if full data URL is provided
+        if image_data.startswith('data:image'):
+            image_data = image_data.split(',', 1)[-1]
+        try:
+            image_bytes = base64.b64decode(image_data)
+        except (binascii.Error, ValueError):
+            return None, (jsonify({
+                'error': 'Invalid image data',
+                'message': 'image_data is not valid base64'
+            }), 400)
+
+    if not image_bytes:
+        return None, (jsonify({'error': 'No image data provided'}), 400)
+
+    image = decode_image(image_bytes)
+    if image is None:
+        return None, (jsonify({
+            'error': 'Invalid image',
+            'message': 'The uploaded data could not be decoded as an image'
+        }), 400)
+
+    return image, None
+
+@app.route('/ocr-cache/stats', methods=['GET'])
+def ocr_cache_stats():
+    """
+    Hit/miss counters for the OCR result cache.
+    """
+    return jsonify(ocr_cache.get_stats()), 200
+
+def _requested_preset():
+    """OCR preprocessing preset from ?preset=, a form field or the JSON body."""
+    preset = request.args.get('preset') or request.form.get('preset')
+    if not preset:
+        data = request.get_json(silent=True)
+        preset = data.get('preset') if isinstance(data, dict) else None
+    return resolve_preset(preset)
+
+def _wants_async():
+    """True if the client asked for an async scan (?async=1 or Prefer: respond-async)."""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
 @app.route('/upload', methods=['POST'])
 def upload_image():
     """
     Endpoint to receive image uploads from the frontend,
     process them, and return medication information.
+
+    With ?async=1 (or a `Prefer: respond-async` header) the scan is queued
+    instead and a 202 response with the job id is returned at once; poll
+    /jobs/<job_id> for the result. Pass ?user_id= to also have the result
+    pushed to that user's WebSocket subscribers.
+
+    ?preset=none|fast|balanced|quality picks the OCR preprocessing
+    (downscaling, greyscale, contrast and deskew) for this scan.
+    ?mode=fast identifies the medicine from the largest text first and
+    stops at the first known name instead of reading the whole label.
+    """
+    try:
+        try:
+            preset = _requested_preset()
+        except ValueError as e:
+            SCAN_REQUESTS.inc(outcome='invalid')
+            return jsonify({'error': 'Invalid preset', 'message': str(e)}), 400
+
+        mode = request.args.get('mode') or request.form.get('mode') or FULL
+        if mode not in SCAN_MODES:
+            SCAN_REQUESTS.inc(outcome='invalid')
+            return jsonify({
+                'error': 'Invalid mode',
+                'message': f"Unknown scan mode '{mode}' (choose from {', '.join(SCAN_MODES)})"
+            }), 400
+
+        # Decode the uploaded image straight into memory
+        with metrics.stage('read_image'):
+            image, error_response = _read_upload_image()
+        if error_response:
+            SCAN_REQUESTS.inc(outcome='invalid')
+            return error_response
+
+        if _wants_async():
+            job_id = scan_jobs.submit(image, user_id=request.args.get('user_id', type=int), preset=preset,
+                                      mode=mode)
+            return jsonify({
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': f'/jobs/{job_id}'
+            }), 202, {'Location': f'/jobs/{job_id}'}
+
+        body, status_code = scan_image(image, preset=preset, mode=mode)
+        headers = {'Retry-After': '2'} if status_code == 503 else {}
+        return jsonify(body), status_code, headers
+
+    except OCRServiceBusy:
+        return jsonify({
+            'error': 'OCR service busy',
+            'message': 'Too many scans are being processed. Please try again shortly.'
+        }), 503, {'Retry-After': '2'}
+
+    except Exception as e:
+        SCAN_REQUESTS.inc(outcome='error')
+        return jsonify({'error': 'Server error', 'message': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_scan_job(job_id):
+    """
+    Status of an async scan: queued, running (with the current stage),
+    done (with the /upload response as `result`) or failed (with the
+    error body and its HTTP status). Finished jobs expire after a while.
+    """
+    job = scan_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Job not found',
+            'message': 'Unknown job id, or the job has expired'
+        }), 404
+
+    return jsonify({
+        'job_id': job['job_id'],
+        'status': job['status'],
+        'stage': job['stage'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'result': job['result'],
+        'http_status': job['http_status']
+    }), 200
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """
+    Scan stage latencies, OCR and FDA counters in the Prometheus text format.
+    """
+    return metrics.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+@app.route('/search', methods=['GET'])
+def search_medicines():
+    """
+    Autocomplete endpoint for medicine names.
+    
+    Query parameters:
+        q: Text typed so far
+        limit: Maximum number of suggestions (default 10)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'error': 'Missing query',
+            'message': 'Please provide a search query with ?q='
+        }), 400
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    
+    return jsonify({
+        'status': 'success',
+        'query': query,
+        'results': search_medicine_names(query, limit)
+    })
+
+@app.route('/medication-info/batch', methods=['POST'])
+def get_medication_info_batch():
+    """
+    Endpoint to look up several medicines at once.
+    
+    Expected JSON payload:
+    {
+        "names": ["Aspirin", "Lisinopril", "aspirin"]
+    }
     """
     try:
-        # Get image data from the request
         data = request.json
-        if not data or 'image_data' not in data:
-            return jsonify({'error': 'No image data provided'}), 400
         
-        # Extract base64 data if full data URL is provided
-        image_data = data['image_data']
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        # Create a temporary file to store the uploaded image
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.jpg') as temp:
-            temp.write(base64.b64decode(image_data))
-            temp_filename = temp.name
-        
-        try:
-            # Process the image with OCR to extract text
-            extracted_text = extract_text(temp_filename)
-            
-            if not extracted_text:
-                return jsonify({
-                    'error': 'Could not extract text from image', 
-                    'message': 'Please take a clearer photo of the medication label'
-                }), 400
-                
-            # Extract the medication name from the OCR text
-            medication_name = extract_medication_name(extracted_text)
-            
-            if not medication_name:
-                return jsonify({
-                    'error': 'Could not identify medication',
-                    'message': 'Unable to identify medication from the image'
-                }), 400
-                
-            # Search for medication information in local database
-            medication_info = search_medication(medication_name)
-            
-            # If not found in database, fallback to FDA API simulation
-            if not medication_info:
-                medication_info = get_medication_info(medication_name)
-            
-            # Format the response for the frontend
+        # Validate required fields
+        if not data or not isinstance(data.get('names'), list):
             return jsonify({
-                'medicine': medication_info.get('name', medication_name),
-                'description': medication_info.get('dosage', 'No dosage information available'),
-                'source': medication_info.get('source', 'Unknown'),
-                'uses': medication_info.get('uses', 'No uses information available'),
-                'side_effects': medication_info.get('side_effects', 'No side effects information available'),
-                'warnings': medication_info.get('warnings', 'No warnings available')
-            })
+                'error': 'Missing required fields',
+                'message': 'Please provide a list of medicine names'
+            }), 400
         
-        finally:
-            # Clean up the temporary file
-            os.unlink(temp_filename)
+        names = [name for name in data['names'] if isinstance(name, str) and name.strip()]
         
+        # Local database first, then one concurrent FDA round for the rest
+        results = {name: search_medication(name) for name in names}
+        missing = [name for name, info in results.items() if not info]
+        if missing:
+            results.update(get_medication_info_many(missing))
+        
+        return jsonify({
+            'status': 'success',
+            'results': results
+        })
+    
     except Exception as e:
-        return jsonify({'error': 'Server error', 'message': str(e)}), 500
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
 
 @app.route('/submit-form', methods=['POST'])
 def submit_form():
@@ -126,6 +297,54 @@ def submit_form():
             'message': str(e)
         }), 500
 
+def _read_ndjson(stream):
+    """Yield one record per line of an NDJSON body without buffering it all."""
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            # Reported in this record's result
+            yield InvalidRecord(f'Invalid JSON on line {line_number}: {e}')
+
+@app.route('/submit-form/batch', methods=['POST'])
+def submit_form_batch():
+    """
+    Endpoint to import many form submissions at once.
+
+    Accepts a JSON array of the objects /submit-form takes, or the same
+    objects as NDJSON (Content-Type: application/x-ndjson), one per line.
+    Returns a result for every record in input order.
+    """
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+            records = _read_ndjson(request.stream)
+        else:
+            records = request.get_json(silent=True)
+            if not isinstance(records, list):
+                return jsonify({
+                    'error': 'No records provided',
+                    'message': 'Please provide a JSON array or NDJSON of form submissions'
+                }), 400
+
+        results = submit_form_data_batch(records)
+        imported = sum(1 for result in results if result['status'] == 'success')
+
+        return jsonify({
+            'status': 'success' if imported == len(results) else 'partial',
+            'imported': imported,
+            'failed': len(results) - imported,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/track-dosage', methods=['POST'])
 def track_dosage():
     """
@@ -163,6 +382,45 @@ def track_dosage():
             'message': str(e)
         }), 500
 
+@app.route('/track-dosage/batch', methods=['POST'])
+def track_dosage_batch():
+    """
+    Endpoint to record many dose events in one request, e.g. when an
+    offline device syncs.
+
+    Expected JSON payload:
+    {
+        "events": [
+            {"user_name": "John Doe", "medicine_name": "Aspirin", "taken_at": "2024-05-01T08:05:00"}
+        ]
+    }
+    A bare list of events is accepted too. Returns a result per event.
+    """
+    try:
+        data = request.get_json(silent=True)
+        events = data.get('events') if isinstance(data, dict) else data
+
+        if not isinstance(events, list) or not events:
+            return jsonify({
+                'error': 'Missing required fields',
+                'message': 'Please provide a list of events'
+            }), 400
+
+        results = DosageTracker.track_dosage_batch(events)
+        tracked = sum(1 for result in results if result['status'] == 'dosage_tracked')
+
+        return jsonify({
+            'tracked': tracked,
+            'rejected': len(results) - tracked,
+            'results': results
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/medication-details', methods=['POST'])
 def get_medication_details():
     """
@@ -251,9 +509,46 @@ def get_dose_history():
             'message': str(e)
         }), 500
 
+@app.route('/adherence', methods=['GET'])
+def adherence():
+    """
+    Endpoint for precomputed adherence statistics.
+
+    With ?user_id= returns that user's per-medicine adherence rates,
+    streaks and recent daily history (?days=, default 30); without it
+    returns totals across all patients.
+    """
+    try:
+        user_id = request.args.get('user_id', type=int)
+        if user_id is None:
+            overview = get_adherence_overview()
+            if overview is None:
+                return jsonify({'status': 'error', 'message': 'Adherence data unavailable'}), 500
+            return jsonify(overview), 200
+
+        days = max(1, min(request.args.get('days', 30, type=int), 365))
+        return jsonify({
+            'user_id': user_id,
+            'medicines': get_adherence(user_id, days=days)
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 if __name__ == '__main__':
     # Initialize database on startup
     initialize_database()
+
+    # Load the OCR models in the worker pool before accepting scans, rather
+    # than on the first scan as under a WSGI server. With the debug reloader
+    # this block also runs in the file-watcher process, which never serves
+    # requests, so only the serving process starts the pool.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        ocr_service.start()
+        start_refresher()
     
     # Run the Flask application
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,29 @@
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'medicine_reminder.db')
+    migrations.migrate(path)
+    return path
+
+def test_migrate_applies_each_version_once(tmp_path):
+    path = str(tmp_path / 'medicine_reminder.db')
+    assert migrations.migrate(path) == [version for version, _, _ in migrations.MIGRATIONS]
+    assert migrations.migrate(path) == []
+
+def test_redundant_indexes_are_dropped(db_path):
+    with sqlite3.connect(db_path) as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_medicines_name_nocase' not in indexes
+    assert 'idx_dosage_tracking_user_medicine_date' not in indexes
+
+@pytest.mark.parametrize('query, params, index_name', migrations.INDEXED_QUERIES,
+                         ids=[index_name for _, _, index_name in migrations.INDEXED_QUERIES])
+def test_hot_query_uses_its_index(db_path, query, params, index_name):
+    [(name, used, plan)] = migrations.verify_indexes(db_path, [(query, params, index_name)])
+    assert used, f'{index_name} not used: {plan}'
@@ -1,54 +1,333 @@
-import cv2
+import os
+import threading
 import time
+from collections import deque
+
+import cv2
+
+# Frames kept for picking the sharpest recent one
+CAPTURE_BUFFER_SIZE = int(os.environ.get('CAPTURE_BUFFER_SIZE', '8'))
+
+# Frames are scored on a copy this wide; enough to see print sharpness
+CAPTURE_ANALYSIS_WIDTH = int(os.environ.get('CAPTURE_ANALYSIS_WIDTH', '640'))
+
+# Minimum Laplacian variance for a frame to count as sharp, the largest
+# mean grey-level change between frames that still counts as holding still,
+# and how many such frames in a row make the scene stable
+CAPTURE_MIN_SHARPNESS = float(os.environ.get('CAPTURE_MIN_SHARPNESS', '120'))
+CAPTURE_MAX_MOTION = float(os.environ.get('CAPTURE_MAX_MOTION', '4.0'))
+CAPTURE_STABLE_FRAMES = int(os.environ.get('CAPTURE_STABLE_FRAMES', '5'))
+
+
+class Frame:
+    """A captured frame with its quality scores and analysis copy."""
+
+    __slots__ = ('image', 'grey', 'timestamp', 'sharpness', 'motion', 'stable_frames')
+
+    def __init__(self, image, grey, timestamp, sharpness, motion, stable_frames):
+        self.image = image
+        self.grey = grey
+        self.timestamp = timestamp
+        self.sharpness = sharpness
+        self.motion = motion
+        self.stable_frames = stable_frames
+
+    def is_ready(self, min_sharpness=CAPTURE_MIN_SHARPNESS, stable_frames=CAPTURE_STABLE_FRAMES):
+        """True if the frame is sharp and the camera has been held still."""
+        return self.sharpness >= min_sharpness and self.stable_frames >= stable_frames
+
+
+def score_frame(grey, previous=None):
+    """
+    Cheap quality scores for a downscaled greyscale frame.
+
+    Args:
+        grey (numpy.ndarray): Greyscale frame at analysis size
+        previous (numpy.ndarray or None): The previous analysed frame
+
+    Returns:
+        tuple: (sharpness as the variance of the Laplacian, motion as the
+        mean absolute difference from the previous frame, inf without one)
+    """
+    sharpness = float(cv2.Laplacian(grey, cv2.CV_64F).var())
+    if previous is None or previous.shape != grey.shape:
+        return sharpness, float('inf')
+    return sharpness, float(cv2.absdiff(grey, previous).mean())
+
+
+class FrameGrabber:
+    """
+    Read webcam frames on a background thread into a small ring buffer.
+
+    Every frame is scored for sharpness and for motion against the one
+    before, so callers can take the best recent frame instead of whatever
+    is current, or wait until a sharp frame is seen with the camera held
+    still. The UI thread only ever looks at the buffer and never blocks
+    on the camera.
+    """
+
+    def __init__(self, source=0, buffer_size=CAPTURE_BUFFER_SIZE, analysis_width=CAPTURE_ANALYSIS_WIDTH,
+                 min_sharpness=CAPTURE_MIN_SHARPNESS, max_motion=CAPTURE_MAX_MOTION,
+                 stable_frames=CAPTURE_STABLE_FRAMES):
+        """
+        Args:
+            source (int or str): cv2.VideoCapture device index or URL
+            buffer_size (int): Number of recent frames kept
+            analysis_width (int): Width of the copy frames are scored on
+            min_sharpness (float): Laplacian variance of a sharp frame
+            max_motion (float): Largest mean frame difference of a still camera
+            stable_frames (int): Still frames in a row for a stable scene
+        """
+        self.source = source
+        self.analysis_width = analysis_width
+        self.min_sharpness = min_sharpness
+        self.max_motion = max_motion
+        self.stable_frames = stable_frames
+        self._frames = deque(maxlen=max(1, buffer_size))
+        self._condition = threading.Condition()
+        self._capture = None
+        self._thread = None
+        self._running = False
+        self.frames_read = 0
+
+    def __enter__(self):
+        if not self.start():
+            raise RuntimeError(f"Error opening webcam {self.source}")
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """
+        Open the camera and start the capture thread.
+
+        Returns:
+            bool: False if the camera could not be opened
+        """
+        if self._running:
+            return True
+
+        self._capture = cv2.VideoCapture(self.source)
+        if not self._capture.isOpened():
+            self._capture.release()
+            self._capture = None
+            return False
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='frame-grabber', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop the capture thread and release the camera."""
+        self._running = False
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self._capture is not None:
+            self._capture.release()
+            self._capture = None
+
+    def _analysis_copy(self, image):
+        grey = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        height, width = grey.shape
+        if width > self.analysis_width:
+            size = (self.analysis_width, max(1, round(height * self.analysis_width / width)))
+            grey = cv2.resize(grey, size, interpolation=cv2.INTER_AREA)
+        return grey
+
+    def _run(self):
+        while self._running:
+            ret, image = self._capture.read()
+            if not ret:
+                print("Error reading frame from webcam")
+                self._running = False
+                break
+            self.add_frame(image)
+
+        with self._condition:
+            self._condition.notify_all()
+
+    def add_frame(self, image, timestamp=None):
+        """
+        Score a frame and append it to the ring buffer. Called by the
+        capture thread; also usable to feed frames from another source.
+
+        Returns:
+            Frame: The scored frame
+        """
+        grey = self._analysis_copy(image)
+        with self._condition:
+            last = self._frames[-1] if self._frames else None
+            sharpness, motion = score_frame(grey, last.grey if last is not None else None)
+            stable = last.stable_frames + 1 if last is not None and motion <= self.max_motion else 0
+            frame = Frame(image, grey, timestamp or time.time(), sharpness, motion, stable)
+            self._frames.append(frame)
+            self.frames_read += 1
+            self._condition.notify_all()
+        return frame
+
+    def latest(self):
+        """The most recent frame, or None before the first one arrives."""
+        with self._condition:
+            return self._frames[-1] if self._frames else None
+
+    def next_frame(self, seen, timeout=None):
+        """
+        Wait for a frame newer than the `seen`-th one read.
+
+        Args:
+            seen (int): frames_read when the caller last got a frame
+            timeout (float or None): Give up after this many seconds
+
+        Returns:
+            tuple: (Frame or None, frames_read to pass next time)
+        """
+        with self._condition:
+            if self.frames_read <= seen and self._running:
+                self._condition.wait(timeout)
+            if self.frames_read <= seen or not self._frames:
+                return None, seen
+            return self._frames[-1], self.frames_read
+
+    def best(self, max_age=None):
+        """
+        The sharpest frame in the buffer, preferring frames taken while
+        the camera was still.
+
+        Args:
+            max_age (float or None): Ignore frames older than this (seconds)
+
+        Returns:
+            Frame or None
+        """
+        now = time.time()
+        with self._condition:
+            frames = [frame for frame in self._frames if max_age is None or now - frame.timestamp <= max_age]
+        if not frames:
+            return None
+        return max(frames, key=lambda frame: (frame.motion <= self.max_motion, frame.sharpness))
+
+    def is_ready(self, frame):
+        """True if `frame` is sharp and the scene has been stable."""
+        return frame.is_ready(self.min_sharpness, self.stable_frames)
+
+    def wait_for_ready(self, timeout=None):
+        """
+        Block until a sharp frame is seen with the camera held still.
+
+        Args:
+            timeout (float or None): Give up after this many seconds
+
+        Returns:
+            Frame or None: The frame, or None on timeout or camera failure
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            while True:
+                if self._frames and self.is_ready(self._frames[-1]):
+                    return self._frames[-1]
+                if not self._running:
+                    return None
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+
+
+def _draw_status(image, frame, grabber, auto=True):
+    """Preview copy of the frame with its sharpness and stability shown."""
+    preview = image.copy()
+    ready = grabber.is_ready(frame)
+    color = (0, 200, 0) if ready else (0, 0, 255)
+    ready_status = 'Hold still - capturing' if auto else 'Ready - press SPACE'
+    status = ready_status if ready else ('Hold still' if frame.sharpness >= grabber.min_sharpness
+                                         else 'Too blurry')
+    cv2.putText(preview, f'{status} (sharpness {frame.sharpness:.0f})', (10, 30),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+    return preview
+
+def capture_frame(source=0, auto=True, timeout=None):
+    """
+    Show the webcam and return a sharp frame as an in-memory image.
+
+    The frame is taken automatically as soon as the camera has been held
+    still on a sharp image (with auto=True), or when SPACE is pressed, in
+    which case the sharpest frame of the last moment is used rather than
+    the current one. ESC cancels.
+
+    Args:
+        source (int or str): cv2.VideoCapture device index or URL
+        auto (bool): Capture automatically once a frame is sharp and stable
+        timeout (float or None): Give up after this many seconds
+
+    Returns:
+        numpy.ndarray or None: BGR image, None if cancelled or failed
+    """
+    grabber = FrameGrabber(source)
+    if not grabber.start():
+        print("Error opening webcam")
+        return None
+
+    print("Webcam initialized. Hold the label steady"
+          f"{' to capture automatically,' if auto else ','} press SPACE to capture or ESC to quit.")
+    started = time.monotonic()
+    captured = None
+    try:
+        while grabber.running:
+            if timeout is not None and time.monotonic() - started > timeout:
+                print("Webcam capture timed out")
+                break
+
+            frame = grabber.latest()
+            if frame is not None:
+                cv2.imshow('Webcam Capture', _draw_status(frame.image, frame, grabber, auto))
+                if auto and grabber.is_ready(frame):
+                    captured = frame
+                    break
+
+            # Keep the window responsive; frames arrive on the grabber thread
+            key = cv2.waitKey(15)
+
+            # If ESC key is pressed, exit
+            if key == 27:
+                break
+
+            # If SPACE key is pressed, take the sharpest recent frame
+            if key == 32:
+                captured = grabber.best(max_age=1.0)
+                break
+    finally:
+        grabber.stop()
+        cv2.destroyAllWindows()
+
+    if captured is None:
+        return None
+    print(f"Image captured (sharpness {captured.sharpness:.0f})")
+    return captured.image
 
 def capture_image():
     """
     Initialize webcam and capture an image when SPACE is pressed.
     Returns the path to the saved image or None if cancelled.
+
+    Kept for callers that need a file; prefer `capture_frame`, which
+    returns the image without touching disk. Like before, nothing is
+    captured until SPACE is pressed.
     """
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)  # 0 is usually the default webcam
-    
-    # Check if webcam is opened successfully
-    if not cap.isOpened():
-        print("Error opening webcam")
+    image = capture_frame(auto=False)
+    if image is None:
         return None
-    
-    print("Webcam initialized. Press SPACE to capture an image or ESC to quit.")
-    
-    while True:
-        # Read frame from webcam
-        ret, frame = cap.read()
-        
-        # Check if frame is read correctly
-        if not ret:
-            print("Error reading frame from webcam")
-            break
-        
-        # Display the frame
-        cv2.imshow('Webcam Capture', frame)
-        
-        # Check for key press
-        key = cv2.waitKey(1)
-        
-        # If ESC key is pressed, exit
-        if key == 27:  # ESC key
-            break
-        
-        # If SPACE key is pressed, capture the image
-        if key == 32:  # SPACE key
-            # Save the captured image
-            filename = f"captured_image_{int(time.time())}.jpg"
-            cv2.imwrite(filename, frame)
-            print(f"Image captured and saved as {filename}")
-            
-            # Release the webcam and close windows
-            cap.release()
-            cv2.destroyAllWindows()
-            
-            return filename
-    
-    # Release the webcam and close windows
-    cap.release()
-    cv2.destroyAllWindows()
-    return None
+
+    # Save the captured image
+    filename = f"captured_image_{int(time.time())}.jpg"
+    cv2.imwrite(filename, image)
+    print(f"Image captured and saved as {filename}")
+    return filename
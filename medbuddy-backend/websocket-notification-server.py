@@ -1,98 +1,370 @@
 import asyncio
+import json
 import websockets
 import sqlite3
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qs, urlparse
+
+import event_bus
+from db_connection import DB_PATH, connection
+from schedule_index import MINUTES_PER_DAY, ScheduleIndex
+
+# Dose times are stored to the minute, so check the schedule at the start of
+# each minute. The database is only re-read every RECONCILE_INTERVAL seconds
+# as a safety net; changes normally arrive as events.
+POLL_INTERVAL = 60
+RECONCILE_INTERVAL = 15 * 60
+
+# Subscription key for clients that did not ask for a specific user
+ALL_USERS = '*'
 
 class NotificationServer:
-    def __init__(self, port=8080):
+    def __init__(self, port=8080, poll_interval=POLL_INTERVAL, reconcile_interval=RECONCILE_INTERVAL):
         self.port = port
+        self.poll_interval = poll_interval
+        self.reconcile_interval = reconcile_interval
         self.connections = set()
-        self.db_path = 'medicine_reminder.db'
+        self.db_path = DB_PATH
+
+        # Due-dose state: every scheduled dose, and doses taken per
+        # (user_id, medicine_id) on taken_date (UTC, like date('now'))
+        self.schedule = ScheduleIndex()
+        self.doses_taken = {}
+        self.taken_date = None
+
+        # State changes received while a reconcile reads the database, to be
+        # replayed onto its result (None when no read is in progress)
+        self._recorded = None
+        self._reconciling = False
+        self._reconcile_again = False
+        self._reconcile_task = None
+
+        # Last minute of the day (local) whose due doses were dispatched
+        self.last_checked = None
+
+        # user_id (or ALL_USERS) -> connected sockets, and the reverse
+        self.subscribers = defaultdict(set)
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, websocket, user_id):
+        """Route notifications for `user_id` to this socket."""
+        self.subscribers[user_id].add(websocket)
+        self.subscriptions[websocket].add(user_id)
+
+    def unsubscribe(self, websocket, user_id=None):
+        """Stop routing one user (or, without user_id, every user) to this socket."""
+        user_ids = [user_id] if user_id is not None else list(self.subscriptions[websocket])
+        for key in user_ids:
+            sockets = self.subscribers.get(key)
+            if sockets is not None:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.subscribers[key]
+            self.subscriptions[websocket].discard(key)
+        if not self.subscriptions[websocket]:
+            del self.subscriptions[websocket]
 
-    async def send_medication_notifications(self, websocket, path):
+    @staticmethod
+    def _requested_users(path):
+        """User ids from a `?user_id=1&user_id=2` connection URL."""
+        query = parse_qs(urlparse(path or '').query)
+        return [int(value) for value in query.get('user_id', []) if value.isdigit()]
+
+    @staticmethod
+    def _message_user_id(request, key):
         """
-        Continuously check for medication notifications and send them via WebSocket
+        The user id a client message names under `key`.
+
+        Returns:
+            int or None: The id, None if the key is absent
+
+        Raises:
+            ValueError: If the value is not a non-negative integer
         """
+        if key not in request:
+            return None
+        value = request[key]
+        if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).isdigit():
+            raise ValueError(f"'{key}' must be a user id, got {json.dumps(value)}")
+        return int(value)
+
+    async def _send_error(self, websocket, message):
+        """Tell a client its message was rejected, without dropping it."""
+        await websocket.send(json.dumps({'type': 'error', 'message': message}))
+
+    async def handle_client(self, websocket, path=None):
+        """
+        Register a client and process its subscribe/unsubscribe messages.
+
+        Clients pick users with `?user_id=` on the connection URL or by
+        sending {"subscribe": <user_id>} / {"unsubscribe": <user_id>}.
+        A client that never names a user receives every user's
+        notifications, as before. Malformed messages are answered with
+        {"type": "error", "message": ...} and otherwise ignored.
+        """
+        if path is None:
+            request = getattr(websocket, 'request', None)
+            path = request.path if request is not None else getattr(websocket, 'path', '')
+
         self.connections.add(websocket)
+        user_ids = self._requested_users(path) or [ALL_USERS]
+        for user_id in user_ids:
+            self.subscribe(websocket, user_id)
+
         try:
-            while True:
-                # Check for pending medication notifications
-                notifications = self._get_pending_notifications()
-                
-                for notification in notifications:
-                    # Send notification to the connected client
-                    await websocket.send(json.dumps({
-                        'medicine': notification['medicine_name'],
-                        'time': notification['dosage_time'],
-                        'user': notification['user_name']
-                    }))
-                
-                # Wait for a few minutes before checking again
-                await asyncio.sleep(300)  # Check every 5 minutes
-        
+            async for message in websocket:
+                try:
+                    request = json.loads(message)
+                except ValueError:
+                    await self._send_error(websocket, 'Message is not valid JSON')
+                    continue
+                if not isinstance(request, dict):
+                    await self._send_error(websocket, 'Message must be a JSON object')
+                    continue
+
+                try:
+                    subscribe = self._message_user_id(request, 'subscribe')
+                    unsubscribe = self._message_user_id(request, 'unsubscribe')
+                except ValueError as e:
+                    await self._send_error(websocket, str(e))
+                    continue
+
+                if subscribe is not None:
+                    self.unsubscribe(websocket, ALL_USERS)
+                    self.subscribe(websocket, subscribe)
+                if unsubscribe is not None:
+                    self.unsubscribe(websocket, unsubscribe)
+
         except websockets.exceptions.ConnectionClosed:
             print("WebSocket connection closed")
         finally:
-            self.connections.remove(websocket)
+            self.connections.discard(websocket)
+            self.unsubscribe(websocket)
+
+    def dispatch(self, notifications):
+        """
+        Send each notification only to the sockets subscribed to its user.
+
+        Args:
+            notifications (list): Notification dicts with a 'user_id' key
+        """
+        by_user = defaultdict(list)
+        for notification in notifications:
+            by_user[notification['user_id']].append(notification)
+
+        everyone = self.subscribers.get(ALL_USERS, set())
+        for user_id, user_notifications in by_user.items():
+            recipients = self.subscribers.get(user_id, set()) | everyone
+            if not recipients:
+                continue
+            for notification in user_notifications:
+                websockets.broadcast(recipients, json.dumps({
+                    'medicine': notification['medicine_name'],
+                    'time': notification['dosage_time'],
+                    'user': notification['user_name'],
+                    'user_id': notification['user_id']
+                }))
+
+    def dispatch_scan_result(self, event):
+        """
+        Push a finished async scan to the sockets subscribed to the user
+        who started it. Scans without a user_id are only pollable.
+        """
+        recipients = self.subscribers.get(event.get('user_id'), set())
+        if not recipients:
+            return
+        websockets.broadcast(recipients, json.dumps({
+            'type': 'scan_result',
+            'job_id': event['job_id'],
+            'status': event['status'],
+            'result': event['result'],
+            'user_id': event['user_id']
+        }))
+
+    def _roll_day(self):
+        """Forget yesterday's taken doses once the (UTC) date changes."""
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        if self.taken_date != today:
+            self.taken_date = today
+            self.doses_taken = {}
+
+    def _due_notifications(self, start, end):
+        """
+        Scheduled doses in minutes [start, end) of the day whose dose has
+        not been taken yet.
+        """
+        self._roll_day()
+        return [
+            entry for entry in self.schedule.due_between(start, end)
+            if self.doses_taken.get((entry['user_id'], entry['medicine_id']), 0) < entry['dose_number']
+        ]
+
+    @staticmethod
+    def _current_minute():
+        now = datetime.now()
+        return now.hour * 60 + now.minute
+
+    def _apply_event(self, event):
+        """
+        Apply a prescription or taken-dose event to the due-dose state.
+        Both are idempotent, so replaying one after a reconcile is safe.
+        """
+        if event['type'] == event_bus.PRESCRIPTION_CREATED:
+            self.schedule.handle_event(event)
+
+        elif event['type'] == event_bus.DOSE_TAKEN:
+            self._roll_day()
+            if event.get('intake_date') == self.taken_date:
+                key = (event['user_id'], event['medicine_id'])
+                self.doses_taken[key] = max(self.doses_taken.get(key, 0), event['doses_taken'])
+
+    def handle_event(self, event):
+        """
+        Apply a change event from the event bus to the due-dose state.
+
+        New prescriptions are scheduled immediately (and notified at once if
+        a dose is due this minute); taken doses suppress further reminders.
+        Finished async scans are forwarded to the scanning user.
+        """
+        if event['type'] in (event_bus.PRESCRIPTION_CREATED, event_bus.DOSE_TAKEN):
+            self._apply_event(event)
+            if self._recorded is not None:
+                self._recorded.append(event)
+
+        if event['type'] == event_bus.PRESCRIPTION_CREATED:
+            # Doses of the new prescriptions due this minute
+            added = {prescription['prescription_id'] for prescription in event.get('prescriptions', [])}
+            current_minute = self._current_minute()
+            self.dispatch([entry for entry in self._due_notifications(current_minute, current_minute + 1)
+                           if entry['prescription_id'] in added])
+
+        elif event['type'] == event_bus.PRESCRIPTIONS_IMPORTED:
+            # Bulk imports announce themselves once; reload everything
+            self._reconcile_task = asyncio.get_running_loop().create_task(self.reconcile())
+
+        elif event['type'] == event_bus.SCAN_COMPLETED:
+            self.dispatch_scan_result(event)
+
+    async def poll_notifications(self):
+        """
+        Single background task: once per interval, dispatch the doses due
+        since the last check from the in-memory schedule, however many
+        clients are connected, so a late wake-up never skips a minute. The
+        database is only read to reconcile the schedule.
+        """
+        loop = asyncio.get_running_loop()
+        next_reconcile = 0
+        while True:
+            if loop.time() >= next_reconcile:
+                await self.reconcile()
+                next_reconcile = loop.time() + self.reconcile_interval
+
+            # Wake at the start of the next interval so no dose minute is skipped
+            now = datetime.now()
+            await asyncio.sleep(self.poll_interval - (now.timestamp() % self.poll_interval))
+
+            current_minute = self._current_minute()
+            if self.last_checked is None:
+                self.last_checked = current_minute - 1
+            # Minutes since the last check; a stalled loop catches up on at
+            # most one day
+            elapsed = (current_minute - self.last_checked) % MINUTES_PER_DAY
+            if self.subscribers and elapsed:
+                self.dispatch(self._due_notifications(current_minute - elapsed + 1, current_minute + 1))
+            self.last_checked = current_minute
+
+    async def reconcile(self):
+        """
+        Rebuild the due-dose state from the database.
+
+        The queries run on an executor thread so sockets stay responsive;
+        the result is swapped in on the event loop, and prescription and
+        taken-dose events that arrived during the read are replayed onto
+        it, so none of them is lost to the swap. A reconcile requested
+        while one is reading runs again once it finishes.
+        """
+        if self._reconciling:
+            self._reconcile_again = True
+            return
+
+        loop = asyncio.get_running_loop()
+        self._reconciling = True
+        try:
+            while True:
+                self._reconcile_again = False
+                # Events before the read starts are already in the database
+                self._recorded = []
+                try:
+                    state = await loop.run_in_executor(None, self._read_state)
+                finally:
+                    recorded, self._recorded = self._recorded, None
+
+                if state is not None:
+                    # Swap in one step; the event loop only ever sees complete state
+                    self.schedule, self.taken_date, self.doses_taken = state
+                    for event in recorded:
+                        self._apply_event(event)
+
+                if not self._reconcile_again:
+                    break
+        finally:
+            self._reconciling = False
 
-    def _get_pending_notifications(self):
+    def _read_state(self):
         """
-        Retrieve pending medication notifications from the database
+        Load the schedule and today's taken doses (executor thread).
+
+        Returns:
+            tuple or None: (ScheduleIndex, taken_date, doses_taken), None
+            if the database could not be read
         """
+        schedule = ScheduleIndex()
+        if not schedule.load(self.db_path):
+            return None
+
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Get current time
-            current_time = datetime.now().strftime('%H:%M')
-            current_date = datetime.now().strftime('%Y-%m-%d')
-
-            # Query to find upcoming medication doses
-            cursor.execute('''
-                SELECT 
-                    u.name as user_name, 
-                    m.name as medicine_name, 
-                    dt.time_of_day as dosage_time
-                FROM prescriptions p
-                JOIN users u ON p.user_id = u.user_id
-                JOIN medicines m ON p.medicine_id = m.medicine_id
-                JOIN dosage_times dt ON p.prescription_id = dt.prescription_id
-                LEFT JOIN dosage_tracking dt_track ON (
-                    dt_track.medicine_id = m.medicine_id AND 
-                    dt_track.user_id = u.user_id AND 
-                    dt_track.intake_date = ?
-                )
-                WHERE 
-                    dt.time_of_day = ? AND 
-                    dt_track.tracking_id IS NULL
-            ''', (current_date, current_time))
-
-            notifications = [
-                {
-                    'user_name': row[0],
-                    'medicine_name': row[1],
-                    'dosage_time': row[2]
-                } for row in cursor.fetchall()
-            ]
-
-            conn.close()
-            return notifications
+            with connection(self.db_path) as conn:
+                taken_date = conn.execute("SELECT date('now')").fetchone()[0]
+                taken = conn.execute('''
+                    SELECT user_id, medicine_id, MAX(doses_taken)
+                    FROM dosage_tracking
+                    WHERE intake_date = ?
+                    GROUP BY user_id, medicine_id
+                ''', (taken_date,)).fetchall()
 
         except sqlite3.Error as e:
             print(f"Database error: {e}")
-            return []
+            return None
+
+        return schedule, taken_date, {(user_id, medicine_id): count for user_id, medicine_id, count in taken}
 
     async def start_server(self):
         """
         Start the WebSocket server
         """
         server = await websockets.serve(
-            self.send_medication_notifications, 
-            "localhost", 
+            self.handle_client,
+            "localhost",
             self.port
         )
         print(f"WebSocket server started on ws://localhost:{self.port}")
-        await server.wait_closed()
+
+        # Change events from the web server; without them the periodic
+        # reconciliation still picks everything up
+        events = None
+        try:
+            events = await event_bus.listen(self.handle_event)
+        except OSError as e:
+            print(f"Event bus unavailable, relying on reconciliation: {e}")
+
+        poller = asyncio.create_task(self.poll_notifications())
+        try:
+            await server.wait_closed()
+        finally:
+            poller.cancel()
+            if events is not None:
+                events.close()
 
 # Main entry point
 async def main():
@@ -100,8 +372,4 @@ async def main():
     await notification_server.start_server()
 
 if __name__ == "__main__":
-    import json
-    import asyncio
-    import websockets
-    
     asyncio.run(main())
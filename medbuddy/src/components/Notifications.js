@@ -1,10 +1,12 @@
 import { useEffect, useState } from "react";
 
-const Notifications = () => {
+const Notifications = ({ userId }) => {
     const [notifications, setNotifications] = useState([]);
 
     useEffect(() => {
-        const ws = new WebSocket("ws://localhost:8080");
+        // Only receive this user's reminders when a user id is known
+        const query = userId ? `?user_id=${encodeURIComponent(userId)}` : "";
+        const ws = new WebSocket(`ws://localhost:8080${query}`);
 
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
@@ -12,7 +14,7 @@ const Notifications = () => {
         };
 
         return () => ws.close();
-    }, []);
+    }, [userId]);
 
     return (
         <div className="notifications">
@@ -9,3 +9,15 @@ export const fetchMedicineUses = async (medicineName) => {
     return "Error retrieving data";
   }
 };
+
+export const searchMedicineNames = async (query, limit = 10) => {
+  try {
+    const response = await axios.get("http://localhost:5000/search", {
+      params: { q: query, limit },
+    });
+    return response.data.results.map((result) => result.name);
+  } catch (error) {
+    console.error("Error searching medicine names:", error);
+    return [];
+  }
+};
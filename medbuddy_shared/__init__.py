@@ -0,0 +1,6 @@
+"""
+SQLite helpers shared by the reminder app (repository root) and the
+backend (medbuddy-backend): the connection pool, the schema migration
+runner and bulk loading. Install with `pip install -e .` from the
+repository root so both apps can import it.
+"""
@@ -0,0 +1,27 @@
+import sqlite3
+
+# Shared by the data generators of the backend and the reminder app
+
+# Rows inserted per executemany/commit while bulk loading
+CHUNK_SIZE = 50000
+
+
+def bulk_connection(db_path):
+    """A connection tuned for one-off bulk loading rather than safety."""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    return conn
+
+def insert_chunks(conn, sql, rows, chunk_size=CHUNK_SIZE):
+    """executemany `rows` in transactions of `chunk_size` rows."""
+    rows = iter(rows)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk:
+            break
+        conn.execute('BEGIN')
+        conn.executemany(sql, chunk)
+        conn.execute('COMMIT')
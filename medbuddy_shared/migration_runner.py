@@ -0,0 +1,85 @@
+import sqlite3
+import sys
+
+# Shared by the backend's migrations.py and the reminder app's; each keeps
+# its own list of migrations and hot queries and passes its pool.
+
+
+def schema_version(conn):
+    """
+    Return the highest applied migration version (0 for a new database).
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+def migrate(pool, migrations):
+    """
+    Apply every migration newer than the database's schema version.
+
+    Runs under BEGIN IMMEDIATE, so concurrent starts apply each
+    migration once; a failing migration rolls back and is retried on the
+    next start.
+
+    Args:
+        pool (ConnectionPool): Pool of the database to migrate
+        migrations (list): (version, description, statements) in order
+
+    Returns:
+        list: Versions applied by this call
+    """
+    applied = []
+    with pool.transaction(immediate=True) as conn:
+        current = schema_version(conn)
+        for version, description, statements in migrations:
+            if version <= current:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                         (version, description))
+            applied.append(version)
+    return applied
+
+def verify_indexes(pool, queries):
+    """
+    Check with EXPLAIN QUERY PLAN that each hot query uses its index.
+
+    Args:
+        pool (ConnectionPool): Pool of the database to check
+        queries (list): (query, params, index name) per hot query
+
+    Returns:
+        list: (index name, used, plan details) per query
+    """
+    results = []
+    with pool.connection() as conn:
+        for query, params, index_name in queries:
+            plan = [row[-1] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+            used = any(f'INDEX {index_name} ' in f'{detail} ' for detail in plan)
+            results.append((index_name, used, plan))
+    return results
+
+def main(pool, migrations, queries, argv=None):
+    """
+    Command line entry point: migrate, and with --verify check the query
+    plans too. Exits non-zero on a migration error or an unused index.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        print(f"Applied migrations to {pool.db_path}: {migrate(pool, migrations) or 'none'}")
+    except sqlite3.Error as e:
+        print(f"Migration error: {e}")
+        sys.exit(1)
+
+    if '--verify' in argv:
+        failed = False
+        for index_name, used, plan in verify_indexes(pool, queries):
+            print(f"{'ok  ' if used else 'FAIL'} {index_name}: {'; '.join(plan)}")
+            failed = failed or not used
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,161 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Long-lived connections kept open per database file
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+
+# Milliseconds a connection waits on a locked database before failing
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', '5000'))
+
+# Seconds to wait for a free pooled connection before giving up
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '30'))
+
+# Applied to every new connection. WAL lets readers run alongside a writer,
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', DB_BUSY_TIMEOUT_MS),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -16000),  # negative values are KiB, so about 16 MB
+    ('temp_store', 'MEMORY'),
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """
+    Raised when no pooled connection becomes free in time. Subclasses
+    sqlite3.OperationalError so existing database error handling applies.
+    """
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of tuned, long-lived SQLite connections to one file.
+
+    Connections are opened lazily up to `size` and then reused, so callers
+    no longer pay connect and pragma overhead per query. Connections run in
+    autocommit mode; use `transaction` to group statements.
+
+    Never borrow a second connection while holding one: with every
+    connection held that way the pool runs dry, and the borrow fails with
+    `PoolTimeout` after `timeout` seconds.
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, row_factory=None, timeout=DB_POOL_TIMEOUT):
+        """
+        Args:
+            db_path (str): SQLite database file
+            size (int): Maximum number of open connections
+            row_factory (callable or None): Row factory for every connection
+            timeout (float): Seconds to wait for a free connection
+        """
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.row_factory = row_factory
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create(self):
+        """Open and configure a new connection."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for name, value in PRAGMAS:
+            conn.execute(f'PRAGMA {name} = {value}')
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._create()
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeout(
+                f"No connection to {self.db_path} became free within {self.timeout:g}s "
+                f"(pool size {self.size}); is a connection held while borrowing another?"
+            ) from None
+
+    def _release(self, conn):
+        # Never hand out a connection with a transaction left open
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of the `with` block.
+
+        Yields:
+            sqlite3.Connection: A pooled connection in autocommit mode
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Borrow a connection and run the block in a single transaction.
+
+        Commits when the block finishes and rolls back if it raises.
+
+        Args:
+            immediate (bool): Take the write lock up front (BEGIN IMMEDIATE),
+                for read-then-write blocks that must not race other writers
+
+        Yields:
+            sqlite3.Connection: A pooled connection inside the transaction
+        """
+        with self.connection() as conn:
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+
+    def close_all(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,112 @@
+import database
+from medbuddy_shared import migration_runner
+
+# Ordered schema migrations: (version, description, statements).
+# Applied versions are recorded in schema_version; never edit a released
+# migration, append a new one instead.
+MIGRATIONS = [
+    (1, "Base schema", [
+        '''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            phone TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS medications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            name TEXT NOT NULL,
+            dosage TEXT,
+            frequency TEXT NOT NULL,
+            start_date TEXT,
+            end_date TEXT,
+            quantity INTEGER DEFAULT 0,
+            low_stock_alert INTEGER DEFAULT 5,
+            prescription_end_date TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS reminders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            medication_id INTEGER,
+            reminder_time TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            snooze_until TEXT DEFAULT NULL,
+            missed_count INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (medication_id) REFERENCES medications (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS appointments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            doctor_name TEXT,
+            appointment_date TEXT NOT NULL,
+            notes TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS adherence_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            medication_id INTEGER,
+            date TEXT NOT NULL,
+            adherence_percentage INTEGER DEFAULT 100,
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (medication_id) REFERENCES medications (id)
+        )
+        ''',
+    ]),
+    (2, "Indexes for reminder scheduling and listing", [
+        "CREATE INDEX IF NOT EXISTS idx_reminders_time ON reminders(reminder_time)",
+        "CREATE INDEX IF NOT EXISTS idx_reminders_user_status ON reminders(user_id, status)",
+        # Matches the scheduler's window query on the effective fire time
+        '''
+        CREATE INDEX IF NOT EXISTS idx_reminders_pending_fire_time
+        ON reminders(COALESCE(snooze_until, reminder_time))
+        WHERE status = 'pending'
+        ''',
+    ]),
+]
+
+# Hot queries and the index each must use: (query, params, index name)
+INDEXED_QUERIES = [
+    ("SELECT * FROM reminders WHERE reminder_time >= ? ORDER BY reminder_time, id LIMIT 100",
+     ("2024-01-01",), "idx_reminders_time"),
+    ("SELECT * FROM reminders WHERE user_id = ? AND status = ?",
+     (1, "pending"), "idx_reminders_user_status"),
+    ('''
+        SELECT id FROM reminders
+        WHERE status = 'pending'
+        AND COALESCE(snooze_until, reminder_time) >= ?
+        AND COALESCE(snooze_until, reminder_time) < ?
+     ''', ("2024-01-01 00:00:00", "2024-01-01 01:00:00"), "idx_reminders_pending_fire_time"),
+]
+
+def migrate(migrations=MIGRATIONS):
+    """
+    Apply every migration newer than the database's schema version.
+
+    Returns:
+        list: Versions applied by this call
+    """
+    return migration_runner.migrate(database.pool, migrations)
+
+def verify_indexes(queries=INDEXED_QUERIES):
+    """
+    Check with EXPLAIN QUERY PLAN that each hot query uses its index.
+
+    Returns:
+        list: (index name, used, plan details) per query
+    """
+    return migration_runner.verify_indexes(database.pool, queries)
+
+if __name__ == "__main__":
+    migration_runner.main(database.pool, MIGRATIONS, INDEXED_QUERIES)
@@ -1,48 +1,273 @@
-import time
+import heapq
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from win10toast import ToastNotifier
 
+from database import get_db_connection, initialize_database, pool
+
+# How far ahead reminders are loaded into memory, how often the database is
+# checked for changes (a PRAGMA, so this can be short; new reminders are
+# only queried when something was committed), and how late a reminder is
+# still delivered after the service was paused (older ones are counted as
+# missed instead)
+WINDOW = timedelta(hours=1)
+POLL_INTERVAL = timedelta(seconds=1)
+CATCH_UP = timedelta(hours=1)
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
 toaster = ToastNotifier()
 def show_notification(title, message):
     toaster.show_toast(title, message, duration=10)
 
 
-# Function to fetch reminders
-def get_due_reminders():
-    conn = sqlite3.connect("medbuddy.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+def parse_time(value):
+    """Parse a reminder timestamp, returning None if it is empty or malformed."""
+    if not value:
+        return None
+    for time_format in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+    return None
 
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M")  # Match format
-    cur.execute("SELECT * FROM reminders WHERE reminder_time = ?", (current_time,))
-    reminders = cur.fetchall()
-    conn.close()
-    
-    return reminders
+def format_time(value):
+    """Format a datetime the way reminders store it."""
+    return value.strftime("%Y-%m-%d %H:%M:%S")
 
-# Function to show notifications
-def show_notification(title, message):
-    notification.notify(
-        title=title,
-        message=message,
-        app_name="MedBuddy",
-        timeout=10  # Notification lasts for 10 seconds
-    )
-
-# Main loop to check for reminders every minute
-while True:
-    due_reminders = get_due_reminders()
-    
-    for reminder in due_reminders:
-        user_id = reminder["user_id"]
-        medication_id = reminder["medication_id"]
-        reminder_time = reminder["reminder_time"]
-
-        # Notification Message
-        title = f"Medication Reminder"
-        message = f"User {user_id}, take your medicine (ID: {medication_id}) at {reminder_time}"
-        
-        show_notification(title, message)
-    
-    time.sleep(60)  # Check every minute
+def fire_time(reminder):
+    """When a reminder row should fire: its snooze time if set, else its reminder time."""
+    return parse_time(reminder["snooze_until"]) or parse_time(reminder["reminder_time"])
+
+
+class ReminderScheduler:
+    """
+    Deliver reminders at their exact time from an in-memory min-heap.
+
+    Only pending reminders due within the next `window` are loaded, keyed by
+    fire time (snooze_until when set). The loop sleeps until the earliest
+    deadline instead of waking every minute; `schedule` (e.g. from a
+    snooze on another thread) wakes it early when the new time is sooner.
+    New rows are picked up between window loads by an `id > last seen`
+    query, run only when `PRAGMA data_version` shows another connection
+    committed something. Each reminder is re-checked by primary key just
+    before it fires, so snoozes or status changes made elsewhere are
+    honoured without reloading anything.
+    """
+
+    def __init__(self, notify=show_notification, window=WINDOW,
+                 poll_interval=POLL_INTERVAL, catch_up=CATCH_UP):
+        """
+        Args:
+            notify (callable): Called with (title, message) for each reminder
+            window (timedelta): How far ahead to load reminders
+            poll_interval (timedelta): How often to look for new reminders
+            catch_up (timedelta): Maximum lateness for delivering a reminder
+        """
+        self.notify = notify
+        self.window = window
+        self.poll_interval = poll_interval
+        self.catch_up = catch_up
+        self._heap = []          # (fire time, reminder id)
+        self._scheduled = {}     # reminder id -> current fire time
+        self._loaded_until = None
+        self._last_id = 0
+        self._lock = threading.RLock()
+        self._wake = threading.Event()
+        self._watcher = None     # dedicated connection for PRAGMA data_version
+        self._data_version = None
+
+    def schedule(self, reminder_id, when):
+        """
+        Add or move a reminder in the heap, waking the loop if it is now
+        the earliest. A previous entry for the same id is left in place
+        and skipped when popped.
+        """
+        with self._lock:
+            self._scheduled[reminder_id] = when
+            heapq.heappush(self._heap, (when, reminder_id))
+            if self._heap[0] == (when, reminder_id):
+                self._wake.set()
+
+    def snooze(self, reminder_id, until):
+        """
+        Snooze a reminder until `until` and reschedule it immediately.
+
+        Safe to call from another thread while `run` is looping, and before
+        it starts (the first window load then picks the new time up).
+
+        Args:
+            reminder_id (int): Reminder to snooze
+            until (datetime): New fire time
+        """
+        with get_db_connection() as conn:
+            conn.execute("UPDATE reminders SET snooze_until = ? WHERE id = ?",
+                         (format_time(until), reminder_id))
+        with self._lock:
+            # Times beyond the window are loaded with it; the old heap entry
+            # finds the new time when re-checked and drops itself
+            if self._loaded_until is not None and until < self._loaded_until:
+                self.schedule(reminder_id, until)
+
+    def _add_rows(self, rows):
+        with self._lock:
+            for reminder in rows:
+                self._last_id = max(self._last_id, reminder["id"])
+                when = fire_time(reminder)
+                if when is not None and when < self._loaded_until:
+                    self.schedule(reminder["id"], when)
+
+    def mark_missed(self, before):
+        """
+        Count pending reminders that should have fired before `before` as
+        missed, e.g. ones that fell due while the service was down for
+        longer than `catch_up`.
+
+        Returns:
+            int: Number of reminders marked missed
+        """
+        with get_db_connection() as conn:
+            return conn.execute("""
+                UPDATE reminders SET status = 'missed', missed_count = missed_count + 1
+                WHERE status = 'pending' AND COALESCE(snooze_until, reminder_time) < ?
+            """, (format_time(before),)).rowcount
+
+    def load_window(self, now):
+        """
+        Load pending reminders firing before `now + window`.
+
+        The first load reaches back `catch_up` to deliver anything missed
+        while the service was down, and marks anything older as missed;
+        later loads continue where the previous window ended.
+        """
+        with self._lock:
+            start = self._loaded_until
+            if start is None:
+                start = now - self.catch_up
+                missed = self.mark_missed(start)
+                if missed:
+                    print(f"Marked {missed} reminders older than the catch-up window as missed")
+            self._loaded_until = now + self.window
+
+        with get_db_connection() as conn:
+            rows = conn.execute("""
+                SELECT id, user_id, medication_id, reminder_time, snooze_until
+                FROM reminders
+                WHERE status = 'pending'
+                AND COALESCE(snooze_until, reminder_time) >= ?
+                AND COALESCE(snooze_until, reminder_time) < ?
+            """, (format_time(start), format_time(self._loaded_until))).fetchall()
+            if not self._last_id:
+                self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reminders").fetchone()[0]
+
+        self._add_rows(rows)
+
+    def _changed(self):
+        """
+        True if another connection committed to the database since the
+        last call (always True on the first call).
+        """
+        try:
+            if self._watcher is None:
+                self._watcher = sqlite3.connect(pool.db_path, check_same_thread=False)
+            version = self._watcher.execute("PRAGMA data_version").fetchone()[0]
+        except sqlite3.Error as e:
+            print(f"Database change check failed: {e}")
+            return True
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def poll_new(self):
+        """Schedule reminders inserted since the last check, if anything changed."""
+        if not self._changed():
+            return
+        with get_db_connection() as conn:
+            rows = conn.execute("""
+                SELECT id, user_id, medication_id, reminder_time, snooze_until
+                FROM reminders
+                WHERE id > ? AND status = 'pending'
+            """, (self._last_id,)).fetchall()
+        self._add_rows(rows)
+
+    def _pop_due(self, now):
+        """Pop the next reminder due by `now`, or return None."""
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, reminder_id = heapq.heappop(self._heap)
+                if self._scheduled.get(reminder_id) != when:
+                    continue  # superseded by a later schedule() call
+                del self._scheduled[reminder_id]
+                return when, reminder_id
+        return None
+
+    def fire_due(self, now):
+        """Deliver every reminder whose fire time has passed."""
+        while True:
+            due = self._pop_due(now)
+            if due is None:
+                break
+            when, reminder_id = due
+
+            with get_db_connection() as conn:
+                reminder = conn.execute("""
+                    SELECT id, user_id, medication_id, reminder_time, snooze_until, status
+                    FROM reminders WHERE id = ?
+                """, (reminder_id,)).fetchone()
+
+                if reminder is None or reminder["status"] != "pending":
+                    continue
+
+                # Snoozed (or moved) since it was loaded
+                current = fire_time(reminder)
+                if current is not None and current > now:
+                    if current < self._loaded_until:
+                        self.schedule(reminder_id, current)
+                    continue
+
+                if now - when > self.catch_up:
+                    conn.execute("""
+                        UPDATE reminders SET status = 'missed', missed_count = missed_count + 1
+                        WHERE id = ?
+                    """, (reminder_id,))
+                    continue
+
+                conn.execute("UPDATE reminders SET status = 'sent' WHERE id = ?", (reminder_id,))
+
+            # Notification Message
+            title = "Medication Reminder"
+            message = (f"User {reminder['user_id']}, take your medicine "
+                       f"(ID: {reminder['medication_id']}) at {reminder['reminder_time']}")
+            self.notify(title, message)
+
+    def run(self):
+        """Run the scheduler loop forever."""
+        now = datetime.now()
+        self.load_window(now)
+        next_poll = now + self.poll_interval
+
+        while True:
+            now = datetime.now()
+            if now >= self._loaded_until:
+                self.load_window(now)
+            if now >= next_poll:
+                self.poll_new()
+                next_poll = now + self.poll_interval
+
+            self.fire_due(now)
+
+            # Sleep until the next reminder, poll or window boundary, or
+            # until schedule() adds an earlier reminder
+            with self._lock:
+                wake_at = min(next_poll, self._loaded_until)
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                self._wake.clear()
+            self._wake.wait(max(0.0, (wake_at - datetime.now()).total_seconds()))
+
+
+if __name__ == "__main__":
+    initialize_database()
+    ReminderScheduler().run()
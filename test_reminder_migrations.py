@@ -0,0 +1,32 @@
+import importlib.util
+import os
+
+import pytest
+
+from medbuddy_shared import migration_runner
+from medbuddy_shared.sqlite_pool import ConnectionPool
+
+# Loaded under its own name: the backend has a migrations module too
+_spec = importlib.util.spec_from_file_location(
+    'reminder_migrations', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations.py'))
+migrations = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(migrations)
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'medbuddy.db'))
+    migration_runner.migrate(pool, migrations.MIGRATIONS)
+    yield pool
+    pool.close_all()
+
+def test_migrate_applies_each_version_once(pool):
+    with pool.connection() as conn:
+        assert migration_runner.schema_version(conn) == migrations.MIGRATIONS[-1][0]
+    assert migration_runner.migrate(pool, migrations.MIGRATIONS) == []
+
+@pytest.mark.parametrize('query, params, index_name', migrations.INDEXED_QUERIES,
+                         ids=[index_name for _, _, index_name in migrations.INDEXED_QUERIES])
+def test_hot_query_uses_its_index(pool, query, params, index_name):
+    [(name, used, plan)] = migration_runner.verify_indexes(pool, [(query, params, index_name)])
+    assert used, f'{index_name} not used: {plan}'